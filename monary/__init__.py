@@ -1,11 +1,32 @@
 # Monary - Copyright 2011-2014 David J. C. Beach
 # Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
 
+import sys
+
 from .monary import Monary, mvoid_to_bson_id
+from .cursor_options import (CursorOptions, MONARY_QUERY_NONE,
+                             MONARY_QUERY_NO_CURSOR_TIMEOUT,
+                             MONARY_QUERY_EXHAUST)
 from .write_concern import (WriteConcern, MONARY_W_ERRORS_IGNORED,
                             MONARY_W_DEFAULT, MONARY_W_MAJORITY, MONARY_W_TAG)
 from .monary_param import MonaryParam
-from .datehelper import mongodate_to_datetime
+from .varlen import VarLenColumn
+from .category import CategoricalColumn
+from .list_column import ListColumn
+from .bitmask import BitmaskColumn
+from .schema import Schema
+from .result_cache import ResultCache
+from .disk_cache import DiskResultCache
+from .idhelper import (ids_to_bytes, bytes_to_ids, ids_to_hex, hex_to_ids,
+                       ids_to_objectids, objectids_to_ids, ids_to_datetime64,
+                       OBJECTID_DTYPE)
+from .datehelper import (mongodate_to_datetime, mongodates_to_datetime64,
+                         datetime64_to_mongodates, mongodeltas_to_timedelta64,
+                         timedelta64_to_mongodeltas, split_timestamps,
+                         join_timestamps, TIMESTAMP_DTYPE)
+
+if sys.version_info >= (3, 6):
+    from .aio import AsyncMonary
 
 version = "0.4.0"
 __version__ = version
@@ -0,0 +1,167 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+"""An asyncio interface to Monary, which requires Python 3.6 or later."""
+
+import asyncio
+import concurrent.futures
+
+from .monary import Monary
+
+# Returned by ``next`` when a block query is exhausted.
+_DONE = object()
+
+
+async def run_in_executor(executor, func, *args, **kwargs):
+    """Calls ``func(*args, **kwargs)`` in one of the executor's threads and
+       returns its result.
+
+       If the awaiting task is cancelled before the call has started, the
+       call is dropped. Once it has started it cannot be interrupted, so the
+       cancellation waits for it to finish, and to close its cursor, before
+       it is raised.
+
+       :param executor: a ``concurrent.futures.Executor``
+       :param func: the function to call
+    """
+    work = executor.submit(func, *args, **kwargs)
+    future = asyncio.wrap_future(work)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if not work.cancel():
+            await asyncio.wait([future])
+            if not future.cancelled():
+                # The result is not wanted, even if it is an error.
+                future.exception()
+        raise
+
+
+async def iterate_in_executor(executor, iterator):
+    """Yields the items of an iterator, reading each one in one of the
+       executor's threads.
+
+       The iterator is closed, in the executor, when the iteration stops
+       early, whether by ``break``, an error or cancellation; for a block
+       query, this closes its cursor.
+
+       :param executor: a ``concurrent.futures.Executor``
+       :param iterator: the iterator; a generator, if it is to be closed
+    """
+    try:
+        while True:
+            item = await run_in_executor(executor, next, iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await run_in_executor(executor, close)
+
+
+class AsyncMonary(object):
+    """A Monary connection whose operations are awaited from asyncio
+       coroutines instead of blocking the event loop.
+
+       Each operation runs in a bounded pool of worker threads, on a client
+       checked out of a ``pooled=True`` Monary connection, so concurrent
+       operations do not wait for each other. Cancelling an operation that
+       has started waits for it to finish and close its cursor.
+
+       An example::
+
+           async with AsyncMonary("localhost", max_workers=4) as m:
+               x, y = await m.query("test", "points", {}, ["x", "y"],
+                                    ["float64", "float64"])
+               async for block in m.block_query("test", "points", {},
+                                                ["x"], ["float64"]):
+                   process(block)
+    """
+
+    def __init__(self, *args, max_workers=None, **kwargs):
+        """Connects to MongoDB.
+
+           :param args: positional arguments of ``Monary``
+           :param int max_workers: (optional) the most operations that run
+                                   at once; further operations wait for one
+                                   of them to finish. Defaults to the
+                                   ``concurrent.futures.ThreadPoolExecutor``
+                                   default.
+           :param kwargs: any other arguments of ``Monary``; ``pooled`` is
+                          always True.
+        """
+        kwargs["pooled"] = True
+        self._monary = Monary(*args, **kwargs)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+
+    @property
+    def monary(self):
+        """The underlying, pooled ``Monary`` connection."""
+        return self._monary
+
+    def _run(self, func, *args, **kwargs):
+        return run_in_executor(self._executor, func, *args, **kwargs)
+
+    def _iterate(self, func, *args, **kwargs):
+        return iterate_in_executor(self._executor, func(*args, **kwargs))
+
+    async def count(self, *args, **kwargs):
+        """Counts the documents matching a query; see ``Monary.count``."""
+        return await self._run(self._monary.count, *args, **kwargs)
+
+    async def query(self, *args, **kwargs):
+        """Performs an array query; see ``Monary.query``."""
+        return await self._run(self._monary.query, *args, **kwargs)
+
+    async def aggregate(self, *args, **kwargs):
+        """Performs an aggregation operation; see ``Monary.aggregate``."""
+        return await self._run(self._monary.aggregate, *args, **kwargs)
+
+    async def insert(self, *args, **kwargs):
+        """Inserts documents; see ``Monary.insert``."""
+        return await self._run(self._monary.insert, *args, **kwargs)
+
+    async def infer_schema(self, *args, **kwargs):
+        """Samples a collection's fields and types; see
+           ``Monary.infer_schema``."""
+        return await self._run(self._monary.infer_schema, *args, **kwargs)
+
+    async def query_df(self, *args, **kwargs):
+        """Performs an array query returning a ``pandas.DataFrame``; see
+           ``Monary.query_df``."""
+        return await self._run(self._monary.query_df, *args, **kwargs)
+
+    async def query_arrow(self, *args, **kwargs):
+        """Performs an array query returning a ``pyarrow.Table``; see
+           ``Monary.query_arrow``."""
+        return await self._run(self._monary.query_arrow, *args, **kwargs)
+
+    def block_query(self, *args, **kwargs):
+        """Performs a block query, as an asynchronous iterator of blocks;
+           see ``Monary.block_query``.
+
+           Each block is read in a worker thread when the next one is asked
+           for. As with ``Monary.block_query``, the arrays of a block are
+           reused for the next one unless ``prefetch`` is given. Leaving the
+           ``async for`` early, or cancelling it, closes the cursor.
+        """
+        return self._iterate(self._monary.block_query, *args, **kwargs)
+
+    def block_aggregate(self, *args, **kwargs):
+        """Performs a block aggregation, as an asynchronous iterator of
+           blocks; see ``block_query`` and ``Monary.block_aggregate``."""
+        return self._iterate(self._monary.block_aggregate, *args, **kwargs)
+
+    async def close(self):
+        """Waits for running operations to finish, then closes the
+           connection."""
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._executor.shutdown)
+        self._monary.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
@@ -0,0 +1,77 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+
+class BitmaskColumn(object):
+    """A column of fixed-size values whose missing values are marked in a
+    packed validity bitmap, as in Apache Arrow: bit ``i % 8`` of byte
+    ``i // 8`` is set if the value of row ``i`` is present. For vectors, the
+    bitmap has one bit per element, in row order."""
+    def __init__(self, data, validity):
+        """Create a new BitmaskColumn.
+
+        :Parameters:
+         - `data`: array of the values of each row.
+         - `validity`: uint8 array; the packed validity bitmap.
+        """
+        if len(validity) != (data.size + 7) // 8:
+            raise ValueError("Expected %d bytes of validity for %d values, "
+                             "got %d." % ((data.size + 7) // 8, data.size,
+                                          len(validity)))
+        self.data = data
+        self.validity = validity
+
+    @classmethod
+    def from_mask(cls, data, mask):
+        """Create a BitmaskColumn from a byte-per-value mask.
+
+        :Parameters:
+         - `data`: array of the values of each row.
+         - `mask`: bool array of the same shape; True where a value is
+           missing.
+        """
+        validity = numpy.packbits(~numpy.asarray(mask, dtype=bool).ravel(),
+                                  bitorder="little")
+        return cls(data, validity)
+
+    def __len__(self):
+        """Return the number of rows."""
+        return len(self.data)
+
+    @property
+    def mask(self):
+        """A bool array of the shape of ``data``; True where a value is
+        missing."""
+        valid = numpy.unpackbits(self.validity, count=self.data.size,
+                                 bitorder="little")
+        return (valid == 0).reshape(self.data.shape)
+
+    def __getitem__(self, key):
+        """Return the value of a row (numpy.ma.masked if it is missing), or
+        a masked array of the rows selected by any other key.
+
+        :Parameters:
+         - `key`: An integer, slice or index array.
+        """
+        if isinstance(key, (int, numpy.integer)) and self.data.ndim == 1:
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("Index out of range.")
+            if not (self.validity[key >> 3] >> (key & 7)) & 1:
+                return numpy.ma.masked
+            return self.data[key]
+        return self.to_masked()[key]
+
+    def count(self):
+        """Return the number of values that are not missing."""
+        return int(self.data.size - numpy.count_nonzero(self.mask))
+
+    def to_masked(self):
+        """Return the column as a masked array over the same data."""
+        return numpy.ma.masked_array(self.data, self.mask)
+
+    def __repr__(self):
+        return "BitmaskColumn(%r)" % (self.to_masked().tolist(),)
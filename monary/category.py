@@ -0,0 +1,93 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+
+class CategoricalColumn(object):
+    """A column of strings stored as int32 codes into a small array of the
+    distinct strings (the categories). A code of -1 marks a missing value,
+    which is also masked in ``codes``."""
+    def __init__(self, codes, categories):
+        """Create a new CategoricalColumn.
+
+        :Parameters:
+         - `codes`: masked int32 array holding the category of each row.
+         - `categories`: array of the distinct strings, indexed by code.
+        """
+        self.codes = codes
+        self.categories = categories
+
+    @classmethod
+    def concatenate(cls, columns):
+        """Join CategoricalColumns end to end. The categories of the result
+        are those of each column in turn, without repeats, and codes are
+        renumbered to match.
+
+        :Parameters:
+         - `columns`: a list of CategoricalColumns.
+        """
+        positions = {}
+        categories = []
+        codes = []
+        for column in columns:
+            # Map each of this column's codes to a code of the result, with
+            # an extra slot at the end so that -1 stays -1.
+            remap = numpy.empty(len(column.categories) + 1, dtype=numpy.int32)
+            remap[-1] = -1
+            for code, category in enumerate(column.categories):
+                if category not in positions:
+                    positions[category] = len(categories)
+                    categories.append(category)
+                remap[code] = positions[category]
+            codes.append(numpy.ma.masked_array(
+                remap[column.codes.data],
+                numpy.ma.getmaskarray(column.codes)))
+        array = numpy.empty(len(categories), dtype=object)
+        array[:] = categories
+        if not codes:
+            codes = [numpy.ma.masked_array(numpy.zeros(0, numpy.int32),
+                                           numpy.zeros(0, bool))]
+        return cls(numpy.ma.concatenate(codes), array)
+
+    def __len__(self):
+        """Return the number of rows."""
+        return len(self.codes)
+
+    def __getitem__(self, key):
+        """Return the string of a row (numpy.ma.masked if it is missing), or
+        a CategoricalColumn of the rows selected by a slice or index array.
+
+        :Parameters:
+         - `key`: An integer, slice, or array of integers or booleans.
+        """
+        codes = self.codes[key]
+        if isinstance(key, (int, numpy.integer)):
+            if codes is numpy.ma.masked:
+                return codes
+            return self.categories[codes]
+        return CategoricalColumn(codes, self.categories)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def count(self):
+        """Return the number of values that are not missing."""
+        return self.codes.count()
+
+    def tolist(self):
+        """Return the strings as a list, with None for missing values."""
+        return [None if value is numpy.ma.masked else value
+                for value in self]
+
+    def to_numpy(self):
+        """Return the strings as a masked array of Python objects."""
+        lookup = numpy.empty(len(self.categories) + 1, dtype=object)
+        lookup[:-1] = self.categories
+        lookup[-1] = None
+        return numpy.ma.masked_array(lookup[self.codes.data],
+                                     numpy.ma.getmaskarray(self.codes))
+
+    def __repr__(self):
+        return "CategoricalColumn(%r)" % (self.tolist(),)
@@ -41,9 +41,40 @@ enum {
     TYPE_TYPE = 18,     // BSON type code (uint8 storage)
     TYPE_SIZE = 19,     // data size of a string, symbol, binary, or bson object (uint32)
     TYPE_LENGTH = 20,   // length of string (character count) or num elements in BSON (uint32)
-    LAST_TYPE = 20      // BSON type code as per the BSON specification
+    TYPE_VARSTRING = 21,        // UTF-8 string of any length (int64 end offsets + data buffer)
+    TYPE_VARBINARY = 22,        // binary data of any length (int64 end offsets + data buffer)
+    TYPE_VARBSON = 23,  // BSON subdocument of any length (int64 end offsets + data buffer)
+    TYPE_CATEGORY = 24, // UTF-8 string as a code into a dictionary of distinct strings (int32)
+    TYPE_VECTOR = 25,   // array of (type_arg) values of the column's elem_type
+    TYPE_LIST = 26,     // array of any length (int64 end offsets into its item columns)
+    TYPE_BINARY_VECTOR = 27,    // binary data holding (type_arg) packed values of elem_type
+    TYPE_ID_TIME = 28,  // creation time of an ObjectID, milliseconds since the UNIX epoch (int64)
+    LAST_TYPE = 28      // BSON type code as per the BSON specification
 };
 
+#define MONARY_IS_VECTOR_TYPE(TYPE) \
+    ((TYPE) == TYPE_VECTOR || (TYPE) == TYPE_BINARY_VECTOR)
+
+// BSON binary subtype of packed vectors, which begin with a dtype byte and a
+// padding byte, and the dtypes of the element types it can hold
+#define MONARY_SUBTYPE_VECTOR 0x09
+#define MONARY_VECTOR_DTYPE_INT8 0x03
+#define MONARY_VECTOR_DTYPE_FLOAT32 0x27
+
+#define MONARY_IS_VARLEN_TYPE(TYPE) \
+    ((TYPE) >= TYPE_VARSTRING && (TYPE) <= TYPE_VARBSON)
+
+#define MONARY_VARBUF_MIN_CAPACITY 4096
+
+// The address of row IDX of a column's storage (or mask), whose rows are
+// WIDTH bytes apart unless the column has a stride of its own
+#define MONARY_ROW(CITEM, IDX, WIDTH)                                        \
+    ((char *) (CITEM)->storage + (size_t) (IDX) *                            \
+     ((CITEM)->stride ? (CITEM)->stride : (size_t) (WIDTH)))
+#define MONARY_MASK_ROW(CITEM, IDX, WIDTH)                                   \
+    ((CITEM)->mask + (size_t) (IDX) *                                        \
+     ((CITEM)->mask_stride ? (CITEM)->mask_stride : (size_t) (WIDTH)))
+
 
 void
 initlibcmonary(void)
@@ -149,6 +180,100 @@ monary_disconnect(mongoc_client_t * client)
     mongoc_client_destroy(client);
 }
 
+/**
+ * Creates a pool of clients connected to a MongoDB server. Unlike a client,
+ * the pool is thread-safe: each thread checks a client out with
+ * monary_pool_pop, uses it alone, and returns it with monary_pool_push.
+ *
+ * @param uri A valid MongoDB URI, as for monary_connect.
+ * @param pem_file, pem_pwd, ca_file, ca_dir, crl_file, weak_cert_validation
+ * SSL options, as for monary_connect, which must outlive the pool.
+ * @param min_size The number of idle clients the pool keeps open.
+ * @param max_size The most clients the pool opens at once, or zero for the
+ * driver's default; monary_pool_pop blocks while all of them are in use.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return A pointer to the pool, or NULL if the URI is invalid.
+ */
+mongoc_client_pool_t *
+monary_pool_new(const char *uri, const char *pem_file,
+                const char *pem_pwd, const char *ca_file,
+                const char *ca_dir, const char *crl_file,
+                bool weak_cert_validation, unsigned int min_size,
+                unsigned int max_size, bson_error_t * err)
+{
+    mongoc_client_pool_t *pool;
+    mongoc_uri_t *mongo_uri;
+
+    if (!uri) {
+        monary_error(err, "empty URI passed to monary_pool_new");
+        return NULL;
+    }
+
+    mongo_uri = mongoc_uri_new(uri);
+    if (!mongo_uri) {
+        monary_error(err, "cmongo failed to parse URI in monary_pool_new");
+        return NULL;
+    }
+    DEBUG("Creating client pool for: %s", uri);
+    pool = mongoc_client_pool_new(mongo_uri);
+    if (!pool) {
+        mongoc_uri_destroy(mongo_uri);
+        monary_error(err, "cmongo failed to create a client pool in "
+                     "monary_pool_new");
+        return NULL;
+    }
+
+    if (mongoc_uri_get_ssl(mongo_uri)) {
+        mongoc_ssl_opt_t opts = { pem_file, pem_pwd, ca_file, ca_dir, crl_file,
+            weak_cert_validation
+        };
+        mongoc_client_pool_set_ssl_opts(pool, &opts);
+    }
+    if (max_size > 0) {
+        mongoc_client_pool_max_size(pool, max_size);
+    }
+    mongoc_client_pool_min_size(pool, min_size);
+    mongoc_uri_destroy(mongo_uri);
+    return pool;
+}
+
+/**
+ * Checks a client out of a pool, waiting for one to be returned if the pool
+ * is at its maximum size.
+ *
+ * @param pool The pool, from monary_pool_new.
+ *
+ * @return A client for the calling thread's use only.
+ */
+mongoc_client_t *
+monary_pool_pop(mongoc_client_pool_t * pool)
+{
+    return mongoc_client_pool_pop(pool);
+}
+
+/**
+ * Returns a client to the pool it was checked out of.
+ *
+ * @param pool The pool, from monary_pool_new.
+ * @param client The client, from monary_pool_pop.
+ */
+void
+monary_pool_push(mongoc_client_pool_t * pool, mongoc_client_t * client)
+{
+    mongoc_client_pool_push(pool, client);
+}
+
+/**
+ * Destroys a pool and every client in it, which must all have been returned.
+ */
+void
+monary_pool_destroy(mongoc_client_pool_t * pool)
+{
+    DEBUG("%s", "Closing mongoc_client_pool");
+    mongoc_client_pool_destroy(pool);
+}
+
 /**
  * Use a particular database and collection from the given MongoDB client.
  *
@@ -181,6 +306,42 @@ monary_destroy_collection(mongoc_collection_t * collection)
     }
 }
 
+/**
+ * A growable buffer holding the values of a variable-length column back to
+ * back, in the style of an Arrow data buffer.
+ *
+ * @memb data The values, or NULL if nothing has been allocated yet.
+ * @memb len The number of bytes in use.
+ * @memb cap The number of bytes allocated.
+ */
+typedef struct monary_varbuf {
+    uint8_t *data;
+    size_t len;
+    size_t cap;
+} monary_varbuf;
+
+/**
+ * The distinct strings seen in a category column, each identified by a code
+ * that is its position in order of first appearance.
+ *
+ * @memb strings The strings, back to back.
+ * @memb ends For each code, the offset in strings at which its string ends.
+ * @memb hashes For each code, the FNV-1a hash of its string.
+ * @memb num_codes The number of distinct strings.
+ * @memb cap_codes The number of codes allocated in ends and hashes.
+ * @memb index_len The number of slots in index, a power of two.
+ * @memb index For each slot, one plus a code, or zero.
+ */
+typedef struct monary_category_dict {
+    monary_varbuf strings;
+    int64_t *ends;
+    uint32_t *hashes;
+    unsigned int num_codes;
+    unsigned int cap_codes;
+    unsigned int index_len;
+    unsigned int *index;
+} monary_category_dict;
+
 /**
  * Holds the storage for an array of objects.
  *
@@ -194,6 +355,24 @@ monary_destroy_collection(mongoc_collection_t * collection)
  * representation of the NumPy ma.array, which corresponds one-to-one to the
  * storage array. A value is masked if and only if an error occurs while
  * loading memory from MongoDB.
+ * @memb varbuf For variable-length types, the buffer holding the values. The
+ * storage array then holds, for each row, the int64 offset in varbuf at which
+ * that row's value ends.
+ * @memb dict For category columns, the dictionary of the cursor loading the
+ * column, which owns it. The storage array holds the int32 code of each row,
+ * or -1 if it is masked.
+ * @memb elem_type For vector columns, the type of each element. Each row
+ * then holds type_arg elements in both the storage and mask arrays.
+ * @memb parent For item columns of a list, one plus the number of the list
+ * column, or zero. An item column holds one value per element of the list
+ * rather than one per row: its values are appended to varbuf and their masks
+ * to maskbuf, and storage and mask point into those buffers while loading.
+ * @memb maskbuf For item columns of a list, the buffer holding the masks.
+ * @memb stride The number of bytes from the start of one row of storage to
+ * the next, or zero if the rows are packed one after another. Columns loaded
+ * into the fields of a structured array have the size of its records.
+ * @memb mask_stride Likewise, the number of bytes from one row of the mask to
+ * the next, or zero if they are packed.
  */
 typedef struct monary_column_item {
     char *field;
@@ -201,6 +380,13 @@ typedef struct monary_column_item {
     unsigned int type_arg;
     void *storage;
     unsigned char *mask;
+    monary_varbuf *varbuf;
+    monary_category_dict *dict;
+    unsigned int elem_type;
+    unsigned int parent;
+    monary_varbuf *maskbuf;
+    size_t stride;
+    size_t mask_stride;
 } monary_column_item;
 
 /**
@@ -217,12 +403,72 @@ typedef struct monary_column_data {
     monary_column_item *columns;
 } monary_column_data;
 
+/**
+ * One component of a dotted field path in a compiled field plan.
+ *
+ * @memb key The name of this component (e.g. "b" for the path "a.b.c").
+ * @memb hash FNV-1a hash of key, used to reject non-matching keys cheaply.
+ * @memb num_columns The number of columns that read exactly this field.
+ * @memb columns The indices of those columns within the column data.
+ * @memb num_children The number of distinct subfields requested below this
+ * component.
+ * @memb children The plan nodes for those subfields.
+ * @memb seen Per-child flags marking which children were already matched in
+ * the (sub)document currently being walked.
+ * @memb order For each element position of the previous (sub)document, one
+ * plus the index of the child matched there, or zero if nothing matched.
+ * @memb order_len The number of positions tracked by order.
+ * @memb list_column One plus the index of the list column reading this
+ * field, or zero. The elements of the field's array are then walked one at a
+ * time, loading the item columns below this node once per element.
+ * @memb num_items The number of item columns below a list node.
+ * @memb items The indices of those columns within the column data.
+ * @memb elem For a list node, its child named "$", whose columns read each
+ * element itself rather than a field of it, or NULL. It is kept last among
+ * the node's children, so that walks of the elements can leave it out.
+ */
+typedef struct monary_plan_node {
+    char *key;
+    uint32_t hash;
+    unsigned int num_columns;
+    unsigned int *columns;
+    unsigned int num_children;
+    struct monary_plan_node **children;
+    unsigned char *seen;
+    unsigned int *order;
+    unsigned int order_len;
+    unsigned int list_column;
+    unsigned int num_items;
+    unsigned int *items;
+    struct monary_plan_node *elem;
+} monary_plan_node;
+
+/**
+ * A trie of the dotted field paths of a column data structure, compiled once
+ * per cursor so that each document is walked only once.
+ *
+ * @memb root The node representing the top level of each document.
+ * @memb num_columns The number of columns in the column data.
+ * @memb loaded Per-column success flags for the row being loaded.
+ */
+typedef struct monary_field_plan {
+    monary_plan_node root;
+    unsigned int num_columns;
+    unsigned char *loaded;
+} monary_field_plan;
+
 /**
  * A MongoDB cursor augmented with Monary column data.
+ *
+ * @memb dicts For each column, its category dictionary, or NULL if it is not
+ * a category column. The dictionaries last as long as the cursor, so codes
+ * mean the same thing in every block loaded from it.
  */
 typedef struct monary_cursor {
     mongoc_cursor_t *mcursor;
     monary_column_data *coldata;
+    monary_field_plan *plan;
+    monary_category_dict **dicts;
 } monary_cursor;
 
 /**
@@ -274,6 +520,14 @@ monary_free_column_data(monary_column_data * coldata)
         if (col->field != NULL) {
             free(col->field);
         }
+        if (col->varbuf != NULL) {
+            free(col->varbuf->data);
+            free(col->varbuf);
+        }
+        if (col->maskbuf != NULL) {
+            free(col->maskbuf->data);
+            free(col->maskbuf);
+        }
     }
     free(coldata->columns);
     free(coldata);
@@ -291,13 +545,14 @@ monary_free_column_data(monary_column_data * coldata)
  * MONARY_MAX_STRING_LENGTH characters in length.
  * @param type The new type of the item.
  * @param type_arg For UTF-8, binary and BSON types, specifies the size of the
- * data.
+ * data; for vectors, the number of elements. Variable-length types ignore it.
  * @param storage A pointer to the new location of the data in memory, which
  * cannot be NULL. Note that this does not free(3) the previous storage
  * pointer.
- * @param mask A pointer to the new masked array, which cannot be NULL. It is a
- * programming error to have a masked array different in length from the
- * storage array.
+ * @param mask A pointer to the new masked array, which may only be NULL for
+ * columns whose missing values need not be recorded (and never for vectors).
+ * It is a programming error to have a masked array different in length from
+ * the storage array.
  * @param err bson_error_t that holds error information in case of failure
  *
  * @return 1 if the modification was performed successfully; -1 otherwise.
@@ -334,7 +589,7 @@ monary_set_column_item(monary_column_data * coldata,
                      "storage");
         return -1;
     }
-    if (mask == NULL) {
+    if (mask == NULL && MONARY_IS_VECTOR_TYPE(type)) {
         monary_error(err, "null argument passed to monary_set_column_item: "
                      "mask");
         return -1;
@@ -349,6 +604,15 @@ monary_set_column_item(monary_column_data * coldata,
 
     col = coldata->columns + colnum;
 
+    if (MONARY_IS_VARLEN_TYPE(type) && col->varbuf == NULL) {
+        col->varbuf = (monary_varbuf *) calloc(1, sizeof(monary_varbuf));
+        if (col->varbuf == NULL) {
+            monary_error(err, "failed to allocate a variable-length buffer "
+                         "in monary_set_column_item");
+            return -1;
+        }
+    }
+
     col->field = malloc(len + 1);
     strcpy(col->field, field);
 
@@ -360,187 +624,440 @@ monary_set_column_item(monary_column_data * coldata,
     return 1;
 }
 
+/**
+ * Points a column item at new storage, for instance after its arrays have
+ * been reallocated to hold more rows. Unlike monary_set_column_item, the
+ * field and type of the column are left unchanged.
+ *
+ * @param coldata A pointer to the column data to modify.
+ * @param colnum The number of the column item to modify.
+ * @param storage A pointer to the new location of the data, which cannot be
+ * NULL.
+ * @param mask A pointer to the new masked array, which may only be NULL if
+ * the column was set up without one.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return 1 if the modification was performed successfully; -1 otherwise.
+ */
 int
-monary_load_objectid_value(const bson_iter_t * bsonit,
-                           monary_column_item * citem, int idx)
+monary_set_column_storage(monary_column_data * coldata,
+                          unsigned int colnum,
+                          void *storage, unsigned char *mask,
+                          bson_error_t * err)
 {
-    const bson_oid_t *oid;
-
-    uint8_t *dest;
+    monary_column_item *col;
 
-    if (BSON_ITER_HOLDS_OID(bsonit)) {
-        oid = bson_iter_oid(bsonit);
-        dest = ((uint8_t *) citem->storage) + (idx * sizeof(bson_oid_t));
-        memcpy(dest, oid->bytes, sizeof(bson_oid_t));
-        return 1;
+    if (coldata == NULL || colnum >= coldata->num_columns) {
+        monary_error(err, "invalid column passed to "
+                     "monary_set_column_storage");
+        return -1;
     }
-    else {
-        return 0;
+    col = coldata->columns + colnum;
+    if (storage == NULL || (mask == NULL) != (col->mask == NULL)) {
+        monary_error(err, "null storage passed to "
+                     "monary_set_column_storage");
+        return -1;
     }
+
+    col->storage = storage;
+    col->mask = mask;
+    return 1;
 }
 
+/**
+ * Changes the number of rows that the column data can hold. The storage of
+ * every column must already be large enough for num_rows elements, except
+ * that of item columns of lists, which is never indexed by row.
+ *
+ * @param coldata A pointer to the column data to modify.
+ * @param num_rows The new number of rows.
+ *
+ * @return 1 if successful; 0 if coldata is NULL.
+ */
 int
-monary_load_bool_value(const bson_iter_t * bsonit,
-                       monary_column_item * citem, int idx)
+monary_resize_column_data(monary_column_data * coldata, unsigned int num_rows)
 {
-    bool value;
-
-    value = bson_iter_bool(bsonit);
-    memcpy(((bool *) citem->storage) + idx, &value, sizeof(bool));
+    if (coldata == NULL) {
+        return 0;
+    }
+    coldata->num_rows = num_rows;
     return 1;
 }
 
-#define MONARY_DEFINE_FLOAT_LOADER(FUNCNAME, NUMTYPE)                        \
-int FUNCNAME (const bson_iter_t* bsonit,                                     \
-              monary_column_item* citem,                                     \
-              int idx)                                                       \
-{                                                                            \
-    NUMTYPE value;                                                           \
-    if (BSON_ITER_HOLDS_DOUBLE(bsonit)) {                                    \
-        value = (NUMTYPE) bson_iter_double(bsonit);                          \
-        memcpy(((NUMTYPE*) citem->storage) + idx, &value, sizeof(NUMTYPE));  \
-        return 1;                                                            \
-    } else if (BSON_ITER_HOLDS_INT32(bsonit)) {                              \
-        value = (NUMTYPE) bson_iter_int32(bsonit);                           \
-        memcpy(((NUMTYPE*) citem->storage) + idx, &value, sizeof(NUMTYPE));  \
-        return 1;                                                            \
-    } else if (BSON_ITER_HOLDS_INT64(bsonit)) {                              \
-        value = (NUMTYPE) bson_iter_int64(bsonit);                           \
-        memcpy(((NUMTYPE*) citem->storage) + idx, &value, sizeof(NUMTYPE));  \
-        return 1;                                                            \
-    } else {                                                                 \
-        return 0;                                                            \
-    }                                                                        \
-}
-
-// Floating point
-MONARY_DEFINE_FLOAT_LOADER(monary_load_float32_value, float)
-MONARY_DEFINE_FLOAT_LOADER(monary_load_float64_value, double)
-
-#define MONARY_DEFINE_INT_LOADER(FUNCNAME, NUMTYPE)                          \
-int FUNCNAME (const bson_iter_t* bsonit,                                     \
-              monary_column_item* citem,                                     \
-              int idx)                                                       \
-{                                                                            \
-    NUMTYPE value;                                                           \
-    if (BSON_ITER_HOLDS_INT32(bsonit)) {                                     \
-        value = (NUMTYPE) bson_iter_int32(bsonit);                           \
-        memcpy(((NUMTYPE*) citem->storage) + idx, &value, sizeof(NUMTYPE));  \
-        return 1;                                                            \
-    } else if (BSON_ITER_HOLDS_INT64(bsonit)) {                              \
-        value = (NUMTYPE) bson_iter_int64(bsonit);                           \
-        memcpy(((NUMTYPE*) citem->storage) + idx, &value, sizeof(NUMTYPE));  \
-        return 1;                                                            \
-    } else if (BSON_ITER_HOLDS_DOUBLE(bsonit)) {                             \
-        value = (NUMTYPE) bson_iter_double(bsonit);                          \
-        memcpy(((NUMTYPE*) citem->storage) + idx, &value, sizeof(NUMTYPE));  \
-        return 1;                                                            \
-    } else {                                                                 \
-        return 0;                                                            \
-    }                                                                        \
-}
-// Signed integers
-MONARY_DEFINE_INT_LOADER(monary_load_int8_value, int8_t)
-MONARY_DEFINE_INT_LOADER(monary_load_int16_value, int16_t)
-MONARY_DEFINE_INT_LOADER(monary_load_int32_value, int32_t)
-MONARY_DEFINE_INT_LOADER(monary_load_int64_value, int64_t)
-// Unsigned integers
-MONARY_DEFINE_INT_LOADER(monary_load_uint8_value, uint8_t)
-MONARY_DEFINE_INT_LOADER(monary_load_uint16_value, uint16_t)
-MONARY_DEFINE_INT_LOADER(monary_load_uint32_value, uint32_t)
-MONARY_DEFINE_INT_LOADER(monary_load_uint64_value, uint64_t)
-
-int monary_load_datetime_value(const bson_iter_t * bsonit,
-                                    monary_column_item * citem, int idx)
+/**
+ * Gets the size in bytes of a value of a fixed-size scalar type.
+ *
+ * @param type The type, as specified by the Monary type enum.
+ *
+ * @return The size, or 0 if the type is not a fixed-size scalar type.
+ */
+unsigned int
+monary_type_size(unsigned int type)
 {
-    int64_t value;
-
-    if (BSON_ITER_HOLDS_DATE_TIME(bsonit)) {
-        value = bson_iter_date_time(bsonit);
-        memcpy(((int64_t *) citem->storage) + idx, &value, sizeof(int64_t));
+    switch (type) {
+    case TYPE_BOOL:
+    case TYPE_INT8:
+    case TYPE_UINT8:
         return 1;
-    }
-    else {
+    case TYPE_INT16:
+    case TYPE_UINT16:
+        return 2;
+    case TYPE_INT32:
+    case TYPE_UINT32:
+    case TYPE_FLOAT32:
+        return 4;
+    case TYPE_INT64:
+    case TYPE_UINT64:
+    case TYPE_FLOAT64:
+    case TYPE_DATE:
+        return 8;
+    default:
         return 0;
     }
 }
 
+/**
+ * Sets the element type of a vector column, which must already have been set
+ * up by monary_set_column_item with type TYPE_VECTOR or TYPE_BINARY_VECTOR
+ * and its dimension as the type_arg.
+ *
+ * @param coldata A pointer to the column data to modify.
+ * @param colnum The number of the column item to modify.
+ * @param elem_type The type of each element, which must be a fixed-size
+ * scalar type.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return 1 if the modification was performed successfully; -1 otherwise.
+ */
 int
-monary_load_timestamp_value(const bson_iter_t * bsonit,
-                            monary_column_item * citem, int idx)
+monary_set_column_vector(monary_column_data * coldata,
+                         unsigned int colnum,
+                         unsigned int elem_type, bson_error_t * err)
 {
-    uint32_t timestamp;
-
-    uint32_t increment;
-
-    char *dest;                 // Would be void*, but Windows compilers complain
+    monary_column_item *col;
 
-    dest = (char *)citem->storage + idx * sizeof(int64_t);
-    if (BSON_ITER_HOLDS_TIMESTAMP(bsonit)) {
-        bson_iter_timestamp(bsonit, &timestamp, &increment);
-        memcpy(dest, &timestamp, sizeof(int32_t));
-        memcpy(dest + sizeof(int32_t), &increment, sizeof(int32_t));
-        return 1;
+    if (coldata == NULL || colnum >= coldata->num_columns) {
+        monary_error(err, "invalid column passed to "
+                     "monary_set_column_vector");
+        return -1;
     }
-    else {
-        return 0;
+    col = coldata->columns + colnum;
+    if (!MONARY_IS_VECTOR_TYPE(col->type) || col->type_arg == 0) {
+        monary_error(err, "column passed to monary_set_column_vector is not "
+                     "a vector");
+        return -1;
+    }
+    if (monary_type_size(elem_type) == 0) {
+        monary_error(err, "element type passed to monary_set_column_vector "
+                     "is not a fixed-size scalar type");
+        return -1;
     }
+    col->elem_type = elem_type;
+    return 1;
 }
 
+/**
+ * Sets the distance between the rows of a column's storage and mask, for a
+ * column loaded into a field of a structured array rather than into an array
+ * of its own. The column must already have been set up by
+ * monary_set_column_item, and cannot be a list, a variable-length or a
+ * category column.
+ *
+ * @param coldata A pointer to the column data to modify.
+ * @param colnum The number of the column item to modify.
+ * @param stride The number of bytes from the start of one row of storage to
+ * the next, or zero if the rows are packed.
+ * @param mask_stride The number of bytes from one row of the mask to the
+ * next, or zero if they are packed.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return 1 if the modification was performed successfully; -1 otherwise.
+ */
 int
-monary_load_string_value(const bson_iter_t * bsonit,
-                         monary_column_item * citem, int idx)
+monary_set_column_stride(monary_column_data * coldata,
+                         unsigned int colnum,
+                         unsigned int stride,
+                         unsigned int mask_stride, bson_error_t * err)
 {
-    char *dest;                 // Pointer to the final location of the array in mem
-
-    const char *src;            // Pointer to immutable buffer
-
-    int size;
-
-    uint32_t stringlen;         // The size of the string according to iter_utf8
+    monary_column_item *col;
 
-    if (BSON_ITER_HOLDS_UTF8(bsonit)) {
-        src = bson_iter_utf8(bsonit, &stringlen);
-        size = citem->type_arg;
-        if (stringlen > size) {
-            stringlen = size;
-        }
-        dest = ((char *)citem->storage) + (idx * size);
-        // Note: numpy strings need not end in \0
-        memcpy(dest, src, stringlen);
-        return 1;
+    if (coldata == NULL || colnum >= coldata->num_columns) {
+        monary_error(err, "invalid column passed to "
+                     "monary_set_column_stride");
+        return -1;
     }
-    else {
-        return 0;
+    col = coldata->columns + colnum;
+    if (col->type == TYPE_LIST || col->type == TYPE_CATEGORY
+        || MONARY_IS_VARLEN_TYPE(col->type) || col->parent != 0) {
+        monary_error(err, "column passed to monary_set_column_stride must "
+                     "hold one fixed-size value per row");
+        return -1;
     }
+    col->stride = stride;
+    col->mask_stride = mask_stride;
+    return 1;
 }
 
-int
-monary_load_binary_value(const bson_iter_t * bsonit,
-                         monary_column_item * citem, int idx)
+/**
+ * Gets the size in bytes of one value of a column that can be an item column
+ * of a list.
+ *
+ * @param col The column.
+ *
+ * @return The size, or 0 if the column's type cannot be used for list items.
+ */
+unsigned int
+monary_item_width(const monary_column_item * col)
 {
-    bson_subtype_t subtype;
-
-    const uint8_t *binary;
-
-    int size;
+    switch (col->type) {
+    case TYPE_OBJECTID:
+        return sizeof(bson_oid_t);
+    case TYPE_TIMESTAMP:
+    case TYPE_ID_TIME:
+        return sizeof(int64_t);
+    case TYPE_STRING:
+    case TYPE_BINARY:
+    case TYPE_BSON:
+        return col->type_arg;
+    case TYPE_TYPE:
+        return sizeof(uint8_t);
+    case TYPE_SIZE:
+    case TYPE_LENGTH:
+        return sizeof(uint32_t);
+    case TYPE_CATEGORY:
+        return sizeof(int32_t);
+    default:
+        return monary_type_size(col->type);
+    }
+}
 
-    uint32_t binary_len;
+/**
+ * Makes a column an item column of a list column, so that it holds one value
+ * per element of the list's arrays. Both columns must already have been set
+ * up by monary_set_column_item, and the item column's field must lie below
+ * the list column's field.
+ *
+ * @param coldata A pointer to the column data to modify.
+ * @param colnum The number of the item column.
+ * @param parent The number of the list column.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return 1 if the modification was performed successfully; -1 otherwise.
+ */
+int
+monary_set_column_list_item(monary_column_data * coldata,
+                            unsigned int colnum,
+                            unsigned int parent, bson_error_t * err)
+{
+    monary_column_item *col;
 
-    uint8_t *dest;
+    if (coldata == NULL || colnum >= coldata->num_columns
+        || parent >= coldata->num_columns || parent == colnum) {
+        monary_error(err, "invalid column passed to "
+                     "monary_set_column_list_item");
+        return -1;
+    }
+    col = coldata->columns + colnum;
+    if (coldata->columns[parent].type != TYPE_LIST) {
+        monary_error(err, "parent passed to monary_set_column_list_item is "
+                     "not a list");
+        return -1;
+    }
+    if (monary_item_width(col) == 0) {
+        monary_error(err, "column passed to monary_set_column_list_item "
+                     "cannot hold list items");
+        return -1;
+    }
+    if (col->varbuf == NULL) {
+        col->varbuf = (monary_varbuf *) calloc(1, sizeof(monary_varbuf));
+    }
+    if (col->maskbuf == NULL) {
+        col->maskbuf = (monary_varbuf *) calloc(1, sizeof(monary_varbuf));
+    }
+    if (col->varbuf == NULL || col->maskbuf == NULL) {
+        monary_error(err, "failed to allocate list item buffers in "
+                     "monary_set_column_list_item");
+        return -1;
+    }
+    col->parent = parent + 1;
+    return 1;
+}
 
-    if (BSON_ITER_HOLDS_BINARY(bsonit)) {
-        // Load the binary
-        bson_iter_binary(bsonit, &subtype, &binary_len, &binary);
+/**
+ * Takes the data buffer of a variable-length column, so that it can be used
+ * without copying it. The column starts a new buffer on its next load, and
+ * the caller must pass the one returned to monary_free_buffer().
+ *
+ * @param coldata A pointer to the column data.
+ * @param colnum The number of the column item.
+ * @param size Set to the number of bytes in the buffer.
+ *
+ * @return A pointer to the start of the buffer, or NULL if the column is not
+ * of a variable-length type or the buffer is empty.
+ */
+uint8_t *
+monary_take_column_varbuf(monary_column_data * coldata,
+                          unsigned int colnum, uint64_t * size)
+{
+    monary_column_item *col;
 
-        // Size checking
-        size = citem->type_arg;
-        if (binary_len > size) {
-            binary_len = size;
+    uint8_t *data;
+
+    *size = 0;
+    if (coldata == NULL || colnum >= coldata->num_columns) {
+        return NULL;
+    }
+    col = coldata->columns + colnum;
+    if (col->varbuf == NULL || col->varbuf->len == 0) {
+        return NULL;
+    }
+    // Give back the unused capacity; shrinking cannot move the values, but
+    // keep the old block if it fails.
+    data = (uint8_t *) realloc(col->varbuf->data, col->varbuf->len);
+    if (data == NULL) {
+        data = col->varbuf->data;
+    }
+    *size = col->varbuf->len;
+    col->varbuf->data = NULL;
+    col->varbuf->len = 0;
+    col->varbuf->cap = 0;
+    return data;
+}
+
+/**
+ * Frees a buffer taken from column data with monary_take_column_varbuf().
+ *
+ * @param data The buffer to free. If NULL, no operation is performed.
+ */
+void
+monary_free_buffer(uint8_t * data)
+{
+    free(data);
+}
+
+/**
+ * Gets the values and masks of an item column of a list. Like the buffer of
+ * a variable-length column, they are overwritten by the next load that
+ * starts at row zero.
+ *
+ * @param coldata A pointer to the column data.
+ * @param colnum The number of the column item.
+ * @param num_items Set to the number of values.
+ * @param mask Set to the masks of the values.
+ *
+ * @return A pointer to the values, back to back, or NULL if the column is not
+ * an item column or holds no values.
+ */
+uint8_t *
+monary_column_items(monary_column_data * coldata,
+                    unsigned int colnum,
+                    uint64_t * num_items, uint8_t ** mask)
+{
+    monary_column_item *col;
+
+    *num_items = 0;
+    *mask = NULL;
+    if (coldata == NULL || colnum >= coldata->num_columns) {
+        return NULL;
+    }
+    col = coldata->columns + colnum;
+    if (col->parent == 0 || col->maskbuf == NULL) {
+        return NULL;
+    }
+    *num_items = col->maskbuf->len;
+    *mask = col->maskbuf->data;
+    return col->varbuf->data;
+}
+
+/**
+ * Makes room for more bytes at the end of a variable-length buffer, growing
+ * it geometrically.
+ *
+ * @param buf The buffer to grow.
+ * @param len The number of bytes that will be appended.
+ *
+ * @return 1 if successful; 0 if the buffer could not be grown.
+ */
+int
+monary_varbuf_reserve(monary_varbuf * buf, size_t len)
+{
+    uint8_t *data;
+
+    size_t cap;
+
+    if (buf->len + len > buf->cap) {
+        cap = buf->cap ? buf->cap : MONARY_VARBUF_MIN_CAPACITY;
+        while (cap < buf->len + len) {
+            cap *= 2;
+        }
+        data = (uint8_t *) realloc(buf->data, cap);
+        if (data == NULL) {
+            return 0;
         }
+        buf->data = data;
+        buf->cap = cap;
+    }
+    return 1;
+}
 
-        dest = ((uint8_t *) citem->storage) + (idx * size);
-        memcpy(dest, binary, binary_len);
+/**
+ * Appends bytes to a variable-length buffer, growing it geometrically.
+ *
+ * @param buf The buffer to append to.
+ * @param src The bytes to append.
+ * @param len The number of bytes to append.
+ *
+ * @return 1 if successful; 0 if the buffer could not be grown.
+ */
+int
+monary_varbuf_append(monary_varbuf * buf, const uint8_t * src, size_t len)
+{
+    if (!monary_varbuf_reserve(buf, len)) {
+        return 0;
+    }
+    if (len > 0) {
+        memcpy(buf->data + buf->len, src, len);
+    }
+    buf->len += len;
+    return 1;
+}
+
+/**
+ * Appends a value to a variable-length column and records where it ends.
+ *
+ * @param citem The column to load into.
+ * @param idx The row to load into.
+ * @param src The value's bytes.
+ * @param len The value's length in bytes.
+ *
+ * @return 1 if successful; 0 otherwise.
+ */
+int
+monary_load_varlen_value(monary_column_item * citem,
+                         int idx, const uint8_t * src, uint32_t len)
+{
+    int64_t end;
+
+    if (!monary_varbuf_append(citem->varbuf, src, len)) {
+        return 0;
+    }
+    end = (int64_t) citem->varbuf->len;
+    memcpy(((int64_t *) citem->storage) + idx, &end, sizeof(int64_t));
+    return 1;
+}
+
+int
+monary_load_objectid_value(const bson_iter_t * bsonit,
+                           monary_column_item * citem, int idx)
+{
+    const bson_oid_t *oid;
+
+    uint8_t *dest;
+
+    if (BSON_ITER_HOLDS_OID(bsonit)) {
+        oid = bson_iter_oid(bsonit);
+        dest = (uint8_t *) MONARY_ROW(citem, idx, sizeof(bson_oid_t));
+        memcpy(dest, oid->bytes, sizeof(bson_oid_t));
         return 1;
     }
     else {
@@ -548,175 +1065,1246 @@ monary_load_binary_value(const bson_iter_t * bsonit,
     }
 }
 
+/**
+ * Loads the creation time embedded in the first four bytes of an ObjectID,
+ * in milliseconds since the epoch so that it lines up with date columns.
+ */
 int
-monary_load_document_value(const bson_iter_t * bsonit,
-                           monary_column_item * citem, int idx)
+monary_load_id_time_value(const bson_iter_t * bsonit,
+                          monary_column_item * citem, int idx)
 {
-    uint32_t document_len;      // The length of document in bytes.
+    int64_t millis;
 
-    const uint8_t *document;    // Pointer to the immutable document buffer.
+    if (BSON_ITER_HOLDS_OID(bsonit)) {
+        millis = (int64_t) bson_oid_get_time_t(bson_iter_oid(bsonit)) * 1000;
+        memcpy(MONARY_ROW(citem, idx, sizeof(int64_t)), &millis,
+               sizeof(int64_t));
+        return 1;
+    }
+    else {
+        return 0;
+    }
+}
 
-    uint8_t *dest;
+int
+monary_load_bool_value(const bson_iter_t * bsonit,
+                       monary_column_item * citem, int idx)
+{
+    bool value;
 
-    if (BSON_ITER_HOLDS_DOCUMENT(bsonit)) {
-        bson_iter_document(bsonit, &document_len, &document);
-        if (document_len > citem->type_arg) {
-            document_len = citem->type_arg;
-        }
+    value = bson_iter_bool(bsonit);
+    memcpy(MONARY_ROW(citem, idx, sizeof(bool)), &value, sizeof(bool));
+    return 1;
+}
 
-        dest = ((uint8_t *) citem->storage) + (idx * document_len);
-        memcpy(dest, document, document_len);
+#define MONARY_DEFINE_FLOAT_LOADER(FUNCNAME, NUMTYPE)                        \
+int FUNCNAME (const bson_iter_t* bsonit,                                     \
+              monary_column_item* citem,                                     \
+              int idx)                                                       \
+{                                                                            \
+    NUMTYPE value;                                                           \
+    if (BSON_ITER_HOLDS_DOUBLE(bsonit)) {                                    \
+        value = (NUMTYPE) bson_iter_double(bsonit);                          \
+        memcpy(MONARY_ROW(citem, idx, sizeof(NUMTYPE)), &value,              \
+               sizeof(NUMTYPE));                                             \
+        return 1;                                                            \
+    } else if (BSON_ITER_HOLDS_INT32(bsonit)) {                              \
+        value = (NUMTYPE) bson_iter_int32(bsonit);                           \
+        memcpy(MONARY_ROW(citem, idx, sizeof(NUMTYPE)), &value,              \
+               sizeof(NUMTYPE));                                             \
+        return 1;                                                            \
+    } else if (BSON_ITER_HOLDS_INT64(bsonit)) {                              \
+        value = (NUMTYPE) bson_iter_int64(bsonit);                           \
+        memcpy(MONARY_ROW(citem, idx, sizeof(NUMTYPE)), &value,              \
+               sizeof(NUMTYPE));                                             \
+        return 1;                                                            \
+    } else {                                                                 \
+        return 0;                                                            \
+    }                                                                        \
+}
+
+// Floating point
+MONARY_DEFINE_FLOAT_LOADER(monary_load_float32_value, float)
+MONARY_DEFINE_FLOAT_LOADER(monary_load_float64_value, double)
+
+#define MONARY_DEFINE_INT_LOADER(FUNCNAME, NUMTYPE)                          \
+int FUNCNAME (const bson_iter_t* bsonit,                                     \
+              monary_column_item* citem,                                     \
+              int idx)                                                       \
+{                                                                            \
+    NUMTYPE value;                                                           \
+    if (BSON_ITER_HOLDS_INT32(bsonit)) {                                     \
+        value = (NUMTYPE) bson_iter_int32(bsonit);                           \
+        memcpy(MONARY_ROW(citem, idx, sizeof(NUMTYPE)), &value,              \
+               sizeof(NUMTYPE));                                             \
+        return 1;                                                            \
+    } else if (BSON_ITER_HOLDS_INT64(bsonit)) {                              \
+        value = (NUMTYPE) bson_iter_int64(bsonit);                           \
+        memcpy(MONARY_ROW(citem, idx, sizeof(NUMTYPE)), &value,              \
+               sizeof(NUMTYPE));                                             \
+        return 1;                                                            \
+    } else if (BSON_ITER_HOLDS_DOUBLE(bsonit)) {                             \
+        value = (NUMTYPE) bson_iter_double(bsonit);                          \
+        memcpy(MONARY_ROW(citem, idx, sizeof(NUMTYPE)), &value,              \
+               sizeof(NUMTYPE));                                             \
+        return 1;                                                            \
+    } else {                                                                 \
+        return 0;                                                            \
+    }                                                                        \
+}
+// Signed integers
+MONARY_DEFINE_INT_LOADER(monary_load_int8_value, int8_t)
+MONARY_DEFINE_INT_LOADER(monary_load_int16_value, int16_t)
+MONARY_DEFINE_INT_LOADER(monary_load_int32_value, int32_t)
+MONARY_DEFINE_INT_LOADER(monary_load_int64_value, int64_t)
+// Unsigned integers
+MONARY_DEFINE_INT_LOADER(monary_load_uint8_value, uint8_t)
+MONARY_DEFINE_INT_LOADER(monary_load_uint16_value, uint16_t)
+MONARY_DEFINE_INT_LOADER(monary_load_uint32_value, uint32_t)
+MONARY_DEFINE_INT_LOADER(monary_load_uint64_value, uint64_t)
+
+int monary_load_datetime_value(const bson_iter_t * bsonit,
+                                    monary_column_item * citem, int idx)
+{
+    int64_t value;
+
+    if (BSON_ITER_HOLDS_DATE_TIME(bsonit)) {
+        value = bson_iter_date_time(bsonit);
+        memcpy(MONARY_ROW(citem, idx, sizeof(int64_t)), &value,
+               sizeof(int64_t));
+        return 1;
+    }
+    else {
+        return 0;
+    }
+}
+
+int
+monary_load_timestamp_value(const bson_iter_t * bsonit,
+                            monary_column_item * citem, int idx)
+{
+    uint32_t timestamp;
+
+    uint32_t increment;
+
+    char *dest;                 // Would be void*, but Windows compilers complain
+
+    dest = MONARY_ROW(citem, idx, sizeof(int64_t));
+    if (BSON_ITER_HOLDS_TIMESTAMP(bsonit)) {
+        bson_iter_timestamp(bsonit, &timestamp, &increment);
+        memcpy(dest, &timestamp, sizeof(int32_t));
+        memcpy(dest + sizeof(int32_t), &increment, sizeof(int32_t));
         return 1;
     }
-    else {
-        return 0;
+    else {
+        return 0;
+    }
+}
+
+int
+monary_load_string_value(const bson_iter_t * bsonit,
+                         monary_column_item * citem, int idx)
+{
+    char *dest;                 // Pointer to the final location of the array in mem
+
+    const char *src;            // Pointer to immutable buffer
+
+    int size;
+
+    uint32_t stringlen;         // The size of the string according to iter_utf8
+
+    if (BSON_ITER_HOLDS_UTF8(bsonit)) {
+        src = bson_iter_utf8(bsonit, &stringlen);
+        size = citem->type_arg;
+        if (stringlen > size) {
+            stringlen = size;
+        }
+        dest = MONARY_ROW(citem, idx, size);
+        // Note: numpy strings need not end in \0, but the rest of the slot
+        // must be cleared, since storage is not zeroed beforehand
+        memcpy(dest, src, stringlen);
+        memset(dest + stringlen, 0, size - stringlen);
+        return 1;
+    }
+    else {
+        return 0;
+    }
+}
+
+int
+monary_load_binary_value(const bson_iter_t * bsonit,
+                         monary_column_item * citem, int idx)
+{
+    bson_subtype_t subtype;
+
+    const uint8_t *binary;
+
+    int size;
+
+    uint32_t binary_len;
+
+    uint8_t *dest;
+
+    if (BSON_ITER_HOLDS_BINARY(bsonit)) {
+        // Load the binary
+        bson_iter_binary(bsonit, &subtype, &binary_len, &binary);
+
+        // Size checking
+        size = citem->type_arg;
+        if (binary_len > size) {
+            binary_len = size;
+        }
+
+        dest = (uint8_t *) MONARY_ROW(citem, idx, size);
+        memcpy(dest, binary, binary_len);
+        memset(dest + binary_len, 0, size - binary_len);
+        return 1;
+    }
+    else {
+        return 0;
+    }
+}
+
+/**
+ * Loads BSON binary data into a row of a binary vector column by copying it
+ * as is, without parsing each element. The data must be generic or
+ * user-defined binary holding exactly the vector's values, in little-endian
+ * order, or a packed vector (subtype 9) of the same element type and length.
+ *
+ * @return 1 if successful; 0 otherwise, in which case the whole row is
+ * masked.
+ */
+int
+monary_load_binary_vector_value(const bson_iter_t * bsonit,
+                                monary_column_item * citem, int idx)
+{
+    bson_subtype_t subtype;
+
+    const uint8_t *binary;
+
+    uint32_t binary_len;
+
+    uint8_t dtype;
+
+    size_t row_size;
+
+    if (!BSON_ITER_HOLDS_BINARY(bsonit)) {
+        return 0;
+    }
+    bson_iter_binary(bsonit, &subtype, &binary_len, &binary);
+
+    if (subtype == MONARY_SUBTYPE_VECTOR) {
+        switch (citem->elem_type) {
+        case TYPE_INT8:
+            dtype = MONARY_VECTOR_DTYPE_INT8;
+            break;
+        case TYPE_FLOAT32:
+            dtype = MONARY_VECTOR_DTYPE_FLOAT32;
+            break;
+        default:
+            return 0;
+        }
+        if (binary_len < 2 || binary[0] != dtype || binary[1] != 0) {
+            return 0;
+        }
+        binary += 2;
+        binary_len -= 2;
+    }
+    else if (subtype != BSON_SUBTYPE_BINARY && subtype < BSON_SUBTYPE_USER) {
+        return 0;
+    }
+
+    row_size = (size_t) citem->type_arg * monary_type_size(citem->elem_type);
+    if (binary_len != row_size) {
+        return 0;
+    }
+    memcpy(MONARY_ROW(citem, idx, row_size), binary, row_size);
+    memset(MONARY_MASK_ROW(citem, idx, citem->type_arg), 0, citem->type_arg);
+    return 1;
+}
+
+int
+monary_load_document_value(const bson_iter_t * bsonit,
+                           monary_column_item * citem, int idx)
+{
+    uint32_t document_len;      // The length of document in bytes.
+
+    const uint8_t *document;    // Pointer to the immutable document buffer.
+
+    uint8_t *dest;
+
+    if (BSON_ITER_HOLDS_DOCUMENT(bsonit)) {
+        bson_iter_document(bsonit, &document_len, &document);
+        if (document_len > citem->type_arg) {
+            document_len = citem->type_arg;
+        }
+
+        dest = (uint8_t *) MONARY_ROW(citem, idx, citem->type_arg);
+        memcpy(dest, document, document_len);
+        memset(dest + document_len, 0, citem->type_arg - document_len);
+        return 1;
+    }
+    else {
+        return 0;
+    }
+}
+
+int
+monary_load_varstring_value(const bson_iter_t * bsonit,
+                            monary_column_item * citem, int idx)
+{
+    const char *src;
+
+    uint32_t stringlen;
+
+    if (BSON_ITER_HOLDS_UTF8(bsonit)) {
+        src = bson_iter_utf8(bsonit, &stringlen);
+        return monary_load_varlen_value(citem, idx, (const uint8_t *)src,
+                                        stringlen);
+    }
+    else {
+        return 0;
+    }
+}
+
+int
+monary_load_varbinary_value(const bson_iter_t * bsonit,
+                            monary_column_item * citem, int idx)
+{
+    bson_subtype_t subtype;
+
+    const uint8_t *binary;
+
+    uint32_t binary_len;
+
+    if (BSON_ITER_HOLDS_BINARY(bsonit)) {
+        bson_iter_binary(bsonit, &subtype, &binary_len, &binary);
+        return monary_load_varlen_value(citem, idx, binary, binary_len);
+    }
+    else {
+        return 0;
+    }
+}
+
+int
+monary_load_varbson_value(const bson_iter_t * bsonit,
+                          monary_column_item * citem, int idx)
+{
+    uint32_t document_len;
+
+    const uint8_t *document;
+
+    if (BSON_ITER_HOLDS_DOCUMENT(bsonit)) {
+        bson_iter_document(bsonit, &document_len, &document);
+        return monary_load_varlen_value(citem, idx, document, document_len);
+    }
+    else {
+        return 0;
+    }
+}
+
+uint32_t monary_plan_hash(const char *key, size_t len);
+
+/**
+ * Frees a category dictionary.
+ *
+ * @param dict The dictionary to free. If NULL, no operation is performed.
+ */
+void
+monary_category_dict_destroy(monary_category_dict * dict)
+{
+    if (dict) {
+        free(dict->strings.data);
+        free(dict->ends);
+        free(dict->hashes);
+        free(dict->index);
+        free(dict);
+    }
+}
+
+/**
+ * Finds the code of a string in a category dictionary, adding the string if
+ * it has not been seen.
+ *
+ * @param dict The category dictionary.
+ * @param str The string.
+ * @param len The length of the string in bytes.
+ *
+ * @return The code, or -1 if memory could not be allocated.
+ */
+int32_t
+monary_category_code(monary_category_dict * dict,
+                     const char *str, uint32_t len)
+{
+    unsigned int *index;
+
+    unsigned int new_len;
+
+    unsigned int slot;
+
+    unsigned int code;
+
+    unsigned int i;
+
+    int64_t *ends;
+
+    uint32_t *hashes;
+
+    int64_t start;
+
+    uint32_t hash;
+
+    hash = monary_plan_hash(str, len);
+    slot = hash & (dict->index_len - 1);
+    while (dict->index[slot]) {
+        code = dict->index[slot] - 1;
+        start = code ? dict->ends[code - 1] : 0;
+        if (dict->hashes[code] == hash && dict->ends[code] - start == len
+            && memcmp(dict->strings.data + start, str, len) == 0) {
+            return (int32_t) code;
+        }
+        slot = (slot + 1) & (dict->index_len - 1);
+    }
+
+    if (dict->num_codes >= INT32_MAX) {
+        return -1;
+    }
+
+    // Keep the index at most half full
+    if (2 * (dict->num_codes + 1) > dict->index_len) {
+        new_len = dict->index_len * 2;
+        index = (unsigned int *) calloc(new_len, sizeof(unsigned int));
+        if (index == NULL) {
+            return -1;
+        }
+        for (i = 0; i < dict->num_codes; i++) {
+            slot = dict->hashes[i] & (new_len - 1);
+            while (index[slot]) {
+                slot = (slot + 1) & (new_len - 1);
+            }
+            index[slot] = i + 1;
+        }
+        free(dict->index);
+        dict->index = index;
+        dict->index_len = new_len;
+        slot = hash & (new_len - 1);
+        while (index[slot]) {
+            slot = (slot + 1) & (new_len - 1);
+        }
+    }
+    if (dict->num_codes == dict->cap_codes) {
+        new_len = dict->cap_codes * 2;
+        ends = (int64_t *) realloc(dict->ends, new_len * sizeof(int64_t));
+        if (ends == NULL) {
+            return -1;
+        }
+        hashes = (uint32_t *) realloc(dict->hashes,
+                                      new_len * sizeof(uint32_t));
+        if (hashes == NULL) {
+            // realloc has already moved the old ends, so keep the larger
+            // array; cap_codes still bounds how much of it is used.
+            dict->ends = ends;
+            return -1;
+        }
+        dict->ends = ends;
+        dict->hashes = hashes;
+        dict->cap_codes = new_len;
+    }
+    if (!monary_varbuf_append(&dict->strings, (const uint8_t *)str, len)) {
+        return -1;
+    }
+
+    code = dict->num_codes++;
+    dict->ends[code] = (int64_t) dict->strings.len;
+    dict->hashes[code] = hash;
+    dict->index[slot] = code + 1;
+    return (int32_t) code;
+}
+
+int
+monary_load_category_value(const bson_iter_t * bsonit,
+                           monary_column_item * citem, int idx)
+{
+    const char *src;
+
+    uint32_t stringlen;
+
+    int32_t code;
+
+    if (citem->dict != NULL && BSON_ITER_HOLDS_UTF8(bsonit)) {
+        src = bson_iter_utf8(bsonit, &stringlen);
+        code = monary_category_code(citem->dict, src, stringlen);
+        if (code < 0) {
+            return 0;
+        }
+        memcpy(((int32_t *) citem->storage) + idx, &code, sizeof(int32_t));
+        return 1;
+    }
+    else {
+        return 0;
+    }
+}
+
+int
+monary_load_type_value(const bson_iter_t * bsonit,
+                       monary_column_item * citem, int idx)
+{
+    uint8_t type;
+
+    uint8_t *dest;
+
+    type = (uint8_t) bson_iter_type(bsonit);
+    dest = (uint8_t *) MONARY_ROW(citem, idx, sizeof(uint8_t));
+    memcpy(dest, &type, sizeof(uint8_t));
+    return 1;
+}
+
+int
+monary_load_size_value(const bson_iter_t * bsonit,
+                       monary_column_item * citem, int idx)
+{
+    bson_type_t type;
+
+    const uint8_t *discard;
+
+    uint32_t size;
+
+    uint32_t *dest;
+
+    type = bson_iter_type(bsonit);
+    switch (type) {
+    case BSON_TYPE_UTF8:
+    case BSON_TYPE_CODE:
+        bson_iter_utf8(bsonit, &size);
+        break;
+    case BSON_TYPE_BINARY:
+        bson_iter_binary(bsonit, NULL, &size, &discard);
+        break;
+    case BSON_TYPE_DOCUMENT:
+        bson_iter_document(bsonit, &size, &discard);
+        break;
+    case BSON_TYPE_ARRAY:
+        bson_iter_array(bsonit, &size, &discard);
+        break;
+    default:
+        return 0;
+    }
+    dest = (uint32_t *) MONARY_ROW(citem, idx, sizeof(uint32_t));
+    memcpy(dest, &size, sizeof(uint32_t));
+    return 1;
+}
+
+int
+monary_load_length_value(const bson_iter_t * bsonit,
+                         monary_column_item * citem, int idx)
+{
+    bson_type_t type;
+
+    bson_iter_t child;
+
+    const char *discard;
+
+    uint32_t length;
+
+    uint32_t *dest;
+
+    type = bson_iter_type(bsonit);
+    switch (type) {
+    case BSON_TYPE_UTF8:
+    case BSON_TYPE_CODE:
+        discard = bson_iter_utf8(bsonit, &length);
+        for (length = 0; *discard; length++) {
+            discard = bson_utf8_next_char(discard);
+        }
+        break;
+    case BSON_TYPE_ARRAY:
+    case BSON_TYPE_DOCUMENT:
+        if (!bson_iter_recurse(bsonit, &child)) {
+            return 0;
+        }
+        for (length = 0; bson_iter_next(&child); length++);
+        break;
+    case BSON_TYPE_BINARY:
+        bson_iter_binary(bsonit, NULL, &length, (const uint8_t **)&discard);
+        break;
+    default:
+        return 0;
+    }
+
+    dest = (uint32_t *) MONARY_ROW(citem, idx, sizeof(uint32_t));
+    memcpy(dest, &length, sizeof(uint32_t));
+    return 1;
+}
+
+int monary_load_vector_value(const bson_iter_t * bsonit,
+                             monary_column_item * citem, int idx);
+
+#define MONARY_DISPATCH_TYPE(TYPENAME, TYPEFUNC)    \
+case TYPENAME:                                      \
+success = TYPEFUNC(bsonit, citem, offset);          \
+break;
+
+int
+monary_load_item(const bson_iter_t * bsonit,
+                 monary_column_item * citem, int offset)
+{
+    int success = 0;
+
+    switch (citem->type) {
+        MONARY_DISPATCH_TYPE(TYPE_OBJECTID, monary_load_objectid_value)
+        MONARY_DISPATCH_TYPE(TYPE_ID_TIME, monary_load_id_time_value)
+        MONARY_DISPATCH_TYPE(TYPE_DATE, monary_load_datetime_value)
+        MONARY_DISPATCH_TYPE(TYPE_TIMESTAMP, monary_load_timestamp_value)
+        MONARY_DISPATCH_TYPE(TYPE_BOOL, monary_load_bool_value)
+
+        MONARY_DISPATCH_TYPE(TYPE_INT8, monary_load_int8_value)
+        MONARY_DISPATCH_TYPE(TYPE_INT16, monary_load_int16_value)
+        MONARY_DISPATCH_TYPE(TYPE_INT32, monary_load_int32_value)
+        MONARY_DISPATCH_TYPE(TYPE_INT64, monary_load_int64_value)
+
+        MONARY_DISPATCH_TYPE(TYPE_UINT8, monary_load_uint8_value)
+        MONARY_DISPATCH_TYPE(TYPE_UINT16, monary_load_uint16_value)
+        MONARY_DISPATCH_TYPE(TYPE_UINT32, monary_load_uint32_value)
+        MONARY_DISPATCH_TYPE(TYPE_UINT64, monary_load_uint64_value)
+
+        MONARY_DISPATCH_TYPE(TYPE_FLOAT32, monary_load_float32_value)
+        MONARY_DISPATCH_TYPE(TYPE_FLOAT64, monary_load_float64_value)
+
+        MONARY_DISPATCH_TYPE(TYPE_STRING, monary_load_string_value)
+        MONARY_DISPATCH_TYPE(TYPE_BINARY, monary_load_binary_value)
+        MONARY_DISPATCH_TYPE(TYPE_BSON, monary_load_document_value)
+
+        MONARY_DISPATCH_TYPE(TYPE_VARSTRING, monary_load_varstring_value)
+        MONARY_DISPATCH_TYPE(TYPE_VARBINARY, monary_load_varbinary_value)
+        MONARY_DISPATCH_TYPE(TYPE_VARBSON, monary_load_varbson_value)
+        MONARY_DISPATCH_TYPE(TYPE_CATEGORY, monary_load_category_value)
+        MONARY_DISPATCH_TYPE(TYPE_VECTOR, monary_load_vector_value)
+        MONARY_DISPATCH_TYPE(TYPE_BINARY_VECTOR,
+                             monary_load_binary_vector_value)
+
+        MONARY_DISPATCH_TYPE(TYPE_SIZE, monary_load_size_value)
+        MONARY_DISPATCH_TYPE(TYPE_LENGTH, monary_load_length_value)
+        MONARY_DISPATCH_TYPE(TYPE_TYPE, monary_load_type_value)
+    default:
+        DEBUG("%s does not match any Monary type", citem->field);
+        break;
+    }
+
+    return success;
+}
+
+/**
+ * Loads a BSON array into a row of a vector column, recursing into the array
+ * once and loading each element with the element type's loader. Elements that
+ * cannot be loaded are masked individually.
+ *
+ * @return 1 if the array has exactly as many elements as the vector's
+ * dimension; 0 otherwise, in which case the whole row is masked.
+ */
+int
+monary_load_vector_value(const bson_iter_t * bsonit,
+                         monary_column_item * citem, int idx)
+{
+    monary_column_item elem;
+
+    bson_iter_t child;
+
+    unsigned char *mask;
+
+    unsigned int dim;
+
+    unsigned int n;
+
+    if (!BSON_ITER_HOLDS_ARRAY(bsonit) || !bson_iter_recurse(bsonit, &child)) {
+        return 0;
+    }
+
+    // Load elements through a copy of the column pointed at this row
+    dim = citem->type_arg;
+    memset(&elem, 0, sizeof(monary_column_item));
+    elem.field = citem->field;
+    elem.type = citem->elem_type;
+    elem.storage = MONARY_ROW(citem, idx,
+                              (size_t) dim *
+                              monary_type_size(citem->elem_type));
+    mask = MONARY_MASK_ROW(citem, idx, dim);
+
+    for (n = 0; bson_iter_next(&child); n++) {
+        if (n < dim) {
+            mask[n] = !monary_load_item(&child, &elem, n);
+        }
+    }
+    return n == dim;
+}
+
+/**
+ * Computes the 32-bit FNV-1a hash of a field name component.
+ */
+uint32_t
+monary_plan_hash(const char *key, size_t len)
+{
+    uint32_t hash = 2166136261u;
+
+    size_t i;
+
+    for (i = 0; i < len; i++) {
+        hash ^= (uint8_t) key[i];
+        hash *= 16777619u;
+    }
+    return hash;
+}
+
+/**
+ * Finds or creates the child of a plan node with the given key.
+ *
+ * @param node The parent node.
+ * @param key The (not necessarily null-terminated) key of the child.
+ * @param len The length of key in bytes.
+ *
+ * @return The child node, or NULL if memory could not be allocated.
+ */
+monary_plan_node *
+monary_plan_child(monary_plan_node * node, const char *key, size_t len)
+{
+    monary_plan_node **children;
+
+    monary_plan_node *child;
+
+    unsigned char *seen;
+
+    uint32_t hash;
+
+    unsigned int i;
+
+    hash = monary_plan_hash(key, len);
+    for (i = 0; i < node->num_children; i++) {
+        child = node->children[i];
+        if (child->hash == hash && strlen(child->key) == len
+            && memcmp(child->key, key, len) == 0) {
+            return child;
+        }
+    }
+
+    child = (monary_plan_node *) calloc(1, sizeof(monary_plan_node));
+    children = (monary_plan_node **) realloc(node->children,
+                                             (node->num_children + 1) *
+                                             sizeof(monary_plan_node *));
+    seen = (unsigned char *) realloc(node->seen, node->num_children + 1);
+    if (children) {
+        node->children = children;
+    }
+    if (seen) {
+        node->seen = seen;
+    }
+    if (!child || !children || !seen) {
+        free(child);
+        return NULL;
+    }
+    child->key = (char *) malloc(len + 1);
+    if (!child->key) {
+        free(child);
+        return NULL;
+    }
+    memcpy(child->key, key, len);
+    child->key[len] = '\0';
+    child->hash = hash;
+    node->children[node->num_children++] = child;
+    return child;
+}
+
+/**
+ * Releases the resources held by a plan node and all of its descendants,
+ * but not the node itself.
+ */
+void
+monary_plan_node_clear(monary_plan_node * node)
+{
+    unsigned int i;
+
+    for (i = 0; i < node->num_children; i++) {
+        monary_plan_node_clear(node->children[i]);
+        free(node->children[i]);
+    }
+    free(node->key);
+    free(node->columns);
+    free(node->children);
+    free(node->seen);
+    free(node->order);
+    free(node->items);
+}
+
+/**
+ * Destroys a field plan created with monary_plan_new().
+ */
+void
+monary_plan_destroy(monary_field_plan * plan)
+{
+    if (plan) {
+        monary_plan_node_clear(&plan->root);
+        free(plan->loaded);
+        free(plan);
+    }
+}
+
+/**
+ * Records every column below a list node as one of the list's item columns.
+ *
+ * @param list The list node.
+ * @param node The list node or one of its descendants.
+ * @param coldata The column data the plan is compiled from.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return 1 if successful; 0 otherwise.
+ */
+int
+monary_plan_collect_items(monary_plan_node * list,
+                          monary_plan_node * node,
+                          monary_column_data * coldata, bson_error_t * err)
+{
+    unsigned int *items;
+
+    unsigned int i;
+
+    for (i = 0; i < node->num_children; i++) {
+        if (!monary_plan_collect_items(list, node->children[i], coldata,
+                                       err)) {
+            return 0;
+        }
+    }
+    if (node == list) {
+        return 1;
+    }
+    for (i = 0; i < node->num_columns; i++) {
+        if (coldata->columns[node->columns[i]].parent != list->list_column) {
+            monary_error(err, "a column below a list column was not set up "
+                         "as an item column of that list");
+            return 0;
+        }
+        items = (unsigned int *) realloc(list->items,
+                                         (list->num_items + 1) *
+                                         sizeof(unsigned int));
+        if (!items) {
+            monary_error(err, "unable to allocate field plan in "
+                         "monary_plan_new");
+            return 0;
+        }
+        list->items = items;
+        list->items[list->num_items++] = node->columns[i];
+    }
+    return 1;
+}
+
+/**
+ * Finds the list nodes at or below a plan node and collects their item
+ * columns.
+ *
+ * @param node The plan node to start from.
+ * @param coldata The column data the plan is compiled from.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return The number of item columns found, or -1 on failure.
+ */
+int
+monary_plan_compile_lists(monary_plan_node * node,
+                          monary_column_data * coldata, bson_error_t * err)
+{
+    unsigned int i;
+
+    int num_items;
+
+    int found;
+
+    if (node->list_column) {
+        for (i = 0; i < node->num_children; i++) {
+            if (strcmp(node->children[i]->key, "$") == 0) {
+                node->elem = node->children[i];
+                node->children[i] = node->children[node->num_children - 1];
+                node->children[node->num_children - 1] = node->elem;
+                break;
+            }
+        }
+        if (!monary_plan_collect_items(node, node, coldata, err)) {
+            return -1;
+        }
+        return (int) node->num_items;
+    }
+
+    num_items = 0;
+    for (i = 0; i < node->num_children; i++) {
+        found = monary_plan_compile_lists(node->children[i], coldata, err);
+        if (found < 0) {
+            return -1;
+        }
+        num_items += found;
+    }
+    return num_items;
+}
+
+/**
+ * Compiles the field names of the given column data into a field plan: a trie
+ * keyed on the components of each dotted path. Columns that name the same
+ * field share a single node.
+ *
+ * @param coldata The column data whose fields have all been set.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return A plan that should be freed with monary_plan_destroy(), or NULL on
+ * failure.
+ */
+monary_field_plan *
+monary_plan_new(monary_column_data * coldata, bson_error_t * err)
+{
+    monary_field_plan *plan;
+
+    monary_plan_node *node;
+
+    unsigned int *columns;
+
+    const char *field;
+
+    const char *dot;
+
+    unsigned int i;
+
+    int num_items;
+
+    int found;
+
+    plan = (monary_field_plan *) calloc(1, sizeof(monary_field_plan));
+    if (!plan) {
+        monary_error(err, "unable to allocate field plan in "
+                     "monary_plan_new");
+        return NULL;
+    }
+    plan->num_columns = coldata->num_columns;
+    plan->loaded = (unsigned char *) calloc(coldata->num_columns + 1, 1);
+    if (!plan->loaded) {
+        goto fail;
+    }
+    num_items = 0;
+
+    for (i = 0; i < coldata->num_columns; i++) {
+        field = coldata->columns[i].field;
+        if (field == NULL) {
+            monary_error(err, "column field was not set before building "
+                         "the field plan");
+            monary_plan_destroy(plan);
+            return NULL;
+        }
+
+        // Walk (and extend) the trie one path component at a time
+        node = &plan->root;
+        do {
+            dot = strchr(field, '.');
+            node = monary_plan_child(node, field,
+                                     dot ? (size_t) (dot - field)
+                                     : strlen(field));
+            if (!node) {
+                goto fail;
+            }
+            field = dot + 1;
+        } while (dot);
+
+        columns = (unsigned int *) realloc(node->columns,
+                                           (node->num_columns + 1) *
+                                           sizeof(unsigned int));
+        if (!columns) {
+            goto fail;
+        }
+        node->columns = columns;
+        node->columns[node->num_columns++] = i;
+
+        if (coldata->columns[i].type == TYPE_LIST) {
+            if (node->list_column) {
+                monary_error(err, "a field was given more than one list "
+                             "column");
+                monary_plan_destroy(plan);
+                return NULL;
+            }
+            node->list_column = i + 1;
+        }
+        if (coldata->columns[i].parent) {
+            num_items++;
+        }
+    }
+
+    // Every item column must lie below its own list column
+    found = monary_plan_compile_lists(&plan->root, coldata, err);
+    if (found != num_items) {
+        if (found >= 0) {
+            monary_error(err, "an item column is not below its list column");
+        }
+        monary_plan_destroy(plan);
+        return NULL;
     }
+
+    return plan;
+
+  fail:
+    monary_error(err, "unable to allocate field plan in monary_plan_new");
+    monary_plan_destroy(plan);
+    return NULL;
 }
 
+/**
+ * Finds the unmatched child of a plan node whose name is the current key of
+ * the iterator. The child matched at the same position of the previous
+ * document is tried first, so documents with a stable field order resolve
+ * each key with a single comparison.
+ *
+ * @param node The plan node for the (sub)document being walked.
+ * @param bsonit An iterator positioned on the element to match.
+ * @param pos The position of the element within its (sub)document.
+ *
+ * @return The index of the matching child, or -1 if no child matches.
+ */
 int
-monary_load_type_value(const bson_iter_t * bsonit,
-                       monary_column_item * citem, int idx)
+monary_plan_match(monary_plan_node * node,
+                  const bson_iter_t * bsonit, unsigned int pos)
 {
-    uint8_t type;
+    monary_plan_node *child;
 
-    uint8_t *dest;
+    unsigned int *order;
 
-    type = (uint8_t) bson_iter_type(bsonit);
-    dest = ((uint8_t *) citem->storage) + idx;
-    memcpy(dest, &type, sizeof(uint8_t));
-    return 1;
-}
+    unsigned int new_len;
 
-int
-monary_load_size_value(const bson_iter_t * bsonit,
-                       monary_column_item * citem, int idx)
-{
-    bson_type_t type;
+    const char *key;
 
-    const uint8_t *discard;
+    uint32_t hash;
 
-    uint32_t size;
+    unsigned int i;
 
-    uint32_t *dest;
+    key = bson_iter_key(bsonit);
 
-    type = bson_iter_type(bsonit);
-    switch (type) {
-    case BSON_TYPE_UTF8:
-    case BSON_TYPE_CODE:
-        bson_iter_utf8(bsonit, &size);
-        break;
-    case BSON_TYPE_BINARY:
-        bson_iter_binary(bsonit, NULL, &size, &discard);
-        break;
-    case BSON_TYPE_DOCUMENT:
-        bson_iter_document(bsonit, &size, &discard);
-        break;
-    case BSON_TYPE_ARRAY:
-        bson_iter_array(bsonit, &size, &discard);
-        break;
-    default:
-        return 0;
+    // Positional fast path
+    if (pos < node->order_len && node->order[pos]) {
+        i = node->order[pos] - 1;
+        child = node->children[i];
+        if (!node->seen[i] && strcmp(child->key, key) == 0) {
+            return i;
+        }
     }
-    dest = ((uint32_t *) citem->storage) + idx;
-    memcpy(dest, &size, sizeof(uint32_t));
-    return 1;
+
+    // Fall back to comparing hashes against every unmatched child
+    hash = monary_plan_hash(key, strlen(key));
+    for (i = 0; i < node->num_children; i++) {
+        child = node->children[i];
+        if (!node->seen[i] && child->hash == hash
+            && strcmp(child->key, key) == 0) {
+            break;
+        }
+    }
+
+    // Remember what was found at this position for the next document
+    if (pos >= node->order_len) {
+        new_len = node->order_len ? node->order_len : 8;
+        while (new_len <= pos) {
+            new_len *= 2;
+        }
+        order = (unsigned int *) realloc(node->order,
+                                         new_len * sizeof(unsigned int));
+        if (order) {
+            memset(order + node->order_len, 0,
+                   (new_len - node->order_len) * sizeof(unsigned int));
+            node->order = order;
+            node->order_len = new_len;
+        }
+    }
+    if (pos < node->order_len) {
+        node->order[pos] = (i < node->num_children) ? i + 1 : 0;
+    }
+
+    return (i < node->num_children) ? (int) i : -1;
 }
 
-int
-monary_load_length_value(const bson_iter_t * bsonit,
-                         monary_column_item * citem, int idx)
+int monary_plan_walk_list(monary_plan_node * node,
+                          const bson_iter_t * bsonit,
+                          monary_field_plan * plan,
+                          monary_column_data * coldata, unsigned int row);
+
+/**
+ * Walks a (sub)document once, loading every column requested below the given
+ * plan node. Iteration stops as soon as all of the node's children have been
+ * matched; the "$" child of a list node names no field of its elements, so
+ * it is never waited for.
+ *
+ * @param node The plan node corresponding to the (sub)document.
+ * @param bsonit An iterator over the (sub)document, not yet advanced.
+ * @param plan The field plan, whose loaded flags record each success.
+ * @param coldata The column data to store values in.
+ * @param row The row number to store the data in.
+ */
+void
+monary_plan_walk(monary_plan_node * node,
+                 bson_iter_t * bsonit,
+                 monary_field_plan * plan,
+                 monary_column_data * coldata, unsigned int row)
 {
-    bson_type_t type;
+    bson_iter_t child_it;
 
-    bson_iter_t child;
+    monary_plan_node *child;
 
-    const char *discard;
+    unsigned int remaining;
 
-    uint32_t length;
+    unsigned int pos;
 
-    uint32_t *dest;
+    unsigned int i;
 
-    type = bson_iter_type(bsonit);
-    switch (type) {
-    case BSON_TYPE_UTF8:
-    case BSON_TYPE_CODE:
-        discard = bson_iter_utf8(bsonit, &length);
-        for (length = 0; *discard; length++) {
-            discard = bson_utf8_next_char(discard);
-        }
-        break;
-    case BSON_TYPE_ARRAY:
-    case BSON_TYPE_DOCUMENT:
-        if (!bson_iter_recurse(bsonit, &child)) {
-            return 0;
+    int idx;
+
+    remaining = node->num_children;
+    if (remaining == 0) {
+        return;
+    }
+    memset(node->seen, 0, node->num_children);
+    if (node->elem != NULL) {
+        // The last child; marking it seen keeps it from matching a key
+        node->seen[--remaining] = 1;
+        if (remaining == 0) {
+            return;
         }
-        for (length = 0; bson_iter_next(&child); length++);
-        break;
-    case BSON_TYPE_BINARY:
-        bson_iter_binary(bsonit, NULL, &length, (const uint8_t **)&discard);
-        break;
-    default:
-        return 0;
     }
 
-    dest = ((uint32_t *) citem->storage) + idx;
-    memcpy(dest, &length, sizeof(uint32_t));
-    return 1;
+    for (pos = 0; remaining > 0 && bson_iter_next(bsonit); pos++) {
+        idx = monary_plan_match(node, bsonit, pos);
+        if (idx < 0) {
+            continue;
+        }
+        // Only the first occurrence of a key is used
+        node->seen[idx] = 1;
+        remaining--;
+        child = node->children[idx];
+
+        for (i = 0; i < child->num_columns; i++) {
+            if (child->columns[i] + 1 == child->list_column) {
+                plan->loaded[child->columns[i]] =
+                    monary_plan_walk_list(child, bsonit, plan, coldata, row);
+            }
+            else {
+                plan->loaded[child->columns[i]] =
+                    monary_load_item(bsonit,
+                                     coldata->columns + child->columns[i],
+                                     row);
+            }
+        }
+        if (child->num_children > 0 && !child->list_column
+            && (BSON_ITER_HOLDS_DOCUMENT(bsonit)
+                || BSON_ITER_HOLDS_ARRAY(bsonit))
+            && bson_iter_recurse(bsonit, &child_it)) {
+            monary_plan_walk(child, &child_it, plan, coldata, row);
+        }
+    }
 }
 
-#define MONARY_DISPATCH_TYPE(TYPENAME, TYPEFUNC)    \
-case TYPENAME:                                      \
-success = TYPEFUNC(bsonit, citem, offset);          \
-break;
-
+/**
+ * Walks the elements of an array for a list column, appending one value per
+ * element to each of the list's item columns. Item columns below the list
+ * node read a field of each element, and those of its "$" child read each
+ * element itself. Values that cannot be loaded are masked individually.
+ *
+ * @param node The list node.
+ * @param bsonit An iterator positioned on the list's field.
+ * @param plan The field plan, whose loaded flags record each success.
+ * @param coldata The column data to store values in.
+ * @param row The row number of the document being loaded.
+ *
+ * @return 1 if the field holds an array; 0 otherwise.
+ */
 int
-monary_load_item(const bson_iter_t * bsonit,
-                 monary_column_item * citem, int offset)
+monary_plan_walk_list(monary_plan_node * node,
+                      const bson_iter_t * bsonit,
+                      monary_field_plan * plan,
+                      monary_column_data * coldata, unsigned int row)
 {
-    int success = 0;
+    bson_iter_t elem_it;
 
-    switch (citem->type) {
-        MONARY_DISPATCH_TYPE(TYPE_OBJECTID, monary_load_objectid_value)
-        MONARY_DISPATCH_TYPE(TYPE_DATE, monary_load_datetime_value)
-        MONARY_DISPATCH_TYPE(TYPE_TIMESTAMP, monary_load_timestamp_value)
-        MONARY_DISPATCH_TYPE(TYPE_BOOL, monary_load_bool_value)
+    bson_iter_t child_it;
 
-        MONARY_DISPATCH_TYPE(TYPE_INT8, monary_load_int8_value)
-        MONARY_DISPATCH_TYPE(TYPE_INT16, monary_load_int16_value)
-        MONARY_DISPATCH_TYPE(TYPE_INT32, monary_load_int32_value)
-        MONARY_DISPATCH_TYPE(TYPE_INT64, monary_load_int64_value)
+    monary_column_item *list;
 
-        MONARY_DISPATCH_TYPE(TYPE_UINT8, monary_load_uint8_value)
-        MONARY_DISPATCH_TYPE(TYPE_UINT16, monary_load_uint16_value)
-        MONARY_DISPATCH_TYPE(TYPE_UINT32, monary_load_uint32_value)
-        MONARY_DISPATCH_TYPE(TYPE_UINT64, monary_load_uint64_value)
+    monary_column_item *col;
 
-        MONARY_DISPATCH_TYPE(TYPE_FLOAT32, monary_load_float32_value)
-        MONARY_DISPATCH_TYPE(TYPE_FLOAT64, monary_load_float64_value)
+    unsigned int width;
 
-        MONARY_DISPATCH_TYPE(TYPE_STRING, monary_load_string_value)
-        MONARY_DISPATCH_TYPE(TYPE_BINARY, monary_load_binary_value)
-        MONARY_DISPATCH_TYPE(TYPE_BSON, monary_load_document_value)
+    unsigned int i;
 
-        MONARY_DISPATCH_TYPE(TYPE_SIZE, monary_load_size_value)
-        MONARY_DISPATCH_TYPE(TYPE_LENGTH, monary_load_length_value)
-        MONARY_DISPATCH_TYPE(TYPE_TYPE, monary_load_type_value)
-    default:
-        DEBUG("%s does not match any Monary type", citem->field);
-        break;
+    int64_t start;
+
+    int64_t end;
+
+    list = coldata->columns + (node->list_column - 1);
+    if (!BSON_ITER_HOLDS_ARRAY(bsonit)
+        || !bson_iter_recurse(bsonit, &elem_it)) {
+        return 0;
     }
 
-    return success;
+    start = row ? ((int64_t *) list->storage)[row - 1] : 0;
+    end = start;
+    while (bson_iter_next(&elem_it)) {
+        for (i = 0; i < node->num_items; i++) {
+            col = coldata->columns + node->items[i];
+            if (!monary_varbuf_reserve(col->varbuf, monary_item_width(col))
+                || !monary_varbuf_reserve(col->maskbuf, 1)) {
+                // Drop this document's items so the columns stay aligned
+                for (i = 0; i < node->num_items; i++) {
+                    col = coldata->columns + node->items[i];
+                    col->varbuf->len = (size_t) start * monary_item_width(col);
+                    col->maskbuf->len = (size_t) start;
+                }
+                return 0;
+            }
+        }
+
+        // Append a masked placeholder to every item column
+        for (i = 0; i < node->num_items; i++) {
+            col = coldata->columns + node->items[i];
+            width = monary_item_width(col);
+            memset(col->varbuf->data + col->varbuf->len,
+                   col->type == TYPE_CATEGORY ? 0xff : 0, width);
+            col->varbuf->len += width;
+            col->maskbuf->data[col->maskbuf->len++] = 1;
+            col->storage = col->varbuf->data;
+            col->mask = col->maskbuf->data;
+            plan->loaded[node->items[i]] = 0;
+        }
+
+        if (node->elem != NULL) {
+            for (i = 0; i < node->elem->num_columns; i++) {
+                plan->loaded[node->elem->columns[i]] =
+                    monary_load_item(&elem_it,
+                                     coldata->columns +
+                                     node->elem->columns[i], (int)end);
+            }
+        }
+        if (node->num_children > (node->elem != NULL ? 1u : 0u)
+            && (BSON_ITER_HOLDS_DOCUMENT(&elem_it)
+                || BSON_ITER_HOLDS_ARRAY(&elem_it))
+            && bson_iter_recurse(&elem_it, &child_it)) {
+            monary_plan_walk(node, &child_it, plan, coldata,
+                             (unsigned int)end);
+        }
+
+        for (i = 0; i < node->num_items; i++) {
+            col = coldata->columns + node->items[i];
+            col->mask[end] = !plan->loaded[node->items[i]];
+        }
+        end++;
+    }
+
+    memcpy(((int64_t *) list->storage) + row, &end, sizeof(int64_t));
+    return 1;
 }
 
 /**
- * Copies over raw BSON data into Monary column storage. This function
- * determines the types of the data, dispatches to an appropriate handler and
- * copies over the data. It keeps a count of any unsuccessful loads and sets
- * NumPy-compatible masks on the data as appropriate.
+ * Copies over raw BSON data into Monary column storage. This function walks
+ * the document once according to the given field plan, dispatches each
+ * requested value to an appropriate handler and copies over the data. It
+ * keeps a count of any unsuccessful loads and sets NumPy-compatible masks on
+ * the data as appropriate.
  *
  * @param coldata A pointer to monary_column_data which contains the final
  * storage location for the BSON data.
+ * @param plan The field plan compiled from coldata with monary_plan_new().
  * @param row The row number to store the data in. Cannot exceed
  * coldata->num_rows.
  * @param bson_data A pointer to an immutable BSON data buffer.
@@ -725,21 +2313,18 @@ monary_load_item(const bson_iter_t * bsonit,
  */
 int
 monary_bson_to_arrays(monary_column_data * coldata,
+                      monary_field_plan * plan,
                       unsigned int row, const bson_t * bson_data)
 {
     bson_iter_t bsonit;
 
-    bson_iter_t descendant;
-
     int i;
 
     int masked;
 
-    int success;
-
     monary_column_item *citem;
 
-    if (!coldata || !bson_data) {
+    if (!coldata || !plan || !bson_data) {
         DEBUG("%s",
               "Array pointer or BSON data was NULL and could not be loaded.");
         return -1;
@@ -751,22 +2336,45 @@ monary_bson_to_arrays(monary_column_data * coldata,
         return -1;
     }
 
+    memset(plan->loaded, 0, plan->num_columns);
+    if (bson_iter_init(&bsonit, bson_data)) {
+        monary_plan_walk(&plan->root, &bsonit, plan, coldata, row);
+    }
+
     masked = 0;
     for (i = 0; i < coldata->num_columns; i++) {
-        success = 0;
         citem = coldata->columns + i;
 
-        // Use the iterator to find the field we want
-        bson_iter_init(&bsonit, bson_data);
-        if (bson_iter_find_descendant(&bsonit, citem->field, &descendant)) {
-            success = monary_load_item(&descendant, citem, row);
+        // Item columns of lists were masked element by element
+        if (citem->parent) {
+            continue;
         }
 
         // Record success in mask
-        if (citem->mask != NULL) {
-            citem->mask[row] = !success;
+        if (MONARY_IS_VECTOR_TYPE(citem->type)) {
+            // The loader masked each element; mask the whole row on failure
+            if (!plan->loaded[i]) {
+                memset(MONARY_MASK_ROW(citem, row, citem->type_arg), 1,
+                       citem->type_arg);
+            }
         }
-        if (!success) {
+        else if (citem->mask != NULL) {
+            *MONARY_MASK_ROW(citem, row, 1) = !plan->loaded[i];
+        }
+        if (!plan->loaded[i]) {
+            // A missing variable-length value is empty
+            if (citem->varbuf != NULL) {
+                ((int64_t *) citem->storage)[row] =
+                    (int64_t) citem->varbuf->len;
+            }
+            else if (citem->type == TYPE_CATEGORY) {
+                ((int32_t *) citem->storage)[row] = -1;
+            }
+            // A missing list is empty
+            else if (citem->type == TYPE_LIST) {
+                ((int64_t *) citem->storage)[row] =
+                    row ? ((int64_t *) citem->storage)[row - 1] : 0;
+            }
             masked++;
         }
     }
@@ -812,34 +2420,298 @@ monary_query_count(mongoc_collection_t * collection,
     if (total_count < 0) {
         DEBUG("error: %d.%d %s", err->domain, err->code, err->message);
     }
-
-    return total_count;
+
+    return total_count;
+}
+
+/**
+ * One field of a projection, as planned by monary_get_bson_fields_list.
+ *
+ * @memb field The column's field path.
+ * @memb len The length of the part of the path that is selected.
+ * @memb slice For vector columns, one more than the number of array elements
+ * to select; zero to select the whole value.
+ */
+typedef struct monary_projection_path {
+    const char *field;
+    size_t len;
+    unsigned int slice;
+} monary_projection_path;
+
+/**
+ * Returns the length of the part of a dotted field path that a projection
+ * can select: the path up to its first array index (a component below the
+ * top level made only of digits), or the whole path. Projecting "a.0" would
+ * select a field named "0" in each element of "a", not the first element.
+ *
+ * @param field The field path.
+ *
+ * @return The length of the selectable prefix of field.
+ */
+size_t
+monary_projection_length(const char *field)
+{
+    const char *dot;
+
+    const char *c;
+
+    for (dot = strchr(field, '.'); dot; dot = strchr(dot + 1, '.')) {
+        for (c = dot + 1; *c >= '0' && *c <= '9'; c++) {
+        }
+        if (c > dot + 1 && (*c == '.' || *c == '\0')) {
+            return (size_t) (dot - field);
+        }
+    }
+    return strlen(field);
+}
+
+/**
+ * Returns whether one selected path names a document above another.
+ *
+ * @param parent The possible parent.
+ * @param child The possible child.
+ *
+ * @return 1 if the selected part of child lies below that of parent;
+ * 0 otherwise.
+ */
+int
+monary_projection_is_parent(const monary_projection_path * parent,
+                            const monary_projection_path * child)
+{
+    return parent->len < child->len
+        && memcmp(parent->field, child->field, parent->len) == 0
+        && child->field[parent->len] == '.';
+}
+
+/**
+ * Given pre-allocated array data that specifies the fields to find, this
+ * builds a BSON document that can be passed into a MongoDB query as a
+ * projection selecting only what the columns read.
+ *
+ * Fields below another selected field, or selected twice, are dropped, since
+ * their parent brings them along (and overlapping paths are an error on
+ * newer servers). Paths through array indexes select the whole array.
+ * Vector columns select one element more than their dimension with $slice,
+ * enough to tell arrays that are too long. Item columns are selected along
+ * with their whole list. "_id" is excluded unless a column reads it, so that
+ * queries answered from an index need not fetch the documents.
+ *
+ * @param coldata A pointer to a monary_column_data, which should have already
+ * been allocated and built properly. The names of the fields of its column
+ * items become the names of the fields to query for.
+ * @param fields_bson A pointer to a bson_t that should already be initialized.
+ * After this BSON is written to, it may be used in a query and then destroyed
+ * afterwards.
+ *
+ * @return The number of fields selected, or -1 if memory could not be
+ * allocated. Nothing is written if no field is selected.
+ */
+int
+monary_get_bson_fields_list(monary_column_data * coldata, bson_t * fields_bson)
+{
+    monary_projection_path *paths;
+
+    monary_projection_path *path;
+
+    monary_column_item *col;
+
+    bson_t child;
+
+    unsigned int num_paths;
+
+    unsigned int i;
+
+    unsigned int j;
+
+    unsigned int slice;
+
+    int keep;
+
+    int has_id;
+
+    int num_whole;
+
+    int count;
+
+    paths = (monary_projection_path *) calloc(coldata->num_columns + 1,
+                                              sizeof(monary_projection_path));
+    if (!paths) {
+        return -1;
+    }
+
+    num_paths = 0;
+    for (i = 0; i < coldata->num_columns; i++) {
+        col = coldata->columns + i;
+        if (col->parent) {
+            continue;
+        }
+        path = paths + num_paths++;
+        path->field = col->field;
+        path->len = monary_projection_length(col->field);
+        if (col->type == TYPE_VECTOR && col->field[path->len] == '\0') {
+            path->slice = col->type_arg + 1;
+        }
+    }
+
+    has_id = 0;
+    num_whole = 0;
+    count = 0;
+    for (i = 0; i < num_paths; i++) {
+        path = paths + i;
+        keep = 1;
+        slice = path->slice;
+        for (j = 0; j < num_paths && keep; j++) {
+            if (j == i) {
+                continue;
+            }
+            if (monary_projection_is_parent(paths + j, path)) {
+                keep = 0;
+            }
+            else if (paths[j].len == path->len
+                     && memcmp(paths[j].field, path->field, path->len) == 0) {
+                // The first of the same paths is selected for all of them
+                keep = j > i;
+                if (paths[j].slice != slice) {
+                    slice = 0;
+                }
+            }
+            else if (monary_projection_is_parent(path, paths + j)) {
+                slice = 0;
+            }
+        }
+        if (!keep) {
+            continue;
+        }
+        if (slice) {
+            bson_append_document_begin(fields_bson, path->field,
+                                       (int) path->len, &child);
+            bson_append_int32(&child, "$slice", -1, (int32_t) slice);
+            bson_append_document_end(fields_bson, &child);
+        }
+        else {
+            bson_append_int32(fields_bson, path->field, (int) path->len, 1);
+            num_whole++;
+        }
+        if (path->len >= 3 && memcmp(path->field, "_id", 3) == 0
+            && (path->len == 3 || path->field[3] == '.')) {
+            has_id = 1;
+        }
+        count++;
+    }
+    free(paths);
+
+    // A projection of nothing but $slice returns every other field, so _id
+    // is then selected to make it an inclusion.
+    if (count > 0 && !has_id) {
+        bson_append_int32(fields_bson, "_id", -1, num_whole > 0 ? 0 : 1);
+    }
+    return count;
+}
+
+/**
+ * Builds the projection that a query with select_fields would send for the
+ * given column data (see monary_get_bson_fields_list).
+ *
+ * @param coldata A pointer to the column data.
+ * @param length Set to the length of the BSON document returned.
+ *
+ * @return The projection as a BSON buffer, to be freed with
+ * monary_free_bson(), or NULL if no field is selected or memory could not be
+ * allocated.
+ */
+uint8_t *
+monary_get_projection(monary_column_data * coldata, uint32_t * length)
+{
+    bson_t fields_bson;
+
+    *length = 0;
+    bson_init(&fields_bson);
+    if (monary_get_bson_fields_list(coldata, &fields_bson) <= 0) {
+        bson_destroy(&fields_bson);
+        return NULL;
+    }
+    return bson_destroy_with_steal(&fields_bson, true, length);
 }
 
 /**
- * Given pre-allocated array data that specifies the fields to find, this
- * builds a BSON document that can be passed into a MongoDB query.
+ * Wraps a MongoDB cursor in a new Monary cursor, compiling the field plan
+ * for the given column data.
  *
- * @param coldata A pointer to a monary_column_data, which should have already
- * been allocated and built properly. The names of the fields of its column
- * items become the names of the fields to query for.
- * @param fields_bson A pointer to a bson_t that should already be initialized.
- * After this BSON is written to, it may be used in a query and then destroyed
- * afterwards.
+ * @param mcursor The MongoDB cursor. It is destroyed if this function fails.
+ * @param coldata The column data to store the results in.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return A Monary cursor, or NULL if the field plan could not be built.
  */
-void
-monary_get_bson_fields_list(monary_column_data * coldata, bson_t * fields_bson)
+monary_cursor *
+monary_cursor_new(mongoc_cursor_t * mcursor,
+                  monary_column_data * coldata, bson_error_t * err)
 {
-    int i;
+    monary_cursor *cursor;
 
-    monary_column_item *col;
+    monary_field_plan *plan;
+
+    monary_category_dict **dicts;
+
+    monary_category_dict *dict;
+
+    unsigned int i;
+
+    plan = monary_plan_new(coldata, err);
+    if (!plan) {
+        mongoc_cursor_destroy(mcursor);
+        return NULL;
+    }
+
+    dicts = (monary_category_dict **) calloc(coldata->num_columns + 1,
+                                             sizeof(monary_category_dict *));
+    cursor = (monary_cursor *) malloc(sizeof(monary_cursor));
+    if (!dicts || !cursor) {
+        free(dicts);
+        free(cursor);
+        monary_plan_destroy(plan);
+        mongoc_cursor_destroy(mcursor);
+        monary_error(err, "failed to allocate memory in monary_cursor_new");
+        return NULL;
+    }
+    cursor->mcursor = mcursor;
+    cursor->coldata = coldata;
+    cursor->plan = plan;
+    cursor->dicts = dicts;
 
-    // We want to select exactly each field specified in coldata, of which
-    // there are exactly coldata.num_columns
     for (i = 0; i < coldata->num_columns; i++) {
-        col = coldata->columns + i;
-        bson_append_int32(fields_bson, col->field, -1, 1);
+        if (coldata->columns[i].type != TYPE_CATEGORY) {
+            continue;
+        }
+        dict = (monary_category_dict *) calloc(1,
+                                               sizeof(monary_category_dict));
+        if (dict) {
+            dict->cap_codes = 16;
+            dict->index_len = 32;
+            dict->ends = (int64_t *) malloc(dict->cap_codes *
+                                            sizeof(int64_t));
+            dict->hashes = (uint32_t *) malloc(dict->cap_codes *
+                                               sizeof(uint32_t));
+            dict->index = (unsigned int *) calloc(dict->index_len,
+                                                  sizeof(unsigned int));
+        }
+        dicts[i] = dict;
+        if (!dict || !dict->ends || !dict->hashes || !dict->index) {
+            for (i = 0; i < coldata->num_columns; i++) {
+                monary_category_dict_destroy(dicts[i]);
+                coldata->columns[i].dict = NULL;
+            }
+            free(dicts);
+            free(cursor);
+            monary_plan_destroy(plan);
+            mongoc_cursor_destroy(mcursor);
+            monary_error(err, "failed to allocate memory in "
+                         "monary_cursor_new");
+            return NULL;
+        }
+        coldata->columns[i].dict = dict;
     }
+    return cursor;
 }
 
 /**
@@ -851,9 +2723,13 @@ monary_get_bson_fields_list(monary_column_data * coldata, bson_t * fields_bson)
  * @param limit The maximum number of documents to return, or zero.
  * @param query A pointer to a BSON buffer representing the query.
  * @param coldata The column data to store the results in.
- * @param select_fields If truthy, select exactly the fields from the database
- * that match the fields in coldata. If false, the query will find and return
- * all fields from matching documents.
+ * @param select_fields If truthy, ask the server for only the fields that the
+ * columns of coldata read (see monary_get_bson_fields_list). If false, the
+ * query will find and return all fields from matching documents.
+ * @param batch_size The number of documents the server should return in each
+ * batch, or zero to use the server's default.
+ * @param flags A bitwise-or of mongoc_query_flags_t values, such as
+ * MONGOC_QUERY_EXHAUST or MONGOC_QUERY_NO_CURSOR_TIMEOUT.
  * @param err bson_error_t that holds error information in case of failure
  *
  * @return If successful, a Monary cursor that should be freed with
@@ -866,7 +2742,8 @@ monary_init_query(mongoc_collection_t * collection,
                   uint32_t limit,
                   const uint8_t * query,
                   monary_column_data * coldata,
-                  int select_fields, bson_error_t * err)
+                  int select_fields,
+                  uint32_t batch_size, int flags, bson_error_t * err)
 {
     bson_t query_bson;          // BSON representing the query to perform
 
@@ -874,10 +2751,10 @@ monary_init_query(mongoc_collection_t * collection,
 
     int32_t query_size;
 
-    monary_cursor *cursor;
-
     mongoc_cursor_t *mcursor;   // A MongoDB cursor
 
+    int count;
+
     // Sanity checks
     if (!collection || !query || !coldata) {
         monary_error(err, "null parameter passed to monary_init_query");
@@ -903,14 +2780,28 @@ monary_init_query(mongoc_collection_t * collection,
                          "data in monary_init_query");
             return NULL;
         }
-        monary_get_bson_fields_list(coldata, fields_bson);
+        count = monary_get_bson_fields_list(coldata, fields_bson);
+        if (count < 0) {
+            bson_destroy(fields_bson);
+            bson_destroy(&query_bson);
+            monary_error(err, "failed to allocate memory for the projection "
+                         "in monary_init_query");
+            return NULL;
+        }
+        if (count == 0) {
+            // Nothing to select: fetch whole documents
+            bson_destroy(fields_bson);
+            fields_bson = NULL;
+        }
     }
 
     // create query cursor
     mcursor = mongoc_collection_find(collection,
-                                     MONGOC_QUERY_NONE,
+                                     (mongoc_query_flags_t) flags,
                                      offset,
-                                     limit, 0, &query_bson, fields_bson, NULL);
+                                     limit,
+                                     batch_size,
+                                     &query_bson, fields_bson, NULL);
 
     // destroy BSON fields
     bson_destroy(&query_bson);
@@ -925,10 +2816,7 @@ monary_init_query(mongoc_collection_t * collection,
     }
 
     // finally, create a new Monary cursor
-    cursor = (monary_cursor *) malloc(sizeof(monary_cursor));
-    cursor->mcursor = mcursor;
-    cursor->coldata = coldata;
-    return cursor;
+    return monary_cursor_new(mcursor, coldata, err);
 }
 
 /**
@@ -936,6 +2824,8 @@ monary_init_query(mongoc_collection_t * collection,
  *
  * @param collection The MongoDB collection to query against.
  * @param pipeline A pointer to a BSON buffer representing the pipeline.
+ * @param options A pointer to a BSON buffer holding options for the aggregate
+ * command, such as allowDiskUse and batchSize, or NULL.
  * @param coldata The column data to store the results in.
  * @param err bson_error_t that holds error information in case of failure
  *
@@ -946,15 +2836,18 @@ monary_init_query(mongoc_collection_t * collection,
 monary_cursor *
 monary_init_aggregate(mongoc_collection_t * collection,
                       const uint8_t * pipeline,
+                      const uint8_t * options,
                       monary_column_data * coldata, bson_error_t * err)
 {
     bson_t pl_bson;
 
+    bson_t opts_bson;
+
     int32_t pl_size;
 
-    mongoc_cursor_t *mcursor;
+    int32_t opts_size;
 
-    monary_cursor *cursor;
+    mongoc_cursor_t *mcursor;
 
     // Sanity checks
     if (!collection) {
@@ -966,6 +2859,10 @@ monary_init_aggregate(mongoc_collection_t * collection,
         monary_error(err, "invalid pipeline passed to monary_init_aggregate");
         return NULL;
     }
+    else if (!coldata) {
+        monary_error(err, "null coldata passed to monary_init_aggregate");
+        return NULL;
+    }
 
     // Build BSON pipeline
     memcpy(&pl_size, pipeline, sizeof(int32_t));
@@ -976,13 +2873,29 @@ monary_init_aggregate(mongoc_collection_t * collection,
         return NULL;
     }
 
+    // Build BSON options
+    if (options) {
+        memcpy(&opts_size, options, sizeof(int32_t));
+        opts_size = (int32_t) BSON_UINT32_FROM_LE(opts_size);
+        if (!bson_init_static(&opts_bson, options, opts_size)) {
+            bson_destroy(&pl_bson);
+            monary_error(err, "failed to initialize raw BSON options in "
+                         "monary_init_aggregate");
+            return NULL;
+        }
+    }
+
     // Get an aggregation cursor
     mcursor = mongoc_collection_aggregate(collection,
                                           MONGOC_QUERY_NONE,
-                                          &pl_bson, NULL, NULL);
+                                          &pl_bson,
+                                          options ? &opts_bson : NULL, NULL);
 
     // Clean up
     bson_destroy(&pl_bson);
+    if (options) {
+        bson_destroy(&opts_bson);
+    }
 
     if (!mcursor) {
         monary_error(err, "error occurred in mongoc_collection_aggregate in "
@@ -990,10 +2903,7 @@ monary_init_aggregate(mongoc_collection_t * collection,
         return NULL;
     }
 
-    cursor = (monary_cursor *) malloc(sizeof(monary_cursor));
-    cursor->mcursor = mcursor;
-    cursor->coldata = coldata;
-    return cursor;
+    return monary_cursor_new(mcursor, coldata, err);
 }
 
 /**
@@ -1002,12 +2912,17 @@ monary_init_aggregate(mongoc_collection_t * collection,
  *
  * @param cursor A pointer to a Monary cursor, which contains both a MongoDB
  * cursor and Monary column data that stores the retrieved information.
+ * @param start_row The first row to fill. Rows are loaded from here until
+ * either the cursor is exhausted or the column data is full, so a caller that
+ * grows the column data can resume where the previous call stopped. Loading
+ * from row zero empties the buffers of any variable-length columns first.
  * @param err bson_error_t that holds error information in case of failure
  *
- * @return The number of rows loaded into memory.
+ * @return The number of rows loaded into memory, or -1 on error.
  */
 int
-monary_load_query(monary_cursor * cursor, bson_error_t * err)
+monary_load_query(monary_cursor * cursor,
+                  unsigned int start_row, bson_error_t * err)
 {
     const bson_t *bson;         // Pointer to an immutable BSON buffer
 
@@ -1017,15 +2932,28 @@ monary_load_query(monary_cursor * cursor, bson_error_t * err)
 
     int total_values;
 
+    unsigned int i;
+
     monary_column_data *coldata;
 
     mongoc_cursor_t *mcursor;
 
     mcursor = cursor->mcursor;  // The underlying MongoDB cursor
     coldata = cursor->coldata;  // A pointer to the NumPy array data
-    row = 0;            // Iterator var over the lengths of the arrays
+    row = start_row;    // Iterator var over the lengths of the arrays
     num_masked = 0;     // The number of failed loads
 
+    if (start_row == 0) {
+        for (i = 0; i < coldata->num_columns; i++) {
+            if (coldata->columns[i].varbuf != NULL) {
+                coldata->columns[i].varbuf->len = 0;
+            }
+            if (coldata->columns[i].maskbuf != NULL) {
+                coldata->columns[i].maskbuf->len = 0;
+            }
+        }
+    }
+
     // read result values
     while (row < coldata->num_rows && !mongoc_cursor_error(mcursor, err)
            && mongoc_cursor_next(mcursor, &bson)) {
@@ -1036,7 +2964,7 @@ monary_load_query(monary_cursor * cursor, bson_error_t * err)
         }
 #endif
 
-        num_masked += monary_bson_to_arrays(coldata, row, bson);
+        num_masked += monary_bson_to_arrays(coldata, cursor->plan, row, bson);
         ++row;
     }
 
@@ -1044,11 +2972,84 @@ monary_load_query(monary_cursor * cursor, bson_error_t * err)
         return -1;
     }
 
-    total_values = row * coldata->num_columns;
-    DEBUG("%i rows loaded; %i / %i values were masked", row, num_masked,
-          total_values);
+    total_values = (row - start_row) * coldata->num_columns;
+    DEBUG("%i rows loaded; %i / %i values were masked", row - start_row,
+          num_masked, total_values);
+
+    return row - start_row;
+}
+
+/**
+ * Directs subsequent loads from a cursor into different column data. This
+ * lets a caller rotate between several sets of arrays, for instance to fill
+ * one set while another is being read.
+ *
+ * @param cursor A pointer to a Monary cursor.
+ * @param coldata The column data to load into. It must have the same fields
+ * and types, in the same order, as the column data the cursor was created
+ * with.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return 1 if successful; -1 otherwise.
+ */
+int
+monary_set_query_column_data(monary_cursor * cursor,
+                             monary_column_data * coldata,
+                             bson_error_t * err)
+{
+    unsigned int i;
+
+    if (!cursor || !coldata) {
+        monary_error(err, "null parameter passed to "
+                     "monary_set_query_column_data");
+        return -1;
+    }
+    if (coldata->num_columns != cursor->plan->num_columns) {
+        monary_error(err, "column data passed to "
+                     "monary_set_query_column_data does not match the "
+                     "cursor's columns");
+        return -1;
+    }
+    for (i = 0; i < coldata->num_columns; i++) {
+        coldata->columns[i].dict = cursor->dicts[i];
+    }
+    cursor->coldata = coldata;
+    return 1;
+}
+
+/**
+ * Gets the dictionary of a category column of a cursor. The dictionary
+ * belongs to the cursor and grows as more rows are loaded, so callers should
+ * copy what they need out of it between loads.
+ *
+ * @param cursor A pointer to a Monary cursor.
+ * @param colnum The number of the column.
+ * @param num_codes Set to the number of distinct strings.
+ * @param ends Set to the array holding, for each code, the offset at which
+ * its string ends.
+ *
+ * @return A pointer to the strings, back to back, or NULL if the column is
+ * not a category column or holds no strings.
+ */
+uint8_t *
+monary_query_categories(monary_cursor * cursor,
+                        unsigned int colnum,
+                        uint64_t * num_codes, int64_t ** ends)
+{
+    monary_category_dict *dict;
 
-    return row;
+    *num_codes = 0;
+    *ends = NULL;
+    if (cursor == NULL || colnum >= cursor->plan->num_columns) {
+        return NULL;
+    }
+    dict = cursor->dicts[colnum];
+    if (dict == NULL) {
+        return NULL;
+    }
+    *num_codes = dict->num_codes;
+    *ends = dict->ends;
+    return dict->strings.data;
 }
 
 /**
@@ -1063,13 +3064,384 @@ monary_load_query(monary_cursor * cursor, bson_error_t * err)
 void
 monary_close_query(monary_cursor * cursor)
 {
+    unsigned int i;
+
     if (cursor) {
         DEBUG("%s", "Closing query");
+        // The column data may already be freed, so is not touched here
+        for (i = 0; i < cursor->plan->num_columns; i++) {
+            monary_category_dict_destroy(cursor->dicts[i]);
+        }
+        free(cursor->dicts);
         mongoc_cursor_destroy(cursor->mcursor);
+        monary_plan_destroy(cursor->plan);
         free(cursor);
     }
 }
 
+/**
+ * What was observed of one dotted field path while inferring a schema.
+ *
+ * @memb path The dotted field path.
+ * @memb hash FNV-1a hash of path.
+ * @memb count The number of documents in which the field appeared.
+ * @memb type_counts The number of times each BSON type code was seen.
+ * @memb max_size The largest size in bytes of a string, binary or document
+ * value seen.
+ */
+typedef struct monary_schema_field {
+    char *path;
+    uint32_t hash;
+    uint32_t count;
+    uint32_t type_counts[256];
+    uint32_t max_size;
+} monary_schema_field;
+
+/**
+ * The fields observed while inferring a schema, in the order they were first
+ * seen, with an open-addressing index for looking them up by path.
+ *
+ * @memb num_fields The number of fields observed.
+ * @memb cap_fields The number of fields allocated.
+ * @memb fields The fields.
+ * @memb index_len The number of slots in index, a power of two.
+ * @memb index For each slot, one plus the index of a field, or zero.
+ */
+typedef struct monary_schema {
+    unsigned int num_fields;
+    unsigned int cap_fields;
+    monary_schema_field *fields;
+    unsigned int index_len;
+    unsigned int *index;
+} monary_schema;
+
+void
+monary_schema_destroy(monary_schema * schema)
+{
+    unsigned int i;
+
+    for (i = 0; i < schema->num_fields; i++) {
+        free(schema->fields[i].path);
+    }
+    free(schema->fields);
+    free(schema->index);
+}
+
+/**
+ * Finds the field with the given path, adding it if it has not been seen.
+ *
+ * @param schema The schema being inferred.
+ * @param path The dotted field path.
+ * @param len The length of path.
+ *
+ * @return The field, or NULL if memory could not be allocated.
+ */
+monary_schema_field *
+monary_schema_lookup(monary_schema * schema, const char *path, size_t len)
+{
+    monary_schema_field *field;
+
+    monary_schema_field *fields;
+
+    unsigned int *index;
+
+    unsigned int new_len;
+
+    unsigned int slot;
+
+    unsigned int i;
+
+    uint32_t hash;
+
+    hash = monary_plan_hash(path, len);
+    slot = hash & (schema->index_len - 1);
+    while (schema->index[slot]) {
+        field = schema->fields + schema->index[slot] - 1;
+        if (field->hash == hash && strlen(field->path) == len
+            && memcmp(field->path, path, len) == 0) {
+            return field;
+        }
+        slot = (slot + 1) & (schema->index_len - 1);
+    }
+
+    // Keep the index at most half full
+    if (2 * (schema->num_fields + 1) > schema->index_len) {
+        new_len = schema->index_len * 2;
+        index = (unsigned int *) calloc(new_len, sizeof(unsigned int));
+        if (index == NULL) {
+            return NULL;
+        }
+        for (i = 0; i < schema->num_fields; i++) {
+            slot = schema->fields[i].hash & (new_len - 1);
+            while (index[slot]) {
+                slot = (slot + 1) & (new_len - 1);
+            }
+            index[slot] = i + 1;
+        }
+        free(schema->index);
+        schema->index = index;
+        schema->index_len = new_len;
+        slot = hash & (new_len - 1);
+        while (index[slot]) {
+            slot = (slot + 1) & (new_len - 1);
+        }
+    }
+    if (schema->num_fields == schema->cap_fields) {
+        new_len = schema->cap_fields ? schema->cap_fields * 2 : 16;
+        fields = (monary_schema_field *) realloc(schema->fields,
+                                                 new_len *
+                                                 sizeof(monary_schema_field));
+        if (fields == NULL) {
+            return NULL;
+        }
+        schema->fields = fields;
+        schema->cap_fields = new_len;
+    }
+
+    field = schema->fields + schema->num_fields;
+    memset(field, 0, sizeof(monary_schema_field));
+    field->path = (char *) malloc(len + 1);
+    if (field->path == NULL) {
+        return NULL;
+    }
+    memcpy(field->path, path, len);
+    field->path[len] = '\0';
+    field->hash = hash;
+    schema->index[slot] = ++schema->num_fields;
+    return field;
+}
+
+/**
+ * Records the type and size of every field of a (sub)document, descending
+ * into subdocuments but not into arrays.
+ *
+ * @param schema The schema being inferred.
+ * @param bsonit An iterator over the (sub)document, not yet advanced.
+ * @param path A buffer of MONARY_MAX_STRING_LENGTH + 1 bytes whose first
+ * prefix_len bytes hold the path of the (sub)document, followed by a dot
+ * unless it is the top level.
+ * @param prefix_len The length of the path prefix.
+ * @param depth The nesting depth of the (sub)document.
+ *
+ * @return 1 if successful; 0 if memory could not be allocated.
+ */
+int
+monary_schema_walk(monary_schema * schema,
+                   bson_iter_t * bsonit,
+                   char *path, size_t prefix_len, int depth)
+{
+    monary_schema_field *field;
+
+    bson_iter_t child;
+
+    const uint8_t *discard;
+
+    const char *key;
+
+    size_t key_len;
+
+    uint32_t size;
+
+    bson_type_t type;
+
+    while (bson_iter_next(bsonit)) {
+        key = bson_iter_key(bsonit);
+        key_len = strlen(key);
+        if (prefix_len + key_len + 1 > MONARY_MAX_STRING_LENGTH) {
+            // The field name would be too long to query
+            continue;
+        }
+        memcpy(path + prefix_len, key, key_len);
+
+        field = monary_schema_lookup(schema, path, prefix_len + key_len);
+        if (field == NULL) {
+            return 0;
+        }
+        type = bson_iter_type(bsonit);
+        field->count++;
+        field->type_counts[(uint8_t) type]++;
+
+        size = 0;
+        switch (type) {
+        case BSON_TYPE_UTF8:
+            bson_iter_utf8(bsonit, &size);
+            break;
+        case BSON_TYPE_BINARY:
+            bson_iter_binary(bsonit, NULL, &size, &discard);
+            break;
+        case BSON_TYPE_DOCUMENT:
+            bson_iter_document(bsonit, &size, &discard);
+            break;
+        default:
+            break;
+        }
+        if (size > field->max_size) {
+            field->max_size = size;
+        }
+
+        if (type == BSON_TYPE_DOCUMENT && depth + 1 < MONARY_MAX_RECURSION
+            && bson_iter_recurse(bsonit, &child)) {
+            path[prefix_len + key_len] = '.';
+            if (!monary_schema_walk(schema, &child, path,
+                                    prefix_len + key_len + 1, depth + 1)) {
+                return 0;
+            }
+        }
+    }
+    return 1;
+}
+
+/**
+ * Runs an aggregation pipeline (normally one that samples a collection) and
+ * records the dotted path, BSON types and largest size of every field of the
+ * resulting documents. Arrays are recorded, but not descended into.
+ *
+ * @param collection The MongoDB collection to sample.
+ * @param pipeline A pointer to a BSON buffer representing the pipeline.
+ * @param err bson_error_t that holds error information in case of failure
+ *
+ * @return A BSON buffer, to be freed with monary_free_bson(), holding
+ * "num_docs" (the number of documents walked) and "fields", an array of
+ * documents with "path", "count", "max_size" and "types" (a document mapping
+ * each BSON type code seen to the number of times it was seen), in the order
+ * the fields were first seen. NULL on failure.
+ */
+uint8_t *
+monary_infer_schema(mongoc_collection_t * collection,
+                    const uint8_t * pipeline, bson_error_t * err)
+{
+    bson_t pl_bson;
+
+    bson_t result;
+
+    bson_t fields_bson;
+
+    bson_t field_bson;
+
+    bson_t types_bson;
+
+    bson_iter_t bsonit;
+
+    const bson_t *doc;
+
+    char path[MONARY_MAX_STRING_LENGTH + 1];
+
+    char key[16];
+
+    const char *keyp;
+
+    int32_t pl_size;
+
+    uint32_t length;
+
+    uint32_t num_docs;
+
+    unsigned int i;
+
+    unsigned int t;
+
+    int ok;
+
+    monary_schema schema;
+
+    monary_schema_field *field;
+
+    mongoc_cursor_t *mcursor;
+
+    if (!collection || !pipeline) {
+        monary_error(err, "null parameter passed to monary_infer_schema");
+        return NULL;
+    }
+
+    memcpy(&pl_size, pipeline, sizeof(int32_t));
+    pl_size = (int32_t) BSON_UINT32_FROM_LE(pl_size);
+    if (!bson_init_static(&pl_bson, pipeline, pl_size)) {
+        monary_error(err, "failed to initialize raw BSON pipeline in "
+                     "monary_infer_schema");
+        return NULL;
+    }
+
+    memset(&schema, 0, sizeof(monary_schema));
+    schema.index_len = 64;
+    schema.index = (unsigned int *) calloc(schema.index_len,
+                                           sizeof(unsigned int));
+    if (schema.index == NULL) {
+        bson_destroy(&pl_bson);
+        monary_error(err, "failed to allocate memory in monary_infer_schema");
+        return NULL;
+    }
+
+    mcursor = mongoc_collection_aggregate(collection,
+                                          MONGOC_QUERY_NONE,
+                                          &pl_bson, NULL, NULL);
+    bson_destroy(&pl_bson);
+    if (!mcursor) {
+        monary_schema_destroy(&schema);
+        monary_error(err, "error occurred in mongoc_collection_aggregate in "
+                     "monary_infer_schema");
+        return NULL;
+    }
+
+    ok = 1;
+    num_docs = 0;
+    while (ok && !mongoc_cursor_error(mcursor, err)
+           && mongoc_cursor_next(mcursor, &doc)) {
+        num_docs++;
+        if (bson_iter_init(&bsonit, doc)) {
+            ok = monary_schema_walk(&schema, &bsonit, path, 0, 0);
+        }
+    }
+    if (mongoc_cursor_error(mcursor, err)) {
+        mongoc_cursor_destroy(mcursor);
+        monary_schema_destroy(&schema);
+        return NULL;
+    }
+    mongoc_cursor_destroy(mcursor);
+    if (!ok) {
+        monary_schema_destroy(&schema);
+        monary_error(err, "failed to allocate memory in monary_infer_schema");
+        return NULL;
+    }
+
+    // Report what was seen
+    bson_init(&result);
+    BSON_APPEND_INT32(&result, "num_docs", (int32_t) num_docs);
+    BSON_APPEND_ARRAY_BEGIN(&result, "fields", &fields_bson);
+    for (i = 0; i < schema.num_fields; i++) {
+        field = schema.fields + i;
+        bson_uint32_to_string(i, &keyp, key, sizeof key);
+        bson_append_document_begin(&fields_bson, keyp, -1, &field_bson);
+        BSON_APPEND_UTF8(&field_bson, "path", field->path);
+        BSON_APPEND_INT32(&field_bson, "count", (int32_t) field->count);
+        BSON_APPEND_INT64(&field_bson, "max_size", field->max_size);
+        BSON_APPEND_DOCUMENT_BEGIN(&field_bson, "types", &types_bson);
+        for (t = 0; t < 256; t++) {
+            if (field->type_counts[t]) {
+                bson_uint32_to_string(t, &keyp, key, sizeof key);
+                bson_append_int32(&types_bson, keyp, -1,
+                                  (int32_t) field->type_counts[t]);
+            }
+        }
+        bson_append_document_end(&field_bson, &types_bson);
+        bson_append_document_end(&fields_bson, &field_bson);
+    }
+    bson_append_array_end(&result, &fields_bson);
+    monary_schema_destroy(&schema);
+
+    return bson_destroy_with_steal(&result, true, &length);
+}
+
+/**
+ * Frees a BSON buffer returned by Monary, such as by monary_infer_schema().
+ *
+ * @param data The buffer to free. If NULL, no operation is performed.
+ */
+void
+monary_free_bson(uint8_t * data)
+{
+    bson_free(data);
+}
+
 /**
  * Create a write concern pointer to be used for insert, remove, or update.
  *
@@ -1190,6 +3562,13 @@ monary_make_bson_value_t(bson_value_t * val,
         val->value.v_binary.data_len = citem->type_arg;
         val->value.v_binary.data = current_val;
         break;
+    case TYPE_BINARY_VECTOR:
+        len = citem->type_arg * monary_type_size(citem->elem_type);
+        val->value_type = BSON_TYPE_BINARY;
+        val->value.v_binary.subtype = BSON_SUBTYPE_BINARY;
+        val->value.v_binary.data_len = len;
+        val->value.v_binary.data = storage + ((size_t) idx * len);
+        break;
     case TYPE_BSON:
         // The first 4 bytes of the bson is the length.
         len = BSON_UINT32_FROM_LE(*(uint32_t *) current_val);
@@ -1251,7 +3630,7 @@ monary_bson_from_columns(monary_column_item * columns,
     }
     for (i = col_start; i < col_end; i++) {
         citem = columns + i;
-        if (!*(citem->mask + row)) {
+        if (citem->mask == NULL || !*(citem->mask + row)) {
             // only append unmasked values
             dot_idx = 0;
             for (field = citem->field + name_offset; *(field + dot_idx) && (field[dot_idx] != '.'); dot_idx++); // Advance dot_idx to either '.' or '\0'
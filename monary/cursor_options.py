@@ -0,0 +1,73 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import bson
+
+# Flags from libmongoc's mongoc_query_flags_t.
+MONARY_QUERY_NONE = 0
+MONARY_QUERY_NO_CURSOR_TIMEOUT = 1 << 4
+MONARY_QUERY_EXHAUST = 1 << 6
+
+
+class CursorOptions(object):
+    """A python object describing how the server should stream the results
+    of a query or aggregation back to Monary."""
+    def __init__(self, batch_size=None, exhaust=False,
+                 no_cursor_timeout=False, allow_disk_use=False):
+        """Create a new CursorOptions.
+
+        The batch size is the number of documents the server returns in each
+        reply. Larger batches mean fewer round trips; an exhaust cursor
+        removes the round trips altogether by having the server stream every
+        batch without waiting for getMore requests.
+
+        :Parameters:
+         - `batch_size` (optional): Number of documents in each batch. If
+           None, block queries use their block size and other queries use
+           the server's default.
+         - `exhaust` (optional): Whether the server should stream all
+           batches of a query without waiting to be asked. Not supported
+           with a limit, or by aggregations.
+         - `no_cursor_timeout` (optional): Whether the server should keep an
+           idle cursor open instead of timing it out, for long scans.
+         - `allow_disk_use` (optional): Whether aggregation stages may write
+           temporary files when they exceed the server's memory limit.
+        """
+        if batch_size is not None and batch_size < 0:
+            raise ValueError(
+                "Given 'batch_size' of %d, must be >= 0." % batch_size)
+        self.batch_size = batch_size
+        self.exhaust = exhaust
+        self.no_cursor_timeout = no_cursor_timeout
+        self.allow_disk_use = allow_disk_use
+
+    def get_query_flags(self):
+        """Return the mongoc_query_flags_t bits for a find."""
+        flags = MONARY_QUERY_NONE
+        if self.exhaust:
+            flags |= MONARY_QUERY_EXHAUST
+        if self.no_cursor_timeout:
+            flags |= MONARY_QUERY_NO_CURSOR_TIMEOUT
+        return flags
+
+    def get_batch_size(self, default=0):
+        """Return the batch size to request, or `default` if unset."""
+        if self.batch_size is None:
+            return default
+        return self.batch_size
+
+    def get_aggregate_options(self, default_batch_size=0):
+        """Return the options for an aggregate command as encoded BSON, or
+        None if there are none to send."""
+        if self.exhaust:
+            raise ValueError("Exhaust cursors are not supported by "
+                             "aggregations.")
+        options = {}
+        if self.allow_disk_use:
+            options["allowDiskUse"] = True
+        batch_size = self.get_batch_size(default_batch_size)
+        if batch_size > 0:
+            options["batchSize"] = batch_size
+        if not options:
+            return None
+        return bson.BSON.encode(options)
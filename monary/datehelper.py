@@ -3,8 +3,14 @@
 
 import datetime
 
+import numpy
+
 MONGO_DATE_EPOCH = datetime.datetime(1970, 1, 1)
 
+# The layout of a BSON timestamp as it is stored in a ``timestamp`` column:
+# the seconds since the epoch, then the increment.
+TIMESTAMP_DTYPE = numpy.dtype([("time", numpy.uint32), ("inc", numpy.uint32)])
+
 
 def mongodate_to_datetime(mongodate):
     """Converts a Mongo integer date to a datetime instance.
@@ -57,3 +63,96 @@ def timedelta_to_mongodelta(td):
     millis = (td.microseconds / 1000 +
               (td.seconds + td.days * 24 * 3600) * 1000)
     return millis
+
+
+def _as_unit(values, dtype):
+    """Views an array of integers as ``dtype`` without copying, or converts
+       any other array to it. Masks are kept.
+    """
+    values = numpy.asanyarray(values)
+    if values.dtype == numpy.int64 or values.dtype == dtype:
+        return values.view(dtype)
+    return values.astype(dtype)
+
+
+def mongodates_to_datetime64(mongodates):
+    """Converts an array of Mongo integer dates to ``datetime64[ms]``. An
+       int64 array, such as a ``date`` column, is viewed without a copy.
+
+       :param mongodates: array of mongo dates (milliseconds since January 1,
+                          1970); masked arrays stay masked
+       :returns: the dates as an array of ``datetime64[ms]``
+       :rtype: numpy.ndarray
+    """
+    return _as_unit(mongodates, numpy.dtype("datetime64[ms]"))
+
+
+def datetime64_to_mongodates(dts):
+    """Converts an array of ``datetime64`` values of any unit to Mongo
+       integer dates. Values in ``datetime64[ms]`` are viewed without a copy.
+
+       :param dts: array of ``datetime64`` values
+       :returns: the dates as an int64 array of milliseconds since January 1,
+                 1970
+       :rtype: numpy.ndarray
+    """
+    dts = _as_unit(dts, numpy.dtype("datetime64[ms]"))
+    return dts.view(numpy.int64)
+
+
+def mongodeltas_to_timedelta64(mongodeltas):
+    """Converts an array of Mongo time differences to ``timedelta64[ms]``.
+       An int64 array is viewed without a copy.
+
+       :param mongodeltas: array of time differences (in milliseconds)
+       :returns: the differences as an array of ``timedelta64[ms]``
+       :rtype: numpy.ndarray
+    """
+    return _as_unit(mongodeltas, numpy.dtype("timedelta64[ms]"))
+
+
+def timedelta64_to_mongodeltas(tds):
+    """Converts an array of ``timedelta64`` values of any unit to Mongo time
+       differences.
+
+       :param tds: array of ``timedelta64`` values
+       :returns: the differences as an int64 array of milliseconds
+       :rtype: numpy.ndarray
+    """
+    tds = _as_unit(tds, numpy.dtype("timedelta64[ms]"))
+    return tds.view(numpy.int64)
+
+
+def split_timestamps(timestamps):
+    """Splits a ``timestamp`` column into its seconds and increments without
+       copying the values.
+
+       :param timestamps: uint64 array as loaded for a ``timestamp`` column
+       :returns: structured array of ``TIMESTAMP_DTYPE``, with fields
+                 ``time`` and ``inc``; a masked array's mask covers both
+                 fields of each masked row
+       :rtype: numpy.ndarray
+    """
+    if isinstance(timestamps, numpy.ma.MaskedArray):
+        mask = numpy.ma.getmaskarray(timestamps)
+        return numpy.ma.masked_array(
+            numpy.ascontiguousarray(timestamps.data).view(TIMESTAMP_DTYPE),
+            mask)
+    timestamps = numpy.ascontiguousarray(timestamps)
+    return timestamps.view(TIMESTAMP_DTYPE)
+
+
+def join_timestamps(parts):
+    """Packs an array of ``TIMESTAMP_DTYPE`` back into the uint64 layout of
+       a ``timestamp`` column, as accepted by ``insert``.
+
+       :param parts: structured array with fields ``time`` and ``inc``
+       :returns: uint64 array, masked where any field of a row is masked
+       :rtype: numpy.ndarray
+    """
+    packed = numpy.ascontiguousarray(
+        numpy.ma.getdata(parts), dtype=TIMESTAMP_DTYPE).view(numpy.uint64)
+    if isinstance(parts, numpy.ma.MaskedArray):
+        mask = numpy.ma.getmaskarray(parts)
+        return numpy.ma.masked_array(packed, mask["time"] | mask["inc"])
+    return packed
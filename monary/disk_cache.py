@@ -0,0 +1,307 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy
+
+from .bitmask import BitmaskColumn
+from .category import CategoricalColumn
+from .list_column import ListColumn
+from .varlen import VarLenColumn
+
+# Version of the layout of a cached result; entries of other versions are
+# ignored.
+DISK_CACHE_VERSION = 1
+
+_META_FILE = "meta.json"
+
+
+class _Unsupported(Exception):
+    """Raised for results that cannot be stored on disk."""
+
+
+def _encode_column(column, arrays):
+    """Describes one column of a result for the metadata, appending its
+    arrays to ``arrays``."""
+    def add(array):
+        array = numpy.asarray(array)
+        if array.dtype.hasobject:
+            raise _Unsupported()
+        arrays.append(array)
+        return len(arrays) - 1
+
+    if isinstance(column, numpy.ma.MaskedArray):
+        return {"type": "masked",
+                "data": add(numpy.ma.getdata(column)),
+                "mask": add(numpy.ma.getmaskarray(column))}
+    if isinstance(column, numpy.ndarray):
+        return {"type": "array", "data": add(column)}
+    if isinstance(column, VarLenColumn):
+        return {"type": "varlen", "kind": column.kind,
+                "offsets": add(column.offsets), "data": add(column.data),
+                "mask": add(column.mask)}
+    if isinstance(column, CategoricalColumn):
+        categories = list(column.categories)
+        if not all(isinstance(category, str) for category in categories):
+            raise _Unsupported()
+        return {"type": "category", "codes": _encode_column(column.codes,
+                                                            arrays),
+                "categories": categories}
+    if isinstance(column, ListColumn):
+        return {"type": "list", "offsets": add(column.offsets),
+                "mask": add(column.mask)}
+    if isinstance(column, BitmaskColumn):
+        return {"type": "bitmask", "data": add(column.data),
+                "validity": add(column.validity)}
+    raise _Unsupported()
+
+
+def _decode_column(spec, arrays):
+    """Rebuilds a column described by ``_encode_column`` over the arrays
+    read back from disk."""
+    kind = spec["type"]
+    if kind == "masked":
+        return numpy.ma.masked_array(arrays[spec["data"]],
+                                     arrays[spec["mask"]], copy=False)
+    if kind == "array":
+        return arrays[spec["data"]]
+    if kind == "varlen":
+        return VarLenColumn(arrays[spec["offsets"]], arrays[spec["data"]],
+                            arrays[spec["mask"]], spec["kind"])
+    if kind == "category":
+        categories = numpy.empty(len(spec["categories"]), dtype=object)
+        categories[:] = spec["categories"]
+        return CategoricalColumn(_decode_column(spec["codes"], arrays),
+                                 categories)
+    if kind == "list":
+        return ListColumn(arrays[spec["offsets"]], arrays[spec["mask"]])
+    return BitmaskColumn(arrays[spec["data"]], arrays[spec["validity"]])
+
+
+class DiskResultCache(object):
+    """A cache of query results kept as ``.npy`` files in a directory, which
+    can be shared by every process on a host, and used as a Monary
+    connection's ``result_cache`` in place of a ``ResultCache``.
+
+    Each result is a directory holding one ``.npy`` file per array (values,
+    masks, offsets and so on) and a ``meta.json`` sidecar with the hash of
+    its query, the column spec, its creation time, row count and size. A
+    result is written to a temporary directory and renamed into place, so
+    readers never see part of one. Results are read back with
+    ``numpy.load(..., mmap_mode="r")``: the arrays are read-only memory maps
+    of the files, so processes reading the same result share the pages the
+    operating system caches for it.
+
+    Counters of hits, misses and evictions by this process are kept in the
+    ``hits``, ``misses`` and ``evictions`` attributes.
+    """
+    def __init__(self, directory, max_bytes, ttl=None):
+        """Create a new DiskResultCache.
+
+        :Parameters:
+         - `directory`: the directory to keep results in, which is created
+           if it does not exist.
+         - `max_bytes`: the most bytes of files to keep. The results used
+           least recently, by any process, are removed to make room for new
+           ones, and results larger than this are not kept at all.
+         - `ttl` (optional): the number of seconds a result is kept, or None
+           to keep results until they are evicted or invalidated.
+        """
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry_name(self, db, coll, key):
+        """Returns the name of the directory a query's result is kept in."""
+        text = repr((DISK_CACHE_VERSION, db, coll, key))
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _entries(self):
+        """Returns (name, metadata) of every complete result in the
+        directory."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith("."):
+                continue
+            meta = self._read_meta(name)
+            if meta is not None:
+                entries.append((name, meta))
+        return entries
+
+    def _read_meta(self, name):
+        """Returns the metadata of a result, or None if it is missing."""
+        try:
+            with open(os.path.join(self.directory, name, _META_FILE)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _remove(self, name):
+        """Removes a result. It is first renamed out of the way, so that no
+        reader opens it half deleted; readers that already opened it keep
+        their memory maps."""
+        doomed = tempfile.mkdtemp(prefix=".remove-", dir=self.directory)
+        try:
+            os.rename(os.path.join(self.directory, name),
+                      os.path.join(doomed, name))
+        except OSError:
+            # Another process removed it first.
+            pass
+        shutil.rmtree(doomed, ignore_errors=True)
+
+    def get(self, db, coll, key):
+        """Return the result kept for a query, or None.
+
+        :Parameters:
+         - `db`: name of the database queried.
+         - `coll`: name of the collection queried.
+         - `key`: the hashable description of the query.
+        """
+        name = self._entry_name(db, coll, key)
+        meta = self._read_meta(name)
+        if meta is not None and meta.get("version") != DISK_CACHE_VERSION:
+            meta = None
+        if meta is not None and meta["key"] != repr(key):
+            meta = None
+        if meta is not None and self.ttl is not None and \
+                meta["created"] + self.ttl <= time.time():
+            self._remove(name)
+            meta = None
+        if meta is None:
+            self.misses += 1
+            return None
+        path = os.path.join(self.directory, name)
+        try:
+            arrays = [numpy.load(os.path.join(path, "%d.npy" % i),
+                                 mmap_mode="r")
+                      for i in range(meta["arrays"])]
+        except (IOError, OSError, ValueError):
+            # Removed since its metadata was read.
+            self.misses += 1
+            return None
+        # Mark the result as recently used.
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        if meta["structured"]:
+            return _decode_column(meta["columns"][0], arrays)
+        return [_decode_column(spec, arrays) for spec in meta["columns"]]
+
+    def put(self, db, coll, key, result):
+        """Write the result of a query to disk, unless it holds values that
+        cannot be kept there, such as Python objects, and return it.
+
+        :Parameters:
+         - `db`: name of the database queried.
+         - `coll`: name of the collection queried.
+         - `key`: the hashable description of the query.
+         - `result`: the result.
+        """
+        structured = not isinstance(result, list)
+        columns = [result] if structured else result
+        arrays = []
+        try:
+            specs = [_encode_column(column, arrays) for column in columns]
+        except _Unsupported:
+            return result
+        nbytes = sum(array.nbytes for array in arrays)
+        if nbytes > self.max_bytes:
+            return result
+
+        name = self._entry_name(db, coll, key)
+        path = tempfile.mkdtemp(prefix=".write-", dir=self.directory)
+        try:
+            for i, array in enumerate(arrays):
+                numpy.save(os.path.join(path, "%d.npy" % i), array)
+            meta = {
+                "version": DISK_CACHE_VERSION,
+                "db": db,
+                "coll": coll,
+                "key": repr(key),
+                "hash": name,
+                "created": time.time(),
+                "rows": len(columns[0]) if columns else 0,
+                "nbytes": nbytes,
+                "arrays": len(arrays),
+                "structured": structured,
+                "columns": specs,
+            }
+            with open(os.path.join(path, _META_FILE), "w") as f:
+                json.dump(meta, f)
+            self._make_room(nbytes, name)
+            try:
+                os.rename(path, os.path.join(self.directory, name))
+            except OSError:
+                # Another process kept the same result first.
+                pass
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+        return result
+
+    def _make_room(self, nbytes, name):
+        """Removes the least recently used results until ``nbytes`` more
+        fit, replacing any older copy of result ``name``."""
+        entries = []
+        total = 0
+        for entry_name, meta in self._entries():
+            if entry_name == name:
+                self._remove(entry_name)
+                continue
+            path = os.path.join(self.directory, entry_name)
+            try:
+                used = os.path.getmtime(path)
+            except OSError:
+                continue
+            entries.append((used, entry_name, meta["nbytes"]))
+            total += meta["nbytes"]
+        entries.sort()
+        for used, entry_name, size in entries:
+            if total + nbytes <= self.max_bytes:
+                break
+            self._remove(entry_name)
+            self.evictions += 1
+            total -= size
+
+    @property
+    def nbytes(self):
+        """The number of bytes of results kept."""
+        return sum(meta["nbytes"] for name, meta in self._entries())
+
+    def __len__(self):
+        """Return the number of results kept."""
+        return len(self._entries())
+
+    def invalidate(self, db=None, coll=None):
+        """Remove the results kept for a collection, a database or, by
+        default, every collection.
+
+        :Parameters:
+         - `db` (optional): name of the database.
+         - `coll` (optional): name of the collection in `db`.
+        """
+        for name, meta in self._entries():
+            if (db is None or meta["db"] == db) and \
+                    (coll is None or meta["coll"] == coll):
+                self._remove(name)
+
+    def clear(self):
+        """Remove every result and reset the counters."""
+        self.invalidate()
+        self.hits = self.misses = self.evictions = 0
@@ -0,0 +1,109 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+from .bitmask import BitmaskColumn
+from .category import CategoricalColumn
+from .idhelper import OBJECTID_DTYPE, ids_to_objectids
+from .list_column import ListColumn
+from .varlen import VarLenColumn
+
+
+def _object_array(values, mask):
+    """Returns an object array of ``values``, with None where ``mask`` is
+    True."""
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = list(values)
+    array[mask] = None
+    return array
+
+
+def _to_pandas_values(column, typename):
+    """Converts one Monary column into values a DataFrame can hold, sharing
+    its buffers wherever pandas can.
+
+    Missing floats, dates and durations are overwritten in place with NaN or
+    NaT, or in a copy if the column is read-only. Integer and bool columns
+    with missing values become pandas nullable arrays over the same data and
+    mask. Categories become a ``pandas.Categorical`` over the same codes.
+    """
+    if isinstance(column, CategoricalColumn):
+        return pandas.Categorical.from_codes(column.codes.data,
+                                             column.categories)
+    if isinstance(column, VarLenColumn):
+        values = column.tolist()
+        if column.kind == "string":
+            return pandas.array(values, dtype="string")
+        return _object_array(values, column.mask)
+
+    data = numpy.ma.getdata(column)
+    mask = numpy.ma.getmaskarray(column)
+    if data.ndim > 1:
+        # Vectors: one masked row per document.
+        return _object_array(column, mask.all(axis=tuple(range(1,
+                                                               mask.ndim))))
+    if typename == "date":
+        data = data.view("datetime64[ms]")
+    if data.dtype == OBJECTID_DTYPE:
+        return _object_array(ids_to_objectids(column), mask)
+
+    kind = data.dtype.kind
+    if not mask.any():
+        return data
+    if kind in "fcmM" and not data.flags.writeable:
+        data = data.copy()
+    if kind in "fc":
+        data[mask] = numpy.nan
+        return data
+    if kind in "mM":
+        data[mask] = numpy.array("NaT", dtype=data.dtype)
+        return data
+    if kind in "iu":
+        return pandas.arrays.IntegerArray(data, mask)
+    if kind == "b":
+        return pandas.arrays.BooleanArray(data, mask)
+    return _object_array(data, mask)
+
+
+def to_dataframe(fields, types, columns):
+    """Builds a ``pandas.DataFrame`` from the columns returned by a Monary
+    query, named after their fields.
+
+    Numeric, date and category columns share memory with the query's
+    arrays. Fixed-size strings, binary values and ObjectIds become object
+    columns with None for missing values. ``timestamp_parts`` columns are
+    split into ``<field>.time`` and ``<field>.inc`` columns. List columns and
+    their items cannot be placed in a DataFrame, as the items do not line up
+    with the documents.
+
+    :Parameters:
+     - `fields`: list of field names, as passed to the query.
+     - `types`: list of Monary type names, as passed to the query.
+     - `columns`: the list of columns returned by the query.
+    """
+    if pandas is None:
+        raise RuntimeError("pandas is required to return DataFrames")
+    names = []
+    values = []
+    for field, typename, column in zip(fields, types, columns):
+        if isinstance(column, ListColumn):
+            raise ValueError("%r is a list, and cannot be placed in a "
+                             "DataFrame" % field)
+        if isinstance(column, BitmaskColumn):
+            column = column.to_masked()
+        dtype = getattr(column, "dtype", None)
+        if dtype is not None and dtype.names:
+            for name in dtype.names:
+                names.append("%s.%s" % (field, name))
+                values.append(_to_pandas_values(column[name], typename))
+        else:
+            names.append(field)
+            values.append(_to_pandas_values(column, typename))
+    return pandas.DataFrame(dict(zip(names, values)), columns=names,
+                            copy=False)
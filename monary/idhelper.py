@@ -0,0 +1,134 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import bson
+import numpy
+
+# The numpy type of an ``id`` column.
+OBJECTID_DTYPE = numpy.dtype("<V12")
+
+_HEX_DIGITS = numpy.frombuffer(b"0123456789abcdef", dtype=numpy.uint8)
+
+# The value of each ASCII hex digit, or 255 for any other byte.
+_HEX_VALUES = numpy.full(256, 255, dtype=numpy.uint8)
+_HEX_VALUES[_HEX_DIGITS] = numpy.arange(16)
+_HEX_VALUES[numpy.frombuffer(b"ABCDEF", dtype=numpy.uint8)] = \
+    numpy.arange(10, 16)
+
+
+def _with_mask(ids, values):
+    """Masks ``values`` wherever ``ids`` is masked, if it is a masked array.
+    """
+    if isinstance(ids, numpy.ma.MaskedArray):
+        return numpy.ma.masked_array(values, numpy.ma.getmaskarray(ids))
+    return values
+
+
+def ids_to_bytes(ids):
+    """Views an ``id`` column as an (N, 12) array of its bytes.
+
+       :param ids: array of ObjectIds, as loaded for an ``id`` column
+       :returns: uint8 array with one row per ObjectId; a view if ``ids`` is
+                 contiguous
+       :rtype: numpy.ndarray
+    """
+    data = numpy.ascontiguousarray(numpy.ma.getdata(ids))
+    if data.dtype != OBJECTID_DTYPE:
+        raise ValueError("expected an array of %r, got %r" %
+                         (OBJECTID_DTYPE, data.dtype))
+    return data.view(numpy.uint8).reshape(len(data), 12)
+
+
+def bytes_to_ids(id_bytes):
+    """Converts an (N, 12) uint8 array into an ``id`` column.
+
+       :param id_bytes: uint8 array with one row of 12 bytes per ObjectId
+       :returns: array of ``OBJECTID_DTYPE``
+       :rtype: numpy.ndarray
+    """
+    id_bytes = numpy.ascontiguousarray(id_bytes, dtype=numpy.uint8)
+    if id_bytes.ndim != 2 or id_bytes.shape[1] != 12:
+        raise ValueError("expected an (N, 12) array, got shape %r" %
+                         (id_bytes.shape,))
+    return id_bytes.view(OBJECTID_DTYPE).reshape(len(id_bytes))
+
+
+def ids_to_hex(ids):
+    """Converts an ``id`` column to the 24-character hex strings of its
+       ObjectIds, as ``str(ObjectId)`` would.
+
+       :param ids: array of ObjectIds, as loaded for an ``id`` column
+       :returns: array of ``U24`` strings, masked where ``ids`` is masked
+       :rtype: numpy.ndarray
+    """
+    id_bytes = ids_to_bytes(ids)
+    digits = numpy.empty((len(id_bytes), 24), dtype=numpy.uint8)
+    digits[:, 0::2] = _HEX_DIGITS[id_bytes >> 4]
+    digits[:, 1::2] = _HEX_DIGITS[id_bytes & 0xf]
+    hexes = digits.view("S24").reshape(len(id_bytes)).astype("U24")
+    return _with_mask(ids, hexes)
+
+
+def hex_to_ids(hexes):
+    """Converts 24-character hex strings into an ``id`` column.
+
+       :param hexes: sequence or array of hex strings
+       :returns: array of ``OBJECTID_DTYPE``
+       :rtype: numpy.ndarray
+    """
+    hexes = numpy.asarray(hexes)
+    if hexes.dtype.kind not in "SU":
+        hexes = hexes.astype("U")
+    # Measure the strings as given, since casting to S24 below would cut
+    # longer ones short.
+    if (numpy.char.str_len(hexes) != 24).any():
+        raise ValueError("ObjectIds must be 24 hex digits")
+    if hexes.dtype.kind == "U":
+        hexes = numpy.char.encode(hexes, "ascii")
+    digits = numpy.ascontiguousarray(hexes, dtype="S24")
+    digits = digits.view(numpy.uint8).reshape(len(digits), 24)
+    values = _HEX_VALUES[digits]
+    if (values == 255).any():
+        raise ValueError("ObjectIds must be 24 hex digits")
+    return bytes_to_ids((values[:, 0::2] << 4) | values[:, 1::2])
+
+
+def ids_to_objectids(ids):
+    """Converts an ``id`` column to a list of ``bson.ObjectId``.
+
+       :param ids: array of ObjectIds, as loaded for an ``id`` column
+       :returns: list of ObjectIds, with None where ``ids`` is masked
+       :rtype: list
+    """
+    raw = ids_to_bytes(ids).tobytes()
+    oids = [bson.ObjectId(raw[i:i + 12]) for i in range(0, len(raw), 12)]
+    if isinstance(ids, numpy.ma.MaskedArray):
+        for i in numpy.flatnonzero(numpy.ma.getmaskarray(ids)):
+            oids[i] = None
+    return oids
+
+
+def objectids_to_ids(oids):
+    """Converts a sequence of ``bson.ObjectId`` into an ``id`` column, as
+       accepted by ``insert``.
+
+       :param oids: sequence of ObjectIds
+       :returns: array of ``OBJECTID_DTYPE``
+       :rtype: numpy.ndarray
+    """
+    raw = b"".join(oid.binary for oid in oids)
+    return numpy.frombuffer(raw, dtype=OBJECTID_DTYPE).copy()
+
+
+def ids_to_datetime64(ids):
+    """Extracts the creation time embedded in each ObjectId of an ``id``
+       column. The ``id_time`` type does this while loading.
+
+       :param ids: array of ObjectIds, as loaded for an ``id`` column
+       :returns: array of ``datetime64[ms]``, masked where ``ids`` is masked
+       :rtype: numpy.ndarray
+    """
+    id_bytes = ids_to_bytes(ids)
+    seconds = numpy.ascontiguousarray(id_bytes[:, :4]).view(">u4")
+    millis = seconds.reshape(len(id_bytes)).astype(numpy.int64) * 1000
+    return _with_mask(ids, millis.view("datetime64[ms]"))
@@ -0,0 +1,110 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+
+class ListColumn(object):
+    """A column of arrays of any length, whose elements are held in flat item
+    columns. The elements of row ``i`` are items ``offsets[i]`` up to
+    ``offsets[i + 1]`` of each item column. A row is masked if its array is
+    missing (in which case it has no elements)."""
+    def __init__(self, offsets, mask):
+        """Create a new ListColumn.
+
+        :Parameters:
+         - `offsets`: int64 array of one more offset than there are rows.
+         - `mask`: bool array; True where an array is missing.
+        """
+        if len(offsets) != len(mask) + 1:
+            raise ValueError("Expected %d offsets for %d rows, got %d." %
+                             (len(mask) + 1, len(mask), len(offsets)))
+        self.offsets = offsets
+        self.mask = mask
+
+    @classmethod
+    def from_ends(cls, ends, mask):
+        """Create a ListColumn from the offset at which each row ends.
+
+        :Parameters:
+         - `ends`: int64 array of the end offset of each row.
+         - `mask`: bool array; True where an array is missing.
+        """
+        offsets = numpy.zeros(len(ends) + 1, dtype=numpy.int64)
+        offsets[1:] = ends
+        return cls(offsets, numpy.array(mask, dtype=bool))
+
+    @classmethod
+    def concatenate(cls, columns):
+        """Join ListColumns end to end, as their item columns would be.
+
+        :Parameters:
+         - `columns`: a list of ListColumns.
+        """
+        offsets = [numpy.zeros(1, dtype=numpy.int64)]
+        base = 0
+        for column in columns:
+            start, stop = column.offsets[0], column.offsets[-1]
+            offsets.append(column.offsets[1:] - start + base)
+            base += stop - start
+        return cls(numpy.concatenate(offsets),
+                   numpy.concatenate([numpy.zeros(0, dtype=bool)] +
+                                     [column.mask for column in columns]))
+
+    def __len__(self):
+        """Return the number of rows."""
+        return len(self.mask)
+
+    def __getitem__(self, key):
+        """Return the slice of the item columns holding a row's elements
+        (numpy.ma.masked if it is missing), or a ListColumn of the rows
+        selected by a slice.
+
+        :Parameters:
+         - `key`: An integer or slice.
+        """
+        if isinstance(key, (int, numpy.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("Index out of range.")
+            if self.mask[key]:
+                return numpy.ma.masked
+            return slice(int(self.offsets[key]), int(self.offsets[key + 1]))
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                return ListColumn(self.offsets[start:stop + 1],
+                                  self.mask[start:stop])
+        raise TypeError("ListColumns can only be indexed by an integer or a "
+                        "contiguous slice.")
+
+    def lengths(self):
+        """Return an int64 array of the number of elements in each row."""
+        return numpy.diff(self.offsets)
+
+    def parent_rows(self):
+        """Return an int64 array holding, for each element, the row it
+        belongs to. Indexing a column of the rows with it repeats each row's
+        value once per element, as ``$unwind`` would, so that
+        ``customer[items.parent_rows()]`` lines up with ``items.price``.
+        """
+        return numpy.repeat(numpy.arange(len(self), dtype=numpy.int64),
+                            self.lengths())
+
+    def split(self, items):
+        """Split an item column into a list of the elements of each row.
+
+        :Parameters:
+         - `items`: An item column of this list.
+        """
+        start, stop = self.offsets[0], self.offsets[-1]
+        return numpy.split(items[start:stop], self.offsets[1:-1] - start)
+
+    def count(self):
+        """Return the number of rows that are not missing."""
+        return int(len(self) - numpy.count_nonzero(self.mask))
+
+    def __repr__(self):
+        return "ListColumn(%r)" % (self.lengths().tolist(),)
@@ -4,9 +4,19 @@
 import atexit
 import copy
 import ctypes
+import numbers
 import os
 import platform
+import re
+import struct
 import sys
+import threading
+
+try:
+    import queue
+except ImportError:
+    # Python 2.6 / 2.7.
+    import Queue as queue
 
 PY3 = sys.version_info[0] >= 3
 if PY3:
@@ -30,6 +40,16 @@ except ImportError:
 import numpy
 import bson
 
+from .cursor_options import CursorOptions
+from .bitmask import BitmaskColumn
+from .category import CategoricalColumn
+from .datehelper import split_timestamps, TIMESTAMP_DTYPE
+from .frame import to_dataframe
+from .record_batch import pyarrow, to_record_batch
+from .result_cache import ResultCache
+from .list_column import ListColumn
+from .schema import Schema
+from .varlen import VarLenColumn, VARLEN_KINDS
 from .write_concern import WriteConcern
 
 cmonary = None
@@ -54,6 +74,26 @@ class MonaryError(Exception):
     pass
 
 
+class CBuffer(object):
+    """Owns a buffer of bytes allocated by cmonary, which NumPy can view
+    through ``numpy.asarray`` without a copy. The buffer is freed once
+    nothing refers to it.
+    """
+    def __init__(self, address, size):
+        self.address = address
+        self.__array_interface__ = {
+            "shape": (size,),
+            "typestr": "|u1",
+            "data": (address, False),
+            "version": 3,
+        }
+
+    def __del__(self):
+        # cmonary is already gone if this is freed at interpreter exit.
+        if cmonary is not None:
+            cmonary.monary_free_buffer(self.address)
+
+
 def _load_cmonary_lib():
     """Loads the cmonary CDLL library (from the directory containing
     this module).
@@ -95,18 +135,35 @@ FUNCDEFS = [
     # Format: "func_name:arg_types:return_type".
     "monary_init::0",
     "monary_cleanup::0",
-    "monary_connect:SP:P",
+    "monary_connect:SSSSSSBP:P",
     "monary_disconnect:P:0",
+    "monary_pool_new:SSSSSSBUUP:P",
+    "monary_pool_pop:P:P",
+    "monary_pool_push:PP:0",
+    "monary_pool_destroy:P:0",
     "monary_use_collection:PSS:P",
     "monary_destroy_collection:P:0",
     "monary_alloc_column_data:UU:P",
     "monary_free_column_data:P:I",
     "monary_set_column_item:PUSUUPPP:I",
+    "monary_set_column_vector:PUUP:I",
+    "monary_set_column_stride:PUUUP:I",
+    "monary_set_column_list_item:PUUP:I",
+    "monary_set_column_storage:PUPPP:I",
+    "monary_resize_column_data:PU:I",
+    "monary_take_column_varbuf:PUP:P",
+    "monary_free_buffer:P:0",
+    "monary_column_items:PUPP:P",
     "monary_query_count:PPP:L",
-    "monary_init_query:PUUPPIP:P",
-    "monary_init_aggregate:PPPP:P",
-    "monary_load_query:PP:I",
+    "monary_get_projection:PP:P",
+    "monary_init_query:PUUPPIUIP:P",
+    "monary_init_aggregate:PPPPP:P",
+    "monary_load_query:PUP:I",
+    "monary_set_query_column_data:PPP:I",
+    "monary_query_categories:PUPP:P",
     "monary_close_query:P:0",
+    "monary_infer_schema:PPP:P",
+    "monary_free_bson:P:0",
     "monary_create_write_concern:IIBBS:P",
     "monary_destroy_write_concern:P:0",
     "monary_insert:PPPPPP:0"
@@ -115,6 +172,25 @@ FUNCDEFS = [
 MAX_COLUMNS = 1024
 MAX_STRING_LENGTH = 1024
 
+# Maximum size in bytes of the BSON {min, max} bounds of a partition.
+MAX_PARTITION_BOUNDS_SIZE = 4096
+
+# Maximum number of collection handles each connection keeps open for reuse.
+MAX_CACHED_COLLECTIONS = 64
+
+# Initial number of rows allocated when the result size is not known in
+# advance, and the factor by which the arrays grow when they fill up.
+INITIAL_GROWABLE_ROWS = 4096
+GROWTH_FACTOR = 2
+
+# Value written over missing ``date`` values by mask="fill": the smallest
+# int64, which is what NaT is stored as in a datetime64 array.
+DATE_FILL_VALUE = numpy.iinfo(numpy.int64).min
+
+# How missing values are reported: as a byte-per-value mask, a packed
+# validity bitmap, a fill value written over them, or not at all.
+MASK_MODES = ("bytes", "bits", "fill", "none")
+
 
 def _decorate_cmonary_functions():
     """Decorates each of the cmonary functions with their argument and
@@ -149,6 +225,13 @@ MONARY_TYPES = {
     "float64":   (12, numpy.float64),
     "date":      (13, numpy.int64),
     "timestamp": (14, numpy.uint64),
+    # Dates and integer milliseconds as NumPy datetimes and durations.
+    "datetime64":  (13, numpy.dtype("datetime64[ms]")),
+    "timedelta64": (6, numpy.dtype("timedelta64[ms]")),
+    # Timestamps, split into their "time" and "inc" fields once loaded.
+    "timestamp_parts": (14, numpy.uint64),
+    # The creation time embedded in an ObjectId.
+    "id_time":   (28, numpy.dtype("datetime64[ms]")),
     # Note, numpy strings do not need the null character.
     "string":    (15, "S"),
     # Raw data (void pointer).
@@ -157,8 +240,59 @@ MONARY_TYPES = {
     "type":      (18, numpy.uint8),
     "size":      (19, numpy.uint32),
     "length":    (20, numpy.uint32),
+    # Variable-length values; the array holds where each row's value ends
+    # in a separate data buffer.
+    "varstring": (21, numpy.int64),
+    "varbinary": (22, numpy.int64),
+    "varbson":   (23, numpy.int64),
+    # Strings, as codes into a dictionary of the distinct strings.
+    "category":  (24, numpy.int32),
+    # Arrays of any length; the array holds where each row's elements end
+    # in the list's item columns.
+    "list":      (26, numpy.int64),
 }
 
+# The largest code of a category column's dictionary.
+CATEGORY_MAX_CODE = numpy.iinfo(numpy.int32).max
+
+# Type code of fixed-length vectors, such as "float32[128]", which load a
+# BSON array into a row of a 2-D array.
+VECTOR_TYPE = 25
+
+# Type code of fixed-length vectors packed into BSON binary data, such as
+# "binary_float32[128]".
+BINARY_VECTOR_TYPE = 27
+
+# Types that can be the elements of a vector.
+VECTOR_ELEMENT_TYPES = ("bool", "int8", "int16", "int32", "int64", "uint8",
+                        "uint16", "uint32", "uint64", "float32", "float64",
+                        "date", "datetime64", "timedelta64")
+
+_VECTOR_RE = re.compile(r"^(binary_)?(\w+)\[(\d+)\]$")
+
+
+def get_vector_type(typename):
+    """Split a vector type name such as ``float32[128]`` or
+       ``binary_float32[128]`` into its element type name, dimension, and
+       whether it is read from BSON binary data.
+
+       :param str typename: a Monary type name
+       :returns: (element_type_name, dimension, binary), or None if the type
+                 is not a vector
+       :rtype: tuple
+    """
+    match = _VECTOR_RE.match(typename)
+    if match is None:
+        return None
+    binary = match.group(1) is not None
+    elem_name, dim = match.group(2), int(match.group(3))
+    if elem_name not in VECTOR_ELEMENT_TYPES:
+        raise ValueError("Vectors of %r are not supported" % elem_name)
+    if dim == 0:
+        raise ValueError("Vector type %r must have a nonzero dimension"
+                         % typename)
+    return elem_name, dim, binary
+
 
 def get_monary_numpy_type(orig_typename):
     """Given a common typename, find the corresponding cmonary type number,
@@ -169,13 +303,35 @@ def get_monary_numpy_type(orig_typename):
        ``int32``, ``float64``, ``date``, or ``string``.
        If the type is ``string``,``binary``, or ``bson``, its name must be
        followed by a ``:size`` suffix indicating the maximum number of bytes
-       that will be used to store the representation.
+       that will be used to store the representation. The ``varstring``,
+       ``varbinary`` and ``varbson`` types store values of any length, and
+       the ``category`` type stores strings as codes into a dictionary. The
+       ``datetime64`` and ``timedelta64`` types store dates and integer
+       milliseconds as ``datetime64[ms]`` and ``timedelta64[ms]``, and the
+       ``timestamp_parts`` type stores timestamps that ``_finish_columns``
+       splits into their ``time`` and ``inc`` fields. The ``id_time`` type
+       stores the creation time of ObjectIds as ``datetime64[ms]``. The
+       ``list`` type stores where each row's array ends in its item columns
+       (see ``get_list_parents``).
+       A numeric, ``bool`` or ``date`` type followed by a ``[dimension]``
+       suffix, such as ``float32[128]``, loads arrays of that many elements
+       into the rows of a 2-D array. With a ``binary_`` prefix, such as
+       ``binary_float32[128]``, the rows are copied from binary data holding
+       the packed values instead.
 
        :param str orig_typename: a common type name with optional argument
                                  (for fields with a size)
        :returns: (type_num, type_arg, numpy_type)
        :rtype: tuple
     """
+    vector = get_vector_type(orig_typename)
+    if vector is not None:
+        elem_name, dim, binary = vector
+        numpy_type = numpy.dtype((MONARY_TYPES[elem_name][1], (dim,)))
+        if binary:
+            return BINARY_VECTOR_TYPE, dim, numpy_type
+        return VECTOR_TYPE, dim, numpy_type
+
     # Process any type_arg that might be included.
     if ':' in orig_typename:
         vals = orig_typename.split(':', 2)
@@ -200,11 +356,427 @@ def get_monary_numpy_type(orig_typename):
                              % type_name)
         type_num, numpy_type_code = MONARY_TYPES[type_name]
         numpy_type = numpy.dtype("%s%i" % (numpy_type_code, type_arg))
+    elif type_name == "category" and type_arg:
+        raise ValueError("'category' takes no typearg, but got %d: its "
+                         "int32 codes always number from 0 to %d"
+                         % (type_arg, CATEGORY_MAX_CODE))
+    elif (type_name in VARLEN_KINDS or type_name == "list") and type_arg:
+        raise ValueError("%r stores values of any length and takes no "
+                         "typearg" % type_name)
     else:
         type_num, numpy_type = MONARY_TYPES[type_name]
     return type_num, type_arg, numpy_type
 
 
+def get_list_parents(fields, types):
+    """Find the list column that each column is an item column of. A column
+       is an item column of a ``list`` column if its field lies below the
+       list's field: ``items.price`` holds the ``price`` of every element of
+       the ``items`` arrays, and ``items.$`` holds every element itself.
+
+       :param fields: list of field names
+       :param types: list of Monary type names
+       :returns: for each column, the index of its list column, or None
+       :rtype: list
+    """
+    lists = dict((field, i) for i, (field, typename)
+                 in enumerate(zip(fields, types)) if typename == "list")
+    parents = [None] * len(fields)
+    for i, (field, typename) in enumerate(zip(fields, types)):
+        parts = field.split(".")
+        for depth in range(1, len(parts)):
+            parent = lists.get(".".join(parts[:depth]))
+            if parent is None:
+                continue
+            if (typename == "list" or typename in VARLEN_KINDS or
+                    get_vector_type(typename) is not None):
+                raise ValueError("%r is inside the list %r, and %r columns "
+                                 "cannot hold list items"
+                                 % (field, fields[parent], typename))
+            parents[i] = parent
+            break
+        if "$" in parts and parents[i] is None:
+            raise ValueError("%r reads the elements of a list, but %r is not "
+                             "a list column" % (field, field.split(".$")[0]))
+    return parents
+
+
+def make_column_storage(numpy_type, count, masked=True):
+    """Allocate the data and mask arrays of a column. Vector types give 2-D
+       arrays, with a mask entry for each element.
+
+       The arrays are not initialized: cmonary writes the mask of every row
+       it loads, and ``Monary._finish_columns`` masks any rows after those.
+       Masked values are left unspecified.
+
+       :param numpy_type: the column's numpy type, from
+                          ``get_monary_numpy_type``
+       :param int count: number of rows to allocate
+       :param bool masked: (optional) whether to allocate a mask; without
+                           one, cmonary records nothing for missing values
+       :returns: (data, mask), where mask may be None
+       :rtype: tuple
+    """
+    data = numpy.empty([count], dtype=numpy_type)
+    mask = numpy.empty(data.shape, dtype=bool) if masked else None
+    return data, mask
+
+
+def count_rows(arrays):
+    """Returns the number of rows of a query's column arrays. The values of
+       item columns of lists are kept by cmonary, so their arrays have no
+       rows, and the longest array gives the count.
+
+       :param arrays: list of numpy.ndarray, one per column
+       :rtype: int
+    """
+    return max(len(array) for array in arrays) if arrays else 0
+
+
+def validate_mask_mode(mask):
+    """Checks the ``mask`` option of a query.
+
+       :param str mask: one of ``MASK_MODES``
+    """
+    if mask not in MASK_MODES:
+        raise ValueError("mask must be one of %s, not %r" %
+                         (", ".join(repr(mode) for mode in MASK_MODES),
+                          mask))
+
+
+def get_masked_columns(fields, types, mask):
+    """Finds the columns that cmonary must record missing values for under
+       a query's ``mask`` mode. Only ``"none"`` drops any masks, and then
+       only those of plain columns: lists, their items, vectors,
+       variable-length and category columns all still need their masks
+       while they are loaded.
+
+       :param fields: list of field names
+       :param types: list of Monary type names
+       :param str mask: one of ``MASK_MODES``
+       :returns: one bool per column; True if it needs a mask
+       :rtype: list
+    """
+    validate_mask_mode(mask)
+    if mask != "none":
+        return [True] * len(types)
+    parents = get_list_parents(fields, types)
+    return [parent is not None or typename in ("list", "category") or
+            typename in VARLEN_KINDS or get_vector_type(typename) is not None
+            for parent, typename in zip(parents, types)]
+
+
+def validate_fill_value(fields, types, mask, fill_value=None):
+    """Checks that every column of a query with ``mask="fill"`` has a fill
+       value. Bool columns have no default, since neither True nor False
+       can stand for a missing value.
+
+       :param fields: list of field names
+       :param types: list of Monary type names
+       :param str mask: the query's ``mask`` mode
+       :param fill_value: (optional) the query's ``fill_value``
+    """
+    if mask != "fill":
+        return
+    for field, typename in zip(fields, types):
+        value = fill_value
+        if isinstance(fill_value, dict):
+            value = fill_value.get(field)
+        numpy_type = get_monary_numpy_type(typename)[2]
+        if value is None and numpy.dtype(numpy_type).base.kind == "b":
+            raise ValueError("mask='fill' needs a fill_value for bool "
+                             "column %r" % field)
+
+
+def get_fill_value(dtype, value=None, typename=None):
+    """Finds the value written over missing values by ``mask="fill"``.
+
+       :param dtype: the numpy.dtype of the column
+       :param value: (optional) the caller's fill value; by default NaN for
+                     floating-point columns, NaT for datetime64 and
+                     timedelta64 columns, ``DATE_FILL_VALUE`` (NaT as an
+                     int64) for ``date`` columns, zero bytes for ObjectIds
+                     and other raw bytes, and ``numpy.ma.default_fill_value``
+                     otherwise. Bool columns have no default (see
+                     ``validate_fill_value``).
+       :param str typename: (optional) the column's Monary type name
+       :returns: a scalar of ``dtype``
+       :rtype: numpy.ndarray
+    """
+    dtype = numpy.dtype(dtype)
+    if value is None:
+        if dtype.kind in "fc":
+            value = numpy.nan
+        elif dtype.kind in "mM":
+            value = "NaT"
+        elif typename == "date":
+            value = DATE_FILL_VALUE
+        elif dtype.kind == "b":
+            raise ValueError("Bool columns need a fill_value")
+        elif dtype.kind == "V":
+            return numpy.zeros((), dtype=dtype)
+        else:
+            value = numpy.ma.default_fill_value(numpy.zeros((), dtype=dtype))
+    return numpy.array(value, dtype=dtype)
+
+
+def make_masked_array(data, mask, offset=0, count=None):
+    """Wraps rows ``offset`` through ``offset + count`` of a column's data
+       and mask in a masked array, sharing their memory.
+
+       :param data: the column's data array
+       :param mask: the column's mask array, or None if it has none
+       :param int offset: (optional) the first row
+       :param int count: (optional) the number of rows; by default, all of
+                         the rows after ``offset``
+       :rtype: numpy.ma.masked_array
+    """
+    stop = None if count is None else offset + count
+    if mask is None:
+        return numpy.ma.masked_array(data[offset:stop])
+    return numpy.ma.masked_array(data[offset:stop], mask[offset:stop])
+
+
+def apply_mask_mode(fields, columns, mask, fill_value=None, types=None):
+    """Converts the masked arrays among a query's columns for its ``mask``
+       mode. Variable-length, category and list columns keep their own
+       masks.
+
+       :param fields: list of field names
+       :param columns: the columns, as returned by ``_finish_columns``
+       :param str mask: one of ``MASK_MODES``; ``"bytes"`` leaves the
+                        columns as they are, ``"bits"`` makes each a
+                        BitmaskColumn, ``"fill"`` writes a fill value over
+                        each missing value in place and returns the data,
+                        and ``"none"`` returns the data as it is
+       :param fill_value: (optional) for ``"fill"``, a value for every
+                          column or a dict of values by field (see
+                          ``get_fill_value`` for the defaults)
+       :param types: (optional) list of Monary type names, which choose
+                     the default fill values of ``date`` columns
+       :rtype: list
+    """
+    if mask == "bytes":
+        return columns
+    result = list(columns)
+    for i, (field, column) in enumerate(zip(fields, columns)):
+        if not isinstance(column, numpy.ma.MaskedArray):
+            continue
+        data = numpy.ma.getdata(column)
+        if mask == "none":
+            result[i] = data
+            continue
+        missing = numpy.ma.getmaskarray(column)
+        names = data.dtype.names
+        if names:
+            # Split timestamps: a row is missing as a whole.
+            missing = missing[names[0]]
+        if mask == "bits":
+            result[i] = BitmaskColumn.from_mask(data, missing)
+            continue
+        value = fill_value
+        if isinstance(fill_value, dict):
+            value = fill_value.get(field)
+        if missing.any():
+            data[missing] = get_fill_value(
+                data.dtype, value, None if types is None else types[i])
+        result[i] = data
+    return result
+
+
+def get_record_dtype(fields, types):
+    """Builds the dtype of the structured array that a query with
+       ``structured=True`` loads into, with a field named after each
+       requested field. ``timestamp_parts`` fields are nested records of
+       ``TIMESTAMP_DTYPE``, and vectors are subarrays.
+
+       :param fields: list of field names, which must be distinct
+       :param types: list of Monary type names, which must each hold a
+                     fixed-size value per document
+       :rtype: numpy.dtype
+    """
+    parents = get_list_parents(fields, types)
+    descr = []
+    for field, typename, parent in zip(fields, types, parents):
+        if (parent is not None or typename in ("list", "category") or
+                typename in VARLEN_KINDS):
+            raise ValueError("%r cannot be loaded into a structured array, "
+                             "as it does not hold one fixed-size value per "
+                             "document" % field)
+        c_type, c_type_arg, numpy_type = get_monary_numpy_type(typename)
+        if typename == "timestamp_parts":
+            numpy_type = TIMESTAMP_DTYPE
+        descr.append((str(field), numpy_type))
+    return numpy.dtype(descr)
+
+
+def validate_record_options(mask, out=None, prefetch=0):
+    """Checks the options of a query with ``structured=True``.
+
+       :param str mask: the query's ``mask`` mode, which cannot be ``"bits"``
+       :param out: (optional) the query's ``out``, which must be None
+       :param int prefetch: (optional) the query's ``prefetch``, which must
+                            be 0
+    """
+    if mask == "bits":
+        raise ValueError("mask='bits' is not supported with structured=True")
+    if out is not None:
+        raise ValueError("out is not supported with structured=True")
+    if prefetch > 0:
+        raise ValueError("prefetch is not supported with structured=True")
+
+
+def get_record_columns(data, mask):
+    """Splits a structured array, and its mask, into the (data, mask) pairs
+       of each column, which are strided views of the records.
+
+       :param data: the structured array
+       :param mask: its mask (of ``numpy.ma.make_mask_descr``), or None
+       :returns: list of (data, mask) pairs, one per field of ``data``
+       :rtype: list
+    """
+    return [(data[name], None if mask is None else mask[name])
+            for name in data.dtype.names]
+
+
+def finish_records(data, mask, num_rows, mode, fill_value=None,
+                   types=None):
+    """Masks the records of a structured array after the ``num_rows`` that
+       were loaded, and reports missing values as a query's ``mask`` mode
+       asks.
+
+       :param data: the structured array
+       :param mask: its mask, as written by cmonary, or None
+       :param int num_rows: the number of records that were loaded
+       :param str mode: ``"bytes"``, ``"fill"`` or ``"none"``
+       :param fill_value: (optional) for ``"fill"``, as for
+                          ``apply_mask_mode``
+       :param types: (optional) list of Monary type names, one per field,
+                     as for ``apply_mask_mode``
+       :returns: the records, as a masked array for ``"bytes"``
+       :rtype: numpy.ndarray
+    """
+    if mode == "none" or mask is None:
+        return data
+    mask[num_rows:] = True
+    for name in mask.dtype.names:
+        # cmonary masks a timestamp as a whole, through its first part.
+        parts = mask.dtype[name].names
+        if parts:
+            for part in parts[1:]:
+                mask[name][part] = mask[name][parts[0]]
+    if mode == "bytes":
+        return numpy.ma.masked_array(data, mask)
+    for i, name in enumerate(data.dtype.names):
+        missing = mask[name]
+        if missing.dtype.names:
+            missing = missing[missing.dtype.names[0]]
+        value = fill_value
+        if isinstance(fill_value, dict):
+            value = fill_value.get(name)
+        if missing.any():
+            data[name][missing] = get_fill_value(
+                data.dtype[name].base, value,
+                None if types is None else types[i])
+    return data
+
+
+def grow_array(array, count):
+    """Copies an array into uninitialized storage with room for ``count``
+       rows. Unlike ``ndarray.resize``, this leaves the new rows unfilled.
+
+       :param array: the numpy array to grow
+       :param int count: the new number of rows, at least ``len(array)``
+       :returns: the new array
+       :rtype: numpy.ndarray
+    """
+    grown = numpy.empty((count,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def resize_records(records, count):
+    """Resizes a structured array and its mask. They are trimmed in place,
+       but grown into new arrays that replace them in ``records``.
+
+       :param records: the [data, mask] list, where mask may be None
+       :param int count: the new number of records
+    """
+    for i, array in enumerate(records):
+        if array is None:
+            continue
+        if count > len(array):
+            records[i] = grow_array(array, count)
+        else:
+            array.resize([count], refcheck=False)
+
+
+def get_out_rows(out):
+    """Finds the number of rows that caller-supplied output arrays can hold.
+
+       :param out: list of arrays (or None), one per column
+       :returns: the length of the shortest array, or None if every entry is
+                 None
+       :rtype: int
+    """
+    lengths = [len(array) for array in out if array is not None]
+    return min(lengths) if lengths else None
+
+
+def make_out_storage(out, types, count, masked=None):
+    """Prepares caller-supplied output arrays to be loaded into, checking
+       them against the requested types. Columns whose entry is None are
+       allocated as usual.
+
+       The first ``count`` rows of each array are used. If an entry is a
+       masked array with a full mask, its mask is filled in too; otherwise a
+       new mask is allocated.
+
+       :param out: list of numpy.ndarray or numpy.ma.masked_array (or None),
+                   one per column
+       :param types: list of Monary type names
+       :param int count: number of rows that will be loaded
+       :param masked: (optional) list of bools; whether each column needs a
+                      mask (see ``get_masked_columns``)
+       :returns: list of (data, mask) pairs
+       :rtype: list
+    """
+    if masked is None:
+        masked = [True] * len(types)
+    if len(out) != len(types):
+        raise ValueError("out must hold one array per field; got %d arrays "
+                         "for %d fields" % (len(out), len(types)))
+    storage = []
+    for i, (array, typename) in enumerate(zip(out, types)):
+        c_type, c_type_arg, numpy_type = get_monary_numpy_type(typename)
+        if array is None:
+            storage.append(make_column_storage(numpy_type, count,
+                                               masked[i]))
+            continue
+        expected = numpy.dtype(numpy_type)
+        data = numpy.ma.getdata(array)
+        if data.dtype != expected.base or data.shape[1:] != expected.shape:
+            raise ValueError("out array %d has dtype %r and shape %r, but "
+                             "%r needs dtype %r" % (i, data.dtype,
+                                                    data.shape, typename,
+                                                    expected))
+        if len(data) < count:
+            raise ValueError("out array %d holds %d rows, but %d are needed"
+                             % (i, len(data), count))
+        if not (data.flags.c_contiguous and data.flags.writeable):
+            raise ValueError("out array %d must be contiguous and writeable"
+                             % i)
+        if not masked[i]:
+            storage.append((data[:count], None))
+            continue
+        mask = numpy.ma.getmask(array)
+        if (mask is numpy.ma.nomask or mask.shape != data.shape or
+                not (mask.flags.c_contiguous and mask.flags.writeable)):
+            mask = numpy.empty(data.shape, dtype=bool)
+        storage.append((data[:count], mask[:count]))
+    return storage
+
+
 def make_bson(obj):
     """Given a Python (JSON compatible) dictionary, returns a BSON string.
 
@@ -226,21 +798,13 @@ def make_bson(obj):
 def mvoid_to_bson_id(mvoid):
     """Converts a numpy mvoid value to a BSON ObjectId.
 
+       To convert a whole ``id`` column, use ``ids_to_objectids`` instead.
+
        :param mvoid: numpy.ma.core.mvoid returned from Monary
        :returns: the _id as a bson ObjectId
        :rtype: bson.objectid.ObjectId
     """
-    if PY3:
-        # Python 3.
-        string = str(mvoid)
-        string_list = ''.join(filter(lambda y: y not in '[]', string)).split()
-        ints = map(int, string_list)
-        uints = [x & 0xff for x in ints]
-        id_bytes = bytes(uints)
-        return bson.ObjectId(id_bytes)
-    else:
-        # Python 2.6 / 2.7.
-        return bson.ObjectId(str(mvoid))
+    return bson.ObjectId(numpy.ma.getdata(mvoid).tobytes())
 
 
 def validate_insert_fields(fields):
@@ -266,6 +830,25 @@ def validate_insert_fields(fields):
                                  "fieldname %r" % (f2, f1))
 
 
+def validate_column_spec(fields, types):
+    """Validate the fields and types requested from a query.
+
+       :param fields: list of field names
+       :param types: list of Monary type names
+
+       :returns: None
+    """
+    if len(fields) != len(types):
+        raise ValueError("Number of fields and types do not match")
+    if len(fields) > MAX_COLUMNS:
+        raise ValueError("Number of fields exceeds maximum of %d"
+                         % MAX_COLUMNS)
+    for field in fields:
+        if len(field) > MAX_STRING_LENGTH:
+            raise ValueError("Length of field name %s exceeds "
+                             "maximum of %d" % (field, MAX_STRING_LENGTH))
+
+
 def get_ordering_dict(obj):
     """Converts a field/direction specification to an OrderedDict, suitable
        for BSON encoding.
@@ -322,6 +905,97 @@ def get_full_query(query, sort=None, hint=None):
     return make_bson(query)
 
 
+def get_select_fields(fields, types, select_fields=None):
+    """Decides whether a query asks the server for only the fields its
+       columns read.
+
+       The projection leaves out fields no column reads, including ``_id``,
+       and fetches only the first elements of arrays read as vectors (see
+       ``monary_get_bson_fields_list``). Item columns of lists, such as
+       ``items.$``, are fetched along with their whole list. The projection
+       is used by default unless any other field has a component beginning
+       with ``$``, which a projection would treat as an operator.
+
+       :param fields: list of fields
+       :param types: list of Monary type names
+       :param select_fields: True or False to choose, or None for the default
+       :rtype: bool
+    """
+    if select_fields is not None:
+        return bool(select_fields)
+    parents = get_list_parents(fields, types)
+    return not any(parent is None and part.startswith("$")
+                   for field, parent in zip(fields, parents)
+                   for part in field.split("."))
+
+
+def get_result_key(kind, encoded_query, fields, types, *options):
+    """Composes the key under which a ``ResultCache`` keeps the result of a
+       query.
+
+       :param str kind: "query" or "aggregate"
+       :param encoded_query: the BSON encoded query or pipeline
+       :param fields: list of fields
+       :param types: corresponding list of field types
+       :param options: any other arguments that change the result
+       :returns: the key
+       :rtype: tuple
+    """
+    return (kind, encoded_query, tuple(fields), tuple(types),
+            tuple(repr(option) for option in options))
+
+
+def get_partition_query(query, partition_key, lower=None, upper=None):
+    """Restricts a query to one range of values of a partition key. A missing
+    ``lower`` bound leaves the range open below, including documents in
+    which the key is missing or null; a missing ``upper`` bound leaves the
+    range open above.
+
+     :param dict query: query dictionary (or None)
+     :param str partition_key: the field whose values are partitioned
+     :param lower: (optional) the smallest value in the range
+     :param upper: (optional) the value just past the end of the range
+     :returns: the restricted query
+     :rtype: dict
+    """
+    if query is None:
+        query = {}
+    elif isinstance(query, bytes_type):
+        query = bson.BSON(query).decode()
+
+    if lower is None and upper is None:
+        return query
+    elif lower is None:
+        key_range = {"$not": {"$gte": upper}}
+    elif upper is None:
+        key_range = {"$gte": lower}
+    else:
+        key_range = OrderedDict([("$gte", lower), ("$lt", upper)])
+
+    if not query:
+        return {partition_key: key_range}
+    return {"$and": [query, {partition_key: key_range}]}
+
+
+def concatenate_columns(typename, columns):
+    """Joins the pieces of one column of a query end to end, as returned by
+    ``Monary._finish_columns`` for each range read by a parallel query.
+
+     :param str typename: the column's Monary type name
+     :param columns: non-empty list of pieces of the column
+     :returns: the joined column
+    """
+    if typename in VARLEN_KINDS:
+        return VarLenColumn.concatenate(columns, VARLEN_KINDS[typename])
+    if typename == "category":
+        return CategoricalColumn.concatenate(columns)
+    if typename == "list":
+        return ListColumn.concatenate(columns)
+    if any(isinstance(column, numpy.ma.MaskedArray) for column in columns):
+        return numpy.ma.concatenate(columns)
+    return numpy.concatenate(columns)
+
+
 def get_pipeline(pipeline):
     """Manipulates the input pipeline into a usable form."""
     if isinstance(pipeline, list):
@@ -334,13 +1008,141 @@ def get_pipeline(pipeline):
     return pipeline
 
 
+def pipeline_writes(pipeline):
+    """Returns whether a pipeline, from ``get_pipeline``, writes its results
+       to a collection with ``$out`` or ``$merge``."""
+    return any(isinstance(stage, dict) and ("$out" in stage or
+                                            "$merge" in stage)
+               for stage in pipeline["pipeline"])
+
+
+def add_pipeline_limit(pipeline, limit):
+    """Returns a copy of a pipeline, from ``get_pipeline``, that passes on
+       at most ``limit`` documents. The ``$limit`` stage goes before a final
+       ``$out`` or ``$merge`` stage, which must stay last.
+
+       :param dict pipeline: the pipeline
+       :param int limit: the number of documents
+       :rtype: dict
+    """
+    pipeline = copy.deepcopy(pipeline)
+    stages = pipeline["pipeline"]
+    position = len(stages)
+    if stages and isinstance(stages[-1], dict) and \
+            ("$out" in stages[-1] or "$merge" in stages[-1]):
+        position -= 1
+    stages.insert(position, {"$limit": limit})
+    return pipeline
+
+
+# Client pools, shared by every pooled connection made with the same
+# arguments, with the number of connections using each and the number of
+# clients checked out of each.
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def acquire_pool(client_args, min_size, max_size):
+    """Returns the client pool for a set of connection arguments, creating
+       it for the first connection to use them. Every call must be matched
+       by a call to ``release_pool``.
+
+       :param client_args: the connection arguments, as saved by
+                           ``Monary.connect``
+       :param int min_size: the number of idle clients a new pool keeps open
+       :param int max_size: the most clients a new pool opens at once, or 0
+                            for the driver's default
+       :returns: the pool
+       :rtype: cmonary mongoc_client_pool_t*
+    """
+    with _pools_lock:
+        entry = _pools.get(client_args)
+        if entry is None:
+            (uri, p_file, pem_pwd, ca_file,
+             ca_dir, c_file, weak_cert_validation) = client_args
+            err = get_empty_bson_error()
+            pool = cmonary.monary_pool_new(
+                uri,
+                ctypes.c_char_p(p_file),
+                ctypes.c_char_p(pem_pwd),
+                ctypes.c_char_p(ca_file),
+                ctypes.c_char_p(ca_dir),
+                ctypes.c_char_p(c_file),
+                ctypes.c_bool(weak_cert_validation),
+                min_size,
+                max_size,
+                ctypes.byref(err))
+            if pool is None:
+                raise MonaryError(err.message)
+            entry = _pools[client_args] = [pool, 0, 0]
+        entry[1] += 1
+        return entry[0]
+
+
+def release_pool(client_args):
+    """Stops using the client pool for a set of connection arguments,
+       destroying it once no connection uses it and every client checked
+       out of it has been pushed back.
+
+       :param client_args: the connection arguments given to
+                           ``acquire_pool``
+    """
+    with _pools_lock:
+        entry = _pools[client_args]
+        entry[1] -= 1
+        if entry[1] == 0 and entry[2] == 0:
+            del _pools[client_args]
+            cmonary.monary_pool_destroy(entry[0])
+
+
+def pop_client(client_args):
+    """Checks a client out of the pool for a set of connection arguments,
+       waiting for one if the pool is at its ``max_size``. The pool is kept
+       until the client is passed to ``push_client``, even if every
+       connection releases it first.
+
+       :param client_args: the connection arguments given to
+                           ``acquire_pool``
+       :returns: the client
+       :rtype: cmonary mongoc_client_t*
+    """
+    with _pools_lock:
+        entry = _pools.get(client_args)
+        if entry is None:
+            raise MonaryError("Unable to check out a client - the pool "
+                              "has been closed")
+        entry[2] += 1
+    client = cmonary.monary_pool_pop(entry[0])
+    if client is None:
+        push_client(client_args, None)
+    return client
+
+
+def push_client(client_args, client):
+    """Returns a client from ``pop_client`` to its pool, destroying the
+       pool if no connection uses it any more.
+
+       :param client_args: the connection arguments given to ``pop_client``
+       :param client: the client, or None to only count it as returned
+    """
+    with _pools_lock:
+        entry = _pools[client_args]
+        if client is not None:
+            cmonary.monary_pool_push(entry[0], client)
+        entry[2] -= 1
+        if entry[1] == 0 and entry[2] == 0:
+            del _pools[client_args]
+            cmonary.monary_pool_destroy(entry[0])
+
+
 class Monary(object):
     """Represents a 'monary' connection to a particular MongoDB server."""
 
     def __init__(self, host="localhost", port=27017, username=None,
                  password=None, database=None, pem_file=None,
                  pem_pwd=None, ca_file=None, ca_dir=None, crl_file=None,
-                 weak_cert_validation=True, options=None):
+                 weak_cert_validation=True, options=None, pooled=False,
+                 min_pool_size=0, max_pool_size=0, result_cache=None):
         """
 
             An example of initializing monary with a port and hostname:
@@ -366,18 +1168,39 @@ class Monary(object):
            :param crl_file: Certificate revocation list file
            :param weak_cert_validation: bypass validation
            :param options: Connection-specific options as a dict.
+           :param pooled: Check a client out of a shared, thread-safe pool
+           for each operation instead of using a single client; see
+           ``connect``.
+           :param min_pool_size: The number of idle clients the pool keeps.
+           :param max_pool_size: The most clients the pool opens at once, or
+           0 for the driver's default.
+           :param result_cache: A ResultCache or DiskResultCache to keep the
+           results of ``query`` and ``aggregate`` in, or the number of bytes
+           of results to keep in a new ResultCache.
         """
 
+        if isinstance(result_cache, numbers.Integral):
+            result_cache = ResultCache(result_cache)
+        self.result_cache = result_cache
         self._cmonary = cmonary
         self._connection = None
+        self._pool = None
+        self._reader_pool = None
+        self._pool_lock = threading.Lock()
+        self._pooled_clients = {}
+        self._client_args_of = {}
+        self._collections = OrderedDict()
+        self._schema_cache = {}
         self.connect(host, port, username, password, database,
                      pem_file, pem_pwd, ca_file, ca_dir, crl_file,
-                     weak_cert_validation, options)
+                     weak_cert_validation, options, pooled, min_pool_size,
+                     max_pool_size)
 
     def connect(self, host="localhost", port=27017, username=None,
                 password=None, database=None, p_file=None,
                 pem_pwd=None, ca_file=None, ca_dir=None, c_file=None,
-                weak_cert_validation=False, options=None):
+                weak_cert_validation=False, options=None, pooled=False,
+                min_pool_size=0, max_pool_size=0):
         """Connects to the given host and port.
 
            :param host: either host name (or IP) to connect to, or full URI
@@ -395,11 +1218,24 @@ class Monary(object):
            :param c_file: Certificate revocation list file
            :param weak_cert_validation: bypass validation
            :param options: Connection-specific options as a dict.
+           :param pooled: Use a pool of clients rather than a single one.
+           :param min_pool_size: The number of idle clients the pool keeps.
+           :param max_pool_size: The most clients the pool opens at once, or
+           0 for the driver's default.
 
            :returns: True if successful; false otherwise.
            :rtype: bool
+
+           A single client (the default) cannot be used by more than one
+           thread at a time. With ``pooled=True``, each operation checks a
+           client out of a ``mongoc_client_pool_t`` and returns it when it
+           is done, so one Monary can serve many threads at once. Every
+           pooled Monary connected with the same URI and SSL options shares
+           one pool, which is created with the sizes given by the first, and
+           destroyed when the last of them is closed. Block queries hold
+           their client until they are exhausted or closed.
         """
-        if self._connection is not None:
+        if self._connection is not None or self._pool is not None:
             self.close()
 
         if host.startswith("mongodb://"):
@@ -431,10 +1267,33 @@ class Monary(object):
             ca_dir = bytes(ca_dir, "ascii") if ca_dir is not None else None
             c_file = bytes(c_file, "ascii") if c_file is not None else None
 
+        # Remember the connection arguments, so that parallel queries can
+        # open more connections to the same server.
+        self._client_args = (uri.encode('ascii'), p_file, pem_pwd, ca_file,
+                             ca_dir, c_file, weak_cert_validation)
+
+        # Handles from an earlier connection cannot be reused.
+        self._clear_collections()
+
         # Attempt the connection.
+        if pooled:
+            self._pool = acquire_pool(self._client_args, min_pool_size,
+                                      max_pool_size)
+        else:
+            self._connection = self._new_client()
+
+    def _new_client(self):
+        """Opens a new cmonary client with the arguments given to the last
+        call to ``connect``.
+
+           :returns: the client
+           :rtype: cmonary mongoc_client_t*
+        """
+        (uri, p_file, pem_pwd, ca_file,
+         ca_dir, c_file, weak_cert_validation) = self._client_args
         err = get_empty_bson_error()
-        self._connection = cmonary.monary_connect(
-            uri.encode('ascii'),
+        client = cmonary.monary_connect(
+            uri,
             ctypes.c_char_p(p_file),
             ctypes.c_char_p(pem_pwd),
             ctypes.c_char_p(ca_file),
@@ -442,10 +1301,71 @@ class Monary(object):
             ctypes.c_char_p(c_file),
             ctypes.c_bool(weak_cert_validation),
             ctypes.byref(err))
-        if self._connection is None:
+        if client is None:
             raise MonaryError(err.message)
+        return client
+
+    def _cache_result(self, db, coll, key, result):
+        """Keeps the result of a query in ``result_cache``, if it is to be
+           cached, and returns it.
+
+           :param db: name of database
+           :param coll: name of collection
+           :param key: the key from ``get_result_key``, or None if the query
+                       is not to be cached
+           :param result: the result
+        """
+        if key is None or self.result_cache is None:
+            return result
+        return self.result_cache.put(db, coll, key, result)
+
+    def _acquire_client(self):
+        """Returns a client that the calling thread can use on its own
+        until it passes it to ``_release_client``. It is checked out of the
+        connection's pool if connected with ``pooled=True``, or else out of
+        a pool opened the first time it is needed and kept until ``close``,
+        so that repeated parallel queries reuse their connections. Either
+        pool outlives ``close`` until the client is released.
+
+           :rtype: cmonary mongoc_client_t*
+        """
+        # Opens the reader pool, if it is the one to use.
+        self._get_reader_pool()
+        client_args = self._client_args
+        client = pop_client(client_args)
+        if client is None:
+            raise MonaryError("Unable to check a client out of the pool")
+        with self._pool_lock:
+            self._client_args_of[client] = client_args
+        return client
+
+    def _release_client(self, client):
+        """Returns a client from ``_acquire_client`` to the pool it came
+        from, even if the connection has since been closed.
+
+           :param client: the client
+        """
+        with self._pool_lock:
+            client_args = self._client_args_of.pop(client)
+        push_client(client_args, client)
+
+    def _get_reader_pool(self):
+        """Returns the pool ``_acquire_client`` checks clients out of.
 
-    def _make_column_data(self, fields, types, count):
+           :rtype: cmonary mongoc_client_pool_t*
+        """
+        if self._pool is not None:
+            return self._pool
+        with self._pool_lock:
+            if self._reader_pool is None:
+                if self._connection is None:
+                    raise MonaryError("Unable to open a client - "
+                                      "not connected")
+                self._reader_pool = acquire_pool(self._client_args, 0, 0)
+            return self._reader_pool
+
+    def _make_column_data(self, fields, types, count, out=None,
+                          masked=None):
         """Builds the 'column data' structure used by the underlying cmonary
         code to populate the arrays.  This code must allocate the array
         objects, and provide their corresponding storage pointers and sizes
@@ -454,68 +1374,720 @@ class Monary(object):
          :param fields: list of field names
          :param types: list of Monary type names
          :param count: size of storage to be allocated
+         :param out: (optional) list of caller-supplied arrays to load into
+                     instead (see ``make_out_storage``)
+         :param masked: (optional) list of bools; whether each column needs
+                        a mask (see ``get_masked_columns``)
 
          :returns: (coldata, colarrays) where coldata is the cmonary
                     column data storage structure, and colarrays is a list of
                     numpy.ndarray instances
          :rtype: tuple
         """
+        coldata, storage = self._make_raw_column_data(fields, types, count,
+                                                      out, masked)
+        colarrays = [make_masked_array(data, mask) for data, mask in storage]
+        return coldata, colarrays
+
+    def _make_raw_column_data(self, fields, types, count, out=None,
+                              masked=None):
+        """Like ``_make_column_data``, but returns the data and mask arrays
+        of each column separately instead of wrapping them in masked arrays,
+        so that they can still be resized.
+
+         :param fields: list of field names
+         :param types: list of Monary type names
+         :param count: size of storage to be allocated
+         :param out: (optional) list of caller-supplied arrays to load into
+                     instead (see ``make_out_storage``)
+         :param masked: (optional) list of bools; whether each column needs
+                        a mask (see ``get_masked_columns``)
+
+         :returns: (coldata, storage) where coldata is the cmonary column
+                   data storage structure, and storage is a list of
+                   (data, mask) pairs of numpy.ndarray instances; the mask
+                   is None for columns that do not need one
+         :rtype: tuple
+        """
+        validate_column_spec(fields, types)
+        if masked is None:
+            masked = [True] * len(types)
+        if out is not None:
+            storage = make_out_storage(out, types, count, masked)
+        else:
+            # Item columns of lists are loaded into cmonary's buffers, not
+            # one value per row.
+            parents = get_list_parents(fields, types)
+            storage = []
+            for i, typename in enumerate(types):
+                c_type, c_type_arg, numpy_type = get_monary_numpy_type(
+                    typename)
+                storage.append(make_column_storage(
+                    numpy_type, count if parents[i] is None else 0,
+                    masked[i]))
+
+        coldata = self._bind_column_data(fields, types, storage, 0, count)
+        return coldata, storage
+
+    def _bind_column_data(self, fields, types, storage, offset, count):
+        """Builds a 'column data' structure over rows ``offset`` through
+        ``offset + count`` of arrays that have already been allocated.
+
+         :param fields: list of field names
+         :param types: list of Monary type names
+         :param storage: list of (data, mask) pairs of numpy.ndarray
+                         instances, one per field; a mask of None records
+                         nothing for missing values, and arrays whose rows
+                         are not contiguous are written at their stride
+         :param offset: index of the first row that cmonary will fill
+         :param count: number of rows that cmonary may fill
+
+         :returns: the cmonary column data storage structure
+        """
 
         err = get_empty_bson_error()
 
-        numcols = len(fields)
-        if numcols != len(types):
-            raise ValueError("Number of fields and types do not match")
-        if numcols > MAX_COLUMNS:
-            raise ValueError("Number of fields exceeds maximum of %d"
-                             % MAX_COLUMNS)
-        coldata = cmonary.monary_alloc_column_data(numcols, count)
+        validate_column_spec(fields, types)
+        coldata = cmonary.monary_alloc_column_data(len(fields), count)
         if coldata is None:
             raise MonaryError("Unable to allocate column data")
-        colarrays = []
-        for i, (field, typename) in enumerate(zip(fields, types)):
-            if len(field) > MAX_STRING_LENGTH:
-                raise ValueError("Length of field name %s exceeds "
-                                 "maximum of %d" % (field, MAX_COLUMNS))
+        try:
+            for i, (field, typename) in enumerate(zip(fields, types)):
+                c_type, c_type_arg, numpy_type = get_monary_numpy_type(
+                    typename)
+                data, mask = storage[i]
+
+                data_p = ctypes.c_void_p(data.ctypes.data +
+                                         offset * data.strides[0])
+                mask_p = None
+                if mask is not None:
+                    mask_p = ctypes.c_void_p(mask.ctypes.data +
+                                             offset * mask.strides[0])
+                if cmonary.monary_set_column_item(
+                        coldata,
+                        i,
+                        field.encode('ascii'),
+                        c_type,
+                        c_type_arg,
+                        data_p,
+                        mask_p,
+                        ctypes.byref(err)) < 0:
+                    raise MonaryError(err.message)
+                if c_type in (VECTOR_TYPE, BINARY_VECTOR_TYPE):
+                    self._set_vector_type(coldata, i, typename)
+                if not data.flags.c_contiguous or (
+                        mask is not None and not mask.flags.c_contiguous):
+                    # A field of a structured array.
+                    if cmonary.monary_set_column_stride(
+                            coldata,
+                            i,
+                            data.strides[0],
+                            0 if mask is None else mask.strides[0],
+                            ctypes.byref(err)) < 0:
+                        raise MonaryError(err.message)
+            # Every list column must be set up before its items are.
+            for i, parent in enumerate(get_list_parents(fields, types)):
+                if parent is not None and cmonary.monary_set_column_list_item(
+                        coldata, i, parent, ctypes.byref(err)) < 0:
+                    raise MonaryError(err.message)
+        except:
+            cmonary.monary_free_column_data(coldata)
+            raise
 
-            c_type, c_type_arg, numpy_type = get_monary_numpy_type(typename)
+        return coldata
 
-            data = numpy.zeros([count], dtype=numpy_type)
-            mask = numpy.ones([count], dtype=bool)
-            storage = numpy.ma.masked_array(data, mask)
-            colarrays.append(storage)
+    def _make_record_data(self, fields, types, count, masked):
+        """Like ``_make_raw_column_data``, but allocates one structured
+        array (see ``get_record_dtype``) and one mask for it, and points
+        cmonary at each field of their records.
 
-            data_p = data.ctypes.data_as(ctypes.c_void_p)
-            mask_p = mask.ctypes.data_as(ctypes.c_void_p)
-            if cmonary.monary_set_column_item(
+         :param fields: list of field names
+         :param types: list of Monary type names
+         :param count: number of records to allocate
+         :param masked: list of bools; whether each column needs a mask
+                        (see ``get_masked_columns``). The records have a
+                        mask if any column does.
+
+         :returns: (coldata, storage, records) where storage is the list of
+                   (data, mask) views of each field, and records is the
+                   [data, mask] list of the structured arrays, with a mask
+                   of None if no column needs one
+         :rtype: tuple
+        """
+        validate_column_spec(fields, types)
+        dtype = get_record_dtype(fields, types)
+        data = numpy.empty([count], dtype=dtype)
+        mask = None
+        if any(masked):
+            mask = numpy.empty([count],
+                               dtype=numpy.ma.make_mask_descr(dtype))
+        storage = get_record_columns(data, mask)
+        coldata = self._bind_column_data(fields, types, storage, 0, count)
+        return coldata, storage, [data, mask]
+
+    def _fit_out(self, out, count, growable):
+        """Fits a query to caller-supplied output arrays, which are never
+        grown.
+
+         :param out: list of arrays (or None), one per column
+         :param count: the number of rows the query would allocate
+         :param growable: whether the query would grow its arrays
+
+         :returns: (count, growable) to use instead; a query that would
+                   have grown its arrays must then check that it read
+                   every result with ``_check_out_exhausted``
+         :rtype: tuple
+        """
+        rows = get_out_rows(out)
+        if rows is None:
+            return count, growable
+        if growable:
+            return rows, False
+        if count > rows:
+            raise ValueError("out holds %d rows, but there are %d results"
+                             % (rows, count))
+        return count, False
+
+    def _check_out_exhausted(self, cursor, fields, types, masked, rows):
+        """Raises ValueError if a cursor that filled caller-supplied output
+        arrays has more results, which the arrays have no room for. The
+        cursor is moved on to a scratch row to find out, so it must not be
+        loaded from again.
+
+         :param cursor: the cmonary cursor that filled the arrays
+         :param fields: list of field names
+         :param types: list of Monary type names
+         :param masked: list of bools; whether each column needs a mask
+         :param int rows: the number of rows the arrays hold
+        """
+        err = get_empty_bson_error()
+        coldata, storage = self._make_raw_column_data(fields, types, 1,
+                                                      masked=masked)
+        try:
+            if cmonary.monary_set_query_column_data(
+                    cursor, coldata, ctypes.byref(err)) < 0:
+                raise MonaryError(err.message)
+            num_rows = cmonary.monary_load_query(cursor, 0, ctypes.byref(err))
+            if num_rows < 0:
+                raise MonaryError(err.message)
+        finally:
+            cmonary.monary_free_column_data(coldata)
+        if num_rows > 0:
+            raise ValueError("out holds %d rows, but there are more results"
+                             % rows)
+
+    def _get_projection(self, fields, types):
+        """Returns the projection a query sends when it selects fields (see
+        ``get_select_fields``).
+
+         :param fields: list of field names
+         :param types: list of Monary type names
+
+         :returns: the projection, or None if no field is selected
+         :rtype: dict
+        """
+        coldata, storage = self._make_raw_column_data(fields, types, 0)
+        try:
+            length = ctypes.c_uint32(0)
+            data = cmonary.monary_get_projection(coldata,
+                                                 ctypes.byref(length))
+            if data is None:
+                return None
+            try:
+                return bson.BSON(ctypes.string_at(data,
+                                                  length.value)).decode()
+            finally:
+                cmonary.monary_free_bson(data)
+        finally:
+            cmonary.monary_free_column_data(coldata)
+
+    def _set_vector_type(self, coldata, colnum, typename):
+        """Tells cmonary the element type of a vector column.
+
+         :param coldata: the cmonary column data storage structure
+         :param colnum: the number of the vector column
+         :param typename: the column's Monary type name
+        """
+        err = get_empty_bson_error()
+        elem_name, dim, binary = get_vector_type(typename)
+        if cmonary.monary_set_column_vector(
+                coldata,
+                colnum,
+                MONARY_TYPES[elem_name][0],
+                ctypes.byref(err)) < 0:
+            raise MonaryError(err.message)
+
+    def _resize_column_data(self, coldata, storage, count, records=None):
+        """Grows the arrays of each column into new, uninitialized arrays
+        (see ``grow_array``), replacing them in ``storage``, and points
+        cmonary at their new locations.
+
+         :param coldata: the cmonary column data storage structure
+         :param storage: list of (data, mask) pairs from
+                         ``_make_raw_column_data``
+         :param count: the new number of rows
+         :param records: (optional) the structured arrays from
+                         ``_make_record_data``, which are resized instead,
+                         replacing the views in ``storage``
+        """
+        err = get_empty_bson_error()
+        if records is not None:
+            resize_records(records, count)
+            storage[:] = get_record_columns(*records)
+        else:
+            for i, (data, mask) in enumerate(storage):
+                # Item columns of lists keep no rows (see
+                # ``count_rows``).
+                if not len(data):
+                    continue
+                if mask is not None:
+                    mask = grow_array(mask, count)
+                storage[i] = (grow_array(data, count), mask)
+        for i, (data, mask) in enumerate(storage):
+            mask_p = None
+            if mask is not None:
+                mask_p = mask.ctypes.data_as(ctypes.c_void_p)
+            if cmonary.monary_set_column_storage(
                     coldata,
                     i,
-                    field.encode('ascii'),
-                    c_type,
-                    c_type_arg,
-                    data_p,
+                    data.ctypes.data_as(ctypes.c_void_p),
                     mask_p,
                     ctypes.byref(err)) < 0:
                 raise MonaryError(err.message)
+        cmonary.monary_resize_column_data(coldata, count)
+
+    def _snapshot_columns(self, cursor, coldata, fields, types,
+                          decoded=None):
+        """Takes what cmonary keeps outside of the column arrays: the data
+        of each variable-length column, which is handed over without a
+        copy, and copies of the categories of each category column and the
+        values of each item column of a list. This must be done before the
+        next load from the cursor.
+
+         :param cursor: the cmonary cursor that was loaded from
+         :param coldata: the cmonary column data that was loaded
+         :param fields: list of field names
+         :param types: list of Monary type names
+         :param decoded: (optional) dict kept across the loads of one
+                         cursor, in which the categories decoded for each
+                         column are kept so that later loads only decode
+                         new ones (see ``_snapshot_categories``)
+
+         :returns: for each column, a numpy.ndarray of its data or
+                   categories, an (items, categories) pair for item columns,
+                   or None
+         :rtype: list
+        """
+        parents = get_list_parents(fields, types)
+        extras = [None] * len(types)
+        for i, typename in enumerate(types):
+            categories = None
+            if typename == "category":
+                categories = self._snapshot_categories(
+                    cursor, i, None if decoded is None
+                    else decoded.setdefault(i, []))
+            if parents[i] is not None:
+                extras[i] = (self._snapshot_items(coldata, i, typename),
+                             categories)
+            elif typename in VARLEN_KINDS:
+                # The array takes over cmonary's buffer rather than
+                # copying it.
+                size = ctypes.c_uint64(0)
+                buf = cmonary.monary_take_column_varbuf(coldata, i,
+                                                        ctypes.byref(size))
+                if buf is None:
+                    extras[i] = numpy.zeros([0], dtype=numpy.uint8)
+                else:
+                    extras[i] = numpy.asarray(CBuffer(buf, size.value))
+            elif typename == "category":
+                extras[i] = categories
+        return extras
+
+    def _snapshot_categories(self, cursor, colnum, decoded=None):
+        """Copies out the categories of a category column. A cursor's
+        dictionaries only grow, so only the strings added since the
+        categories in ``decoded`` were read need decoding.
+
+         :param cursor: the cmonary cursor that was loaded from
+         :param colnum: the number of the column
+         :param decoded: (optional) list of the categories decoded from
+                         this column of the cursor so far, which is extended
+                         with the new ones
+
+         :returns: the categories, indexed by code
+         :rtype: numpy.ndarray
+        """
+        if decoded is None:
+            decoded = []
+        num_codes = ctypes.c_uint64(0)
+        ends_p = ctypes.POINTER(ctypes.c_int64)()
+        buf = cmonary.monary_query_categories(cursor, colnum,
+                                              ctypes.byref(num_codes),
+                                              ctypes.byref(ends_p))
+        known = len(decoded)
+        if num_codes.value > known:
+            base = ends_p[known - 1] if known else 0
+            ends = ends_p[known:num_codes.value]
+            data = ctypes.string_at(buf + base, ends[-1] - base)
+            start = 0
+            for end in ends:
+                decoded.append(data[start:end - base].decode("utf-8"))
+                start = end - base
+        categories = numpy.empty([num_codes.value], dtype=object)
+        categories[:] = decoded[:num_codes.value]
+        return categories
+
+    def _snapshot_items(self, coldata, colnum, typename):
+        """Copies out the values of an item column of a list.
+
+         :param coldata: the cmonary column data that was loaded
+         :param colnum: the number of the column
+         :param typename: the column's Monary type name
+
+         :returns: one value per element of the list
+         :rtype: numpy.ma.masked_array
+        """
+        c_type, c_type_arg, numpy_type = get_monary_numpy_type(typename)
+        num_items = ctypes.c_uint64(0)
+        mask_p = ctypes.POINTER(ctypes.c_uint8)()
+        buf = cmonary.monary_column_items(coldata, colnum,
+                                          ctypes.byref(num_items),
+                                          ctypes.byref(mask_p))
+        data = numpy.empty([num_items.value], dtype=numpy_type)
+        mask = numpy.empty([num_items.value], dtype=bool)
+        if num_items.value > 0:
+            ctypes.memmove(data.ctypes.data, buf, data.nbytes)
+            ctypes.memmove(mask.ctypes.data, mask_p, num_items.value)
+        return numpy.ma.masked_array(data, mask)
+
+    def _finish_columns(self, fields, types, colarrays, num_rows, extras):
+        """Replaces the arrays loaded for each variable-length column with a
+        VarLenColumn, those loaded for each category column with a
+        CategoricalColumn, those loaded for each list column with a
+        ListColumn, and those of each item column with its items.
+        ``timestamp_parts`` columns are viewed as structured arrays.
 
-        return coldata, colarrays
+         :param fields: list of field names
+         :param types: list of Monary type names
+         :param colarrays: list of numpy.ma.masked_array, one per column
+         :param num_rows: the number of rows that were loaded; any rows
+                          after these are left empty
+         :param extras: the output of ``_snapshot_columns``
+
+         :returns: list of numpy.ma.masked_array, VarLenColumn,
+                   CategoricalColumn and ListColumn, one per column
+         :rtype: list
+        """
+        parents = get_list_parents(fields, types)
+        result = list(colarrays)
+        for i, typename in enumerate(types):
+            if parents[i] is None:
+                # Rows after those loaded were never written.
+                numpy.ma.getmaskarray(colarrays[i])[num_rows:] = True
+            if parents[i] is not None:
+                items, categories = extras[i]
+                if typename == "category":
+                    items = CategoricalColumn(items, categories)
+                elif typename == "timestamp_parts":
+                    items = split_timestamps(items)
+                result[i] = items
+            elif typename in VARLEN_KINDS:
+                ends = numpy.array(colarrays[i].data, dtype=numpy.int64)
+                ends[num_rows:] = len(extras[i])
+                result[i] = VarLenColumn.from_ends(
+                    ends, extras[i], numpy.ma.getmaskarray(colarrays[i]),
+                    VARLEN_KINDS[typename])
+            elif typename == "category":
+                codes = colarrays[i]
+                codes.data[num_rows:] = -1
+                result[i] = CategoricalColumn(codes, extras[i])
+            elif typename == "list":
+                ends = numpy.array(colarrays[i].data, dtype=numpy.int64)
+                ends[num_rows:] = ends[num_rows - 1] if num_rows else 0
+                result[i] = ListColumn.from_ends(
+                    ends, numpy.ma.getmaskarray(colarrays[i]))
+            elif typename == "timestamp_parts":
+                result[i] = split_timestamps(colarrays[i])
+        return result
+
+    def _load_growable(self, cursor, coldata, storage, records=None):
+        """Loads every result from a cursor into arrays that grow
+        geometrically as they fill up, then trims them to the number of rows
+        that were read. This avoids counting the results beforehand.
+
+         :param cursor: an open cmonary cursor
+         :param coldata: the cmonary column data used by the cursor
+         :param storage: list of (data, mask) pairs from
+                         ``_make_raw_column_data``, which will be resized
+         :param records: (optional) the structured arrays from
+                         ``_make_record_data``, which will be resized
+                         instead
+
+         :returns: list of numpy.ma.masked_array, one per column
+         :rtype: list
+        """
+        err = get_empty_bson_error()
+        count = count_rows([data for data, mask in storage])
+        num_rows = 0
+        while True:
+            num_loaded = cmonary.monary_load_query(cursor, num_rows,
+                                                   ctypes.byref(err))
+            if num_loaded < 0:
+                raise MonaryError(err.message)
+            num_rows += num_loaded
+            if num_rows < count or num_loaded == 0:
+                break
+            count *= GROWTH_FACTOR
+            self._resize_column_data(coldata, storage, count, records)
+
+        if records is not None:
+            resize_records(records, num_rows)
+            storage[:] = get_record_columns(*records)
+            return [make_masked_array(*column) for column in storage]
+        colarrays = []
+        for data, mask in storage:
+            # The arrays of item columns have no rows to trim.
+            if len(data):
+                data.resize((num_rows,) + data.shape[1:], refcheck=False)
+                if mask is not None:
+                    mask.resize((num_rows,) + mask.shape[1:], refcheck=False)
+            colarrays.append(make_masked_array(data, mask))
+        return colarrays
+
+    def _load_blocks(self, cursor, coldata, colarrays, fields, types):
+        """Repeatedly fills the column arrays from a cursor, yielding them
+        after each fill until the cursor is exhausted. The final block is
+        trimmed to the number of rows that were read.
+
+         :param cursor: an open cmonary cursor
+         :param coldata: the cmonary column data used by the cursor
+         :param colarrays: list of numpy.ma.masked_array used by the cursor's
+                           column data
+         :param fields: list of field names
+         :param types: list of Monary type names
+        """
+        block_size = count_rows(colarrays)
+        err = get_empty_bson_error()
+        decoded = {}
+        while True:
+            num_rows = cmonary.monary_load_query(cursor, 0, ctypes.byref(err))
+            if num_rows < 0:
+                raise MonaryError(err.message)
+            if num_rows == 0:
+                break
+            extras = self._snapshot_columns(cursor, coldata, fields, types,
+                                            decoded)
+            if num_rows == block_size:
+                yield self._finish_columns(fields, types, colarrays, num_rows,
+                                           extras)
+            else:
+                yield self._finish_columns(
+                    fields, types, [arr[:num_rows] for arr in colarrays],
+                    num_rows, extras)
+                break
+
+    def _load_record_blocks(self, cursor, records, mode, fill_value,
+                            types=None):
+        """Like ``_load_blocks``, but for a structured array from
+        ``_make_record_data``: yields it, or the rows of it that were read,
+        after each fill (see ``finish_records``).
+
+         :param cursor: an open cmonary cursor
+         :param records: the (data, mask) pair of the structured arrays
+         :param str mode: the query's ``mask`` mode
+         :param fill_value: the query's ``fill_value``
+         :param types: (optional) list of Monary type names
+        """
+        data, mask = records
+        block_size = len(data)
+        err = get_empty_bson_error()
+        while True:
+            num_rows = cmonary.monary_load_query(cursor, 0, ctypes.byref(err))
+            if num_rows < 0:
+                raise MonaryError(err.message)
+            if num_rows == 0:
+                break
+            if num_rows == block_size:
+                yield finish_records(data, mask, num_rows, mode, fill_value,
+                                     types)
+            else:
+                yield finish_records(
+                    data[:num_rows], None if mask is None else mask[:num_rows],
+                    num_rows, mode, fill_value, types)
+                break
+
+    def _prefetch_blocks(self, cursor, coldata, colarrays, fields, types,
+                         prefetch, masked=None):
+        """Like ``_load_blocks``, but a background thread reads up to
+        ``prefetch`` blocks ahead of the consumer, so that fetching and
+        decoding overlap with whatever the consumer does with each block.
 
-    def _get_collection(self, db, collection):
+         :param cursor: an open cmonary cursor
+         :param coldata: the cmonary column data used by the cursor
+         :param colarrays: list of numpy.ma.masked_array used by coldata
+         :param fields: list of field names
+         :param types: list of Monary type names
+         :param prefetch: the number of blocks to read ahead
+         :param masked: (optional) list of bools; whether each column needs
+                        a mask (see ``get_masked_columns``)
+        """
+        block_size = count_rows(colarrays)
+        buffers = [(coldata, colarrays)]
+        free = queue.Queue()
+        filled = queue.Queue()
+        done = threading.Event()
+
+        def fill():
+            err = get_empty_bson_error()
+            decoded = {}
+            try:
+                while True:
+                    # Blocks until the consumer has released a buffer.
+                    index = free.get()
+                    if done.is_set():
+                        return
+                    if cmonary.monary_set_query_column_data(
+                            cursor, buffers[index][0],
+                            ctypes.byref(err)) < 0:
+                        raise MonaryError(err.message)
+                    num_rows = cmonary.monary_load_query(cursor, 0,
+                                                         ctypes.byref(err))
+                    if num_rows < 0:
+                        raise MonaryError(err.message)
+                    # Copy out the categories now, while no other block is
+                    # being loaded into them.
+                    extras = self._snapshot_columns(cursor,
+                                                    buffers[index][0],
+                                                    fields, types, decoded)
+                    filled.put((index, num_rows, extras, None))
+                    if num_rows < block_size or num_rows == 0:
+                        return
+            except Exception as ex:
+                filled.put((None, 0, None, ex))
+
+        thread = None
+        try:
+            for i in range(prefetch):
+                buffers.append(self._make_column_data(fields, types,
+                                                      block_size,
+                                                      masked=masked))
+            for i in range(len(buffers)):
+                free.put(i)
+
+            thread = threading.Thread(target=fill)
+            thread.daemon = True
+            thread.start()
+
+            held = None
+            while True:
+                if held is not None:
+                    # The consumer has moved on, so its block can be reused.
+                    free.put(held)
+                    held = None
+                index, num_rows, extras, ex = filled.get()
+                if ex is not None:
+                    raise ex
+                colarrays = buffers[index][1]
+                if num_rows == block_size:
+                    held = index
+                    yield self._finish_columns(fields, types, colarrays,
+                                               num_rows, extras)
+                elif num_rows > 0:
+                    yield self._finish_columns(
+                        fields, types, [arr[:num_rows] for arr in colarrays],
+                        num_rows, extras)
+                    break
+                else:
+                    break
+        finally:
+            if thread is not None:
+                done.set()
+                free.put(None)
+                thread.join()
+            for extra_coldata, extra_arrays in buffers[1:]:
+                cmonary.monary_free_column_data(extra_coldata)
+
+    def _get_collection(self, db, collection, dedicated=False):
         """Returns the specified collection to query against.
 
+            Handles are kept open for reuse, up to ``MAX_CACHED_COLLECTIONS``
+            of them; the least recently used is closed to make room for a
+            new one. They belong to the connection, and must not be
+            destroyed by the caller.
+
+            When connected with ``pooled=True``, or with ``dedicated``, each
+            call instead opens the collection on a client of its own from
+            ``_acquire_client``; the caller must pass the handle to
+            ``_release_collection`` once done with it.
+
             :param db: name of database
             :param collection: name of collection
+            :param bool dedicated: (optional) open the collection on a
+                                   client that no other operation uses,
+                                   such as one a background thread reads
+                                   from
 
             :returns: the collection
             :rtype: cmonary mongoc_collection_t*
         """
-        if self._connection is not None:
-            return cmonary.monary_use_collection(self._connection,
-                                                 db.encode('ascii'),
-                                                 collection.encode('ascii'))
-        else:
+        if self._pool is not None or dedicated:
+            client = self._acquire_client()
+            handle = cmonary.monary_use_collection(client,
+                                                   db.encode('ascii'),
+                                                   collection.encode('ascii'))
+            if handle is None:
+                self._release_client(client)
+                return None
+            with self._pool_lock:
+                self._pooled_clients[handle] = client
+            return handle
+        if self._connection is None:
             raise MonaryError("Unable to get the collection %s.%s - "
                               "not connected" % (db, collection))
+        key = (db, collection)
+        handle = self._collections.pop(key, None)
+        if handle is None:
+            handle = cmonary.monary_use_collection(self._connection,
+                                                   db.encode('ascii'),
+                                                   collection.encode('ascii'))
+            if handle is None:
+                return None
+            while len(self._collections) >= max(MAX_CACHED_COLLECTIONS, 1):
+                old_key, old_handle = self._collections.popitem(last=False)
+                cmonary.monary_destroy_collection(old_handle)
+        # The most recently used handle goes last.
+        self._collections[key] = handle
+        return handle
+
+    def _release_collection(self, collection):
+        """Closes a collection from ``_get_collection`` and returns its client
+        to its pool, if it was opened on a client of its own; cached handles
+        are left open.
+
+            :param collection: the collection
+        """
+        with self._pool_lock:
+            client = self._pooled_clients.pop(collection, None)
+        if client is None:
+            return
+        cmonary.monary_destroy_collection(collection)
+        self._release_client(client)
+
+    def _get_client(self, collection):
+        """Returns the client a collection from ``_get_collection`` was
+        opened on.
+
+            :param collection: the collection
+            :rtype: cmonary mongoc_client_t*
+        """
+        with self._pool_lock:
+            return self._pooled_clients.get(collection, self._connection)
+
+    def _clear_collections(self):
+        """Closes every collection handle kept by ``_get_collection``."""
+        while self._collections:
+            key, handle = self._collections.popitem()
+            cmonary.monary_destroy_collection(handle)
 
     def count(self, db, coll, query=None):
         """Count the number of records returned by the given query.
@@ -527,20 +2099,18 @@ class Monary(object):
            :returns: the number of records
            :rtype: int
         """
-        collection = None
         err = get_empty_bson_error()
+        collection = self._get_collection(db, coll)
+        if collection is None:
+            raise MonaryError("Unable to get the collection %s.%s" %
+                              (db, coll))
         try:
-            collection = self._get_collection(db, coll)
-            if collection is None:
-                raise MonaryError("Unable to get the collection %s.%s" %
-                                  (db, coll))
             query = make_bson(query)
             count = cmonary.monary_query_count(collection,
                                                query,
                                                ctypes.byref(err))
         finally:
-            if collection is not None:
-                cmonary.monary_destroy_collection(collection)
+            self._release_collection(collection)
         if count < 0:
             raise MonaryError(err.message)
         return count
@@ -548,7 +2118,9 @@ class Monary(object):
     def query(self, db, coll, query, fields, types,
               sort=None, hint=None,
               limit=0, offset=0,
-              do_count=True, select_fields=False):
+              do_count=True, select_fields=None,
+              parallel=1, partition_key="_id", cursor_options=None,
+              out=None, mask="bytes", fill_value=None, structured=False):
         """Performs an array query.
 
            :param db: name of database
@@ -565,19 +2137,141 @@ class Monary(object):
            :param offset: (optional) skip this many records before gathering
                           results
            :param bool do_count: count items before allocating arrays
-                                 (otherwise, array size is set to limit)
-           :param bool select_fields: select exact fields from database
-                                      (performance/bandwidth tradeoff)
+                                 (otherwise, array size is set to limit, or
+                                 grown while the results are read if there
+                                 is no limit)
+           :param bool select_fields: (optional) ask the server for only the
+                                      fields the columns read; by default,
+                                      whenever the fields allow it (see
+                                      ``get_select_fields``)
+           :param int parallel: (optional) split the query into this many
+                                ranges of ``partition_key`` and read them
+                                concurrently, each over its own client
+                                from a pool kept until ``close``; ranges
+                                that gained results since they were
+                                counted, or all of them without
+                                ``do_count``, grow their arrays
+           :param str partition_key: (optional) the field whose values are
+                                     split between parallel readers
+           :param cursor_options: (optional) a CursorOptions controlling the
+                                  batch size and streaming of the results
+           :param out: (optional) list of preallocated arrays to load the
+                       results into, one per field (None to allocate that
+                       column); see below
+           :param str mask: (optional) how missing values are reported:
+                            ``"bytes"`` (masked arrays), ``"bits"``
+                            (BitmaskColumns), ``"fill"`` or ``"none"``
+                            (plain arrays); see below
+           :param fill_value: (optional) with ``mask="fill"``, the value
+                              written over missing values, or a dict of
+                              them by field
+           :param bool structured: (optional) load the results into the
+                                   records of one structured array instead
+                                   of one array per field; see below
 
            :returns: list of numpy.ndarray, corresponding to the requested
-                     fields and types
+                     fields and types, or one structured numpy.ndarray
+                     with ``structured``
            :rtype: list
+
+           By default each column is a masked array with a byte of mask
+           per value. ``mask="bits"`` packs the mask of each into a
+           BitmaskColumn, a validity bitmap an eighth of the size.
+           ``mask="fill"`` writes a fill value over missing values and
+           returns plain arrays: NaN for floats, NaT for datetime64 and
+           timedelta64, ``DATE_FILL_VALUE`` (the int64 NaT is stored as)
+           for dates, and numpy's default fill values otherwise, unless
+           ``fill_value`` is given. Bool columns need a ``fill_value``.
+           ``mask="none"`` returns plain arrays and never records missing
+           values at all, leaving them (and any rows beyond the results)
+           unspecified; use it only when every document has every field.
+           Variable-length, category and list columns keep their own masks
+           in every mode.
+
+           With ``out``, each column is loaded into the first rows of its
+           array, which must have the dtype of its type and be contiguous,
+           and the returned arrays are views of them. Passing masked arrays
+           with full masks fills their masks as well. The arrays are never
+           grown: if the results are counted (or a limit is given) they
+           must hold that many rows, and otherwise a ValueError is raised
+           if there are more results than the arrays hold. Reusing the same
+           arrays across queries avoids allocating and page-faulting new
+           memory each time.
+
+           With ``structured=True``, the results are loaded straight into
+           a single structured array (a masked array, unless ``mask`` is
+           ``"fill"`` or ``"none"``) with a field named after each
+           requested field, so each document's values are contiguous. The
+           fields must be distinct and hold one fixed-size value per
+           document: lists, categories and variable-length types are not
+           supported, nor are ``mask="bits"``, ``out`` and ``parallel``.
+           ``timestamp_parts`` fields are nested ``time`` and ``inc``
+           records, and vectors are subarrays.
+
+           A parallel query first asks the server (with ``$bucketAuto``,
+           which requires MongoDB 3.4) for ``parallel`` ranges of
+           ``partition_key`` holding roughly equal numbers of results. One
+           set of arrays is then allocated, and one thread per range loads
+           its results into its own slice of those arrays. The values of
+           ``partition_key`` should all be of the same BSON type. A range
+           that gained results since it was counted, and every range
+           without ``do_count``, reads the rest into arrays of its own,
+           which are joined onto the result. Sorting, limits and offsets
+           are not supported by parallel queries.
+
+           If the connection has a ``result_cache``, a query made before
+           with the same arguments returns the result kept there, without
+           contacting the server; otherwise the result is kept for next
+           time, unless ``out`` is given. Cached arrays are read-only, as
+           they are shared by every caller. ``insert`` drops the results
+           kept for its collection; changes made any other way are only
+           seen once a result expires or is invalidated.
         """
 
+        if cursor_options is None:
+            cursor_options = CursorOptions()
+        if cursor_options.exhaust and limit:
+            raise ValueError("Exhaust cursors are not supported with a limit")
+
+        masked = get_masked_columns(fields, types, mask)
+        validate_fill_value(fields, types, mask, fill_value)
+        if structured:
+            validate_record_options(mask, out)
+        select_fields = get_select_fields(fields, types, select_fields)
+        if parallel > 1:
+            if out is not None:
+                raise ValueError("out is not supported by parallel queries")
+            if structured:
+                raise ValueError("structured is not supported by parallel "
+                                 "queries")
+            if sort or limit or offset:
+                raise ValueError("sort, limit and offset are not supported "
+                                 "by parallel queries")
+
+        result_key = None
+        if self.result_cache is not None and out is None:
+            result_key = get_result_key(
+                "query", get_full_query(query, sort, hint), fields, types,
+                limit, offset, mask, fill_value, structured)
+            result = self.result_cache.get(db, coll, result_key)
+            if result is not None:
+                return result
+
+        if parallel > 1:
+            return self._cache_result(db, coll, result_key, apply_mask_mode(
+                fields,
+                self._parallel_query(db, coll, query, fields, types, hint,
+                                     parallel, partition_key, select_fields,
+                                     cursor_options, masked, do_count),
+                mask, fill_value, types))
+
         plain_query = get_plain_query(query)
         full_query = get_full_query(query, sort, hint)
 
-        if not do_count and limit > 0:
+        growable = not do_count and limit == 0
+        if growable:
+            count = INITIAL_GROWABLE_ROWS
+        elif not do_count:
             count = limit
         else:
             # count() doesn't like $query/$orderby/$hint, so need plain query.
@@ -585,12 +2279,22 @@ class Monary(object):
 
         if count > limit > 0:
             count = limit
+        # Arrays that cannot grow must turn out to have held every result.
+        check_out = out is not None and growable
+        if out is not None:
+            count, growable = self._fit_out(out, count, growable)
 
         coldata = None
         collection = None
         err = get_empty_bson_error()
         try:
-            coldata, colarrays = self._make_column_data(fields, types, count)
+            records = None
+            if structured:
+                coldata, storage, records = self._make_record_data(
+                    fields, types, count, masked)
+            else:
+                coldata, storage = self._make_raw_column_data(
+                    fields, types, count, out, masked)
             cursor = None
             try:
                 collection = self._get_collection(db, coll)
@@ -603,25 +2307,244 @@ class Monary(object):
                     full_query,
                     coldata,
                     select_fields,
+                    cursor_options.get_batch_size(),
+                    cursor_options.get_query_flags(),
                     ctypes.byref(err))
                 if cursor is None:
                     raise MonaryError(err.message)
-                if cmonary.monary_load_query(cursor, ctypes.byref(err)) < 0:
-                    raise MonaryError(err.message)
+                if growable:
+                    colarrays = self._load_growable(cursor, coldata, storage,
+                                                    records)
+                    num_rows = count_rows(colarrays)
+                else:
+                    num_rows = cmonary.monary_load_query(cursor, 0,
+                                                         ctypes.byref(err))
+                    if num_rows < 0:
+                        raise MonaryError(err.message)
+                    colarrays = [make_masked_array(*column)
+                                 for column in storage]
+                if records is not None:
+                    result = finish_records(records[0], records[1], num_rows,
+                                            mask, fill_value, types)
+                else:
+                    result = apply_mask_mode(
+                        fields,
+                        self._finish_columns(
+                            fields, types, colarrays, num_rows,
+                            self._snapshot_columns(cursor, coldata, fields,
+                                                   types)),
+                        mask, fill_value, types)
+                if check_out and num_rows == count:
+                    self._check_out_exhausted(cursor, fields, types, masked,
+                                              count)
             finally:
                 if cursor is not None:
                     cmonary.monary_close_query(cursor)
                 if collection is not None:
-                    cmonary.monary_destroy_collection(collection)
+                    self._release_collection(collection)
         finally:
             if coldata is not None:
                 cmonary.monary_free_column_data(coldata)
+        return self._cache_result(db, coll, result_key, result)
+
+    def _partition(self, db, coll, query, partition_key, parallel):
+        """Splits the values of a field among the results of a query into
+        ranges holding roughly equal numbers of results.
+
+           :param db: name of database
+           :param coll: name of the collection to be queried
+           :param query: dictionary of Mongo query parameters
+           :param partition_key: the field to split
+           :param parallel: the maximum number of ranges
+
+           :returns: list of (lower, upper, count) tuples, in order; the
+                     first lower bound and last upper bound are None
+           :rtype: list
+        """
+        pipeline = [{"$bucketAuto": {"groupBy": "$" + partition_key,
+                                     "buckets": parallel}}]
+        query = get_partition_query(query, partition_key)
+        if query:
+            pipeline.insert(0, {"$match": query})
+
+        # The bounds must reflect the collection as it is now, so they are
+        # never taken from the result cache.
+        bounds, counts = self._aggregate(
+            db, coll, pipeline, ["_id", "count"],
+            ["bson:%d" % MAX_PARTITION_BOUNDS_SIZE, "int64"], do_count=False)
+        if bounds.mask.any() or counts.mask.any():
+            raise MonaryError("Unable to partition %s.%s on %r" %
+                              (db, coll, partition_key))
+
+        partitions = []
+        for i, (raw, count) in enumerate(zip(bounds.data, counts.data)):
+            raw = raw.tobytes()
+            size, = struct.unpack("<i", raw[:4])
+            if size > len(raw):
+                raise MonaryError("Partition bounds of %r are too large" %
+                                  partition_key)
+            bound = bson.BSON(raw[:size]).decode()
+            lower = bound["min"] if i > 0 else None
+            upper = bound["max"] if i < len(bounds) - 1 else None
+            partitions.append((lower, upper, int(count)))
+        return partitions
+
+    def _parallel_query(self, db, coll, query, fields, types, hint,
+                        parallel, partition_key, select_fields,
+                        cursor_options, masked, do_count):
+        """Performs an array query by reading ranges of a partition key
+        concurrently into slices of the same arrays. See ``query``;
+        ``masked`` is from ``get_masked_columns``.
+
+        With ``do_count``, each range is read into a slice sized by the
+        number of its results counted when the ranges were chosen. A range
+        with more results by the time it is read, as well as every range
+        without ``do_count``, reads the rest into arrays of its own that
+        grow as they fill up, and the pieces are joined at the end.
+        """
+        validate_column_spec(fields, types)
+        partitions = self._partition(db, coll, query, partition_key,
+                                     parallel)
+        if not partitions:
+            # No results; one reader still builds the empty columns.
+            partitions = [(None, None, 0)]
+        if not do_count:
+            partitions = [(lower, upper, 0)
+                          for lower, upper, count in partitions]
+
+        total = sum(count for lower, upper, count in partitions)
+        parents = get_list_parents(fields, types)
+        storage = []
+        for i, typename in enumerate(types):
+            c_type, c_type_arg, numpy_type = get_monary_numpy_type(typename)
+            storage.append(make_column_storage(
+                numpy_type, total if parents[i] is None else 0, masked[i]))
+
+        loaded = [0] * len(partitions)
+        pieces = [None] * len(partitions)
+        overflows = [None] * len(partitions)
+        errors = []
+
+        def load_partition(index, offset, count, part_query):
+            client = None
+            collection = None
+            coldata = None
+            extra_coldata = None
+            cursor = None
+            err = get_empty_bson_error()
+            decoded = {}
+            try:
+                # mongoc clients are not thread-safe, so each reader checks
+                # one out of a pool.
+                client = self._acquire_client()
+                collection = cmonary.monary_use_collection(
+                    client, db.encode('ascii'), coll.encode('ascii'))
+                if collection is None:
+                    raise MonaryError("Unable to get the collection")
+                coldata = self._bind_column_data(fields, types, storage,
+                                                 offset, count)
+                cursor = cmonary.monary_init_query(
+                    collection,
+                    0,
+                    0,
+                    get_full_query(part_query, None, hint),
+                    coldata,
+                    select_fields,
+                    cursor_options.get_batch_size(),
+                    cursor_options.get_query_flags(),
+                    ctypes.byref(err))
+                if cursor is None:
+                    raise MonaryError(err.message)
+                num_rows = cmonary.monary_load_query(cursor, 0,
+                                                     ctypes.byref(err))
+                if num_rows < 0:
+                    raise MonaryError(err.message)
+                loaded[index] = num_rows
+                # Variable-length data, categories and list items live in
+                # this reader's column data and cursor, so copy them out
+                # before those are freed or loaded again.
+                pieces[index] = self._finish_columns(
+                    fields, types,
+                    [make_masked_array(data, mask, offset, num_rows)
+                     for data, mask in storage],
+                    num_rows,
+                    self._snapshot_columns(cursor, coldata, fields, types,
+                                           decoded))
+                if num_rows < count:
+                    return
+
+                # The slice is full, but the range may hold more results.
+                extra_coldata, extra_storage = self._make_raw_column_data(
+                    fields, types, INITIAL_GROWABLE_ROWS, masked=masked)
+                if cmonary.monary_set_query_column_data(
+                        cursor, extra_coldata, ctypes.byref(err)) < 0:
+                    raise MonaryError(err.message)
+                extra = self._load_growable(cursor, extra_coldata,
+                                            extra_storage)
+                num_extra = count_rows(extra)
+                if num_extra:
+                    overflows[index] = self._finish_columns(
+                        fields, types, extra, num_extra,
+                        self._snapshot_columns(cursor, extra_coldata,
+                                               fields, types, decoded))
+            except Exception as ex:
+                errors.append(ex)
+            finally:
+                if cursor is not None:
+                    cmonary.monary_close_query(cursor)
+                if collection is not None:
+                    cmonary.monary_destroy_collection(collection)
+                if coldata is not None:
+                    cmonary.monary_free_column_data(coldata)
+                if extra_coldata is not None:
+                    cmonary.monary_free_column_data(extra_coldata)
+                if client is not None:
+                    self._release_client(client)
+
+        threads = []
+        offset = 0
+        for i, (lower, upper, count) in enumerate(partitions):
+            part_query = get_partition_query(query, partition_key,
+                                             lower, upper)
+            threads.append(threading.Thread(
+                target=load_partition, args=(i, offset, count, part_query)))
+            offset += count
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        parents = get_list_parents(fields, types)
+        if sum(loaded) < total or any(overflows):
+            # Some ranges changed size since they were counted, so join
+            # the rows each one read.
+            segments = []
+            for piece, overflow in zip(pieces, overflows):
+                segments.append(piece)
+                if overflow is not None:
+                    segments.append(overflow)
+            return [concatenate_columns(typename,
+                                        [segment[i] for segment in segments])
+                    for i, typename in enumerate(types)]
+
+        colarrays = [make_masked_array(*column) for column in storage]
+        for i, typename in enumerate(types):
+            if typename in VARLEN_KINDS or typename in ("category", "list") \
+                    or parents[i] is not None:
+                colarrays[i] = concatenate_columns(
+                    typename, [piece[i] for piece in pieces])
+            elif typename == "timestamp_parts":
+                colarrays[i] = split_timestamps(colarrays[i])
         return colarrays
 
     def block_query(self, db, coll, query, fields, types,
                     sort=None, hint=None,
                     block_size=8192, limit=0, offset=0,
-                    select_fields=False):
+                    select_fields=None, prefetch=0, cursor_options=None,
+                    out=None, mask="bytes", fill_value=None,
+                    structured=False):
         """Performs a block query.
 
            :param db: name of database
@@ -639,8 +2562,30 @@ class Monary(object):
                          arrays)
            :param offset: (optional) skip this many records before gathering
                           results
-           :param bool select_fields: select exact fields from database
-                                      (performance/bandwidth tradeoff)
+           :param bool select_fields: (optional) ask the server for only the
+                                      fields the columns read, as for
+                                      ``query``
+           :param int prefetch: (optional) read up to this many blocks
+                                ahead in a background thread, while the
+                                caller works on the current block. The
+                                thread reads over a client of its own,
+                                checked out of the pool that parallel
+                                queries use (see ``query``), so the
+                                connection stays free for other calls
+           :param cursor_options: (optional) a CursorOptions controlling the
+                                  batch size and streaming of the results;
+                                  the batch size defaults to ``block_size``
+           :param out: (optional) list of preallocated arrays of at least
+                       ``block_size`` rows, one per field, to load every
+                       block into (see ``query``); not supported with
+                       ``prefetch``
+           :param str mask: (optional) how missing values are reported, as
+                            for ``query``
+           :param fill_value: (optional) with ``mask="fill"``, the value
+                              written over missing values, as for ``query``
+           :param bool structured: (optional) load each block into one
+                                   structured array, as for ``query``; not
+                                   supported with ``prefetch``
 
            :returns: list of numpy.ndarray, corresponding to the requested
                      fields and types
@@ -665,23 +2610,49 @@ class Monary(object):
 
            .. note:: Memory for each block is reused between iterations.
                      If the caller wishes to retain the values from a given
-                     iteration, it should copy the data.
+                     iteration, it should copy the data. This is also true
+                     with ``prefetch``, which allocates ``prefetch + 1``
+                     sets of arrays and cycles through them.
         """
 
         if block_size < 1:
             block_size = 1
+        if out is not None and prefetch > 0:
+            raise ValueError("out cannot be combined with prefetch, which "
+                             "needs several sets of arrays")
+        masked = get_masked_columns(fields, types, mask)
+        validate_fill_value(fields, types, mask, fill_value)
+        if structured:
+            validate_record_options(mask, out, prefetch)
+        select_fields = get_select_fields(fields, types, select_fields)
+
+        if cursor_options is None:
+            cursor_options = CursorOptions()
+        if cursor_options.exhaust and limit:
+            raise ValueError("Exhaust cursors are not supported with a limit")
 
         full_query = get_full_query(query, sort, hint)
 
         coldata = None
         collection = None
         try:
-            coldata, colarrays = self._make_column_data(fields,
-                                                        types,
-                                                        block_size)
+            records = None
+            if structured:
+                coldata, storage, records = self._make_record_data(
+                    fields, types, block_size, masked)
+            else:
+                coldata, colarrays = self._make_column_data(fields,
+                                                            types,
+                                                            block_size,
+                                                            out,
+                                                            masked)
             cursor = None
+            blocks = None
             try:
-                collection = self._get_collection(db, coll)
+                # A prefetching thread must not share the connection's
+                # client with the caller.
+                collection = self._get_collection(db, coll,
+                                                  dedicated=prefetch > 0)
                 if collection is None:
                     raise MonaryError("Unable to get the collection")
                 err = get_empty_bson_error()
@@ -692,26 +2663,34 @@ class Monary(object):
                     full_query,
                     coldata,
                     select_fields,
+                    cursor_options.get_batch_size(block_size),
+                    cursor_options.get_query_flags(),
                     ctypes.byref(err))
                 if cursor is None:
                     raise MonaryError(err.message)
-                while True:
-                    num_rows = cmonary.monary_load_query(cursor,
-                                                         ctypes.byref(err))
-                    if num_rows < 0:
-                        raise MonaryError(err.message)
-                    if num_rows == block_size:
-                        yield colarrays
-                    elif num_rows > 0:
-                        yield [arr[:num_rows] for arr in colarrays]
-                        break
-                    else:
-                        break
+                if records is not None:
+                    blocks = self._load_record_blocks(cursor, records, mask,
+                                                      fill_value, types)
+                elif prefetch > 0:
+                    blocks = self._prefetch_blocks(cursor, coldata,
+                                                   colarrays, fields, types,
+                                                   prefetch, masked)
+                else:
+                    blocks = self._load_blocks(cursor, coldata, colarrays,
+                                               fields, types)
+                for block in blocks:
+                    if records is None:
+                        block = apply_mask_mode(fields, block, mask,
+                                                fill_value, types)
+                    yield block
             finally:
+                # Stop any prefetching before the cursor goes away.
+                if blocks is not None:
+                    blocks.close()
                 if cursor is not None:
                     cmonary.monary_close_query(cursor)
                 if collection is not None:
-                    cmonary.monary_destroy_collection(collection)
+                    self._release_collection(collection)
         finally:
             if coldata is not None:
                 cmonary.monary_free_column_data(coldata)
@@ -757,12 +2736,20 @@ class Monary(object):
         collection = None
         coldata = None
         id_data = None
+        # One mask entry per document; a vector is skipped if any of its
+        # elements is masked.
+        row_masks = []
+        for param in params:
+            mask = numpy.ma.getmaskarray(param.array)
+            if mask.ndim > 1:
+                mask = mask.any(axis=tuple(range(1, mask.ndim)))
+            row_masks.append(numpy.ascontiguousarray(mask))
         try:
             coldata = cmonary.monary_alloc_column_data(len(params),
                                                        len(params[0]))
             for i, param in enumerate(params):
                 data_p = param.array.data.ctypes.data_as(ctypes.c_void_p)
-                mask_p = param.array.mask.ctypes.data_as(ctypes.c_void_p)
+                mask_p = row_masks[i].ctypes.data_as(ctypes.c_void_p)
 
                 if cmonary.monary_set_column_item(
                         coldata,
@@ -774,6 +2761,8 @@ class Monary(object):
                         mask_p,
                         ctypes.byref(err)) < 0:
                     raise MonaryError(err.message)
+                if param.cmonary_type == BINARY_VECTOR_TYPE:
+                    self._set_vector_type(coldata, i, param.mtype)
 
             # Create a new column for the ids to be returned.
             id_data = cmonary.monary_alloc_column_data(1, len(params[0]))
@@ -812,9 +2801,11 @@ class Monary(object):
                 collection,
                 coldata,
                 id_data,
-                self._connection,
+                self._get_client(collection),
                 write_concern.get_c_write_concern(),
                 ctypes.byref(err))
+            if self.result_cache is not None:
+                self.result_cache.invalidate(db, coll)
 
             return ids
         finally:
@@ -825,10 +2816,11 @@ class Monary(object):
             if id_data is not None:
                 cmonary.monary_free_column_data(id_data)
             if collection is not None:
-                cmonary.monary_destroy_collection(collection)
+                self._release_collection(collection)
 
     def aggregate(self, db, coll, pipeline, fields, types, limit=0,
-                  do_count=True):
+                  do_count=True, cursor_options=None, out=None,
+                  mask="bytes", fill_value=None, structured=False):
         """Performs an aggregation operation.
 
            :param: db: name of database
@@ -836,16 +2828,75 @@ class Monary(object):
            :param pipeline: a list of pipeline stages
            :param fields: list of fields to be extracted from the result
            :param types: corresponding list of field types
+           :param limit: (optional) limit number of records (and size
+                         of arrays)
+           :param bool do_count: run the pipeline once beforehand to count
+                                 the results before allocating arrays
+                                 (otherwise, array size is set to limit, or
+                                 grown while the results are read if there
+                                 is no limit)
+           :param cursor_options: (optional) a CursorOptions controlling the
+                                  batch size and ``allowDiskUse``
+           :param out: (optional) list of preallocated arrays to load the
+                       results into, one per field, as for ``query``
+           :param str mask: (optional) how missing values are reported, as
+                            for ``query``
+           :param fill_value: (optional) with ``mask="fill"``, the value
+                              written over missing values, as for ``query``
+           :param bool structured: (optional) load the results into one
+                                   structured array, as for ``query``
 
            :returns: list of numpy.ndarray, corresponding to the requested
-                     fields and types
+                     fields and types, or one structured numpy.ndarray
+                     with ``structured``
            :rtype: list
+
+           Results are kept in the connection's ``result_cache``, if any, as
+           for ``query``, except for pipelines ending in ``$out`` or
+           ``$merge``.
         """
+        get_masked_columns(fields, types, mask)
+        validate_fill_value(fields, types, mask, fill_value)
+        if structured:
+            validate_record_options(mask, out)
+
         # Convert the pipeline to a usable form.
         pipeline = get_pipeline(pipeline)
 
+        result_key = None
+        if self.result_cache is not None and out is None and \
+                not pipeline_writes(pipeline):
+            result_key = get_result_key(
+                "aggregate", make_bson(pipeline), fields, types, limit, mask,
+                fill_value, structured)
+            result = self.result_cache.get(db, coll, result_key)
+            if result is not None:
+                return result
+
+        return self._cache_result(db, coll, result_key, self._aggregate(
+            db, coll, pipeline, fields, types, limit, do_count,
+            cursor_options, out, mask, fill_value, structured))
+
+    def _aggregate(self, db, coll, pipeline, fields, types, limit=0,
+                   do_count=True, cursor_options=None, out=None,
+                   mask="bytes", fill_value=None, structured=False):
+        """Performs an aggregation operation like ``aggregate``, but never
+        uses the result cache. The aggregations Monary runs for itself, such
+        as counts and partition bounds, use this directly, so that they
+        always reflect the collection as it is. The arguments and result
+        are those of ``aggregate``.
+        """
+        masked = get_masked_columns(fields, types, mask)
+        if cursor_options is None:
+            cursor_options = CursorOptions()
+        encoded_options = cursor_options.get_aggregate_options()
+        pipeline = get_pipeline(pipeline)
+
         # Determine sizing for array allocation.
-        if not do_count and limit > 0:
+        growable = not do_count and limit == 0
+        if growable:
+            count = INITIAL_GROWABLE_ROWS
+        elif not do_count:
             # Limit ourselves to only the first ``count`` records.
             count = limit
         else:
@@ -855,8 +2906,9 @@ class Monary(object):
             pipe_copy["pipeline"].append(count_stage)
 
             # Extract the count.
-            result, = self.aggregate(db, coll, pipe_copy, ["count"], ["int64"],
-                                     limit=1, do_count=False)
+            result, = self._aggregate(db, coll, pipe_copy, ["count"],
+                                      ["int64"], limit=1, do_count=False,
+                                      cursor_options=cursor_options)
             result = result.compressed()
             if len(result) == 0:
                 # The count returned was masked.
@@ -866,12 +2918,22 @@ class Monary(object):
 
         if count > limit > 0:
             count = limit
+        # Arrays that cannot grow must turn out to have held every result.
+        check_out = out is not None and growable
+        if out is not None:
+            count, growable = self._fit_out(out, count, growable)
 
         encoded_pipeline = get_plain_query(pipeline)
         coldata = None
         collection = None
         try:
-            coldata, colarrays = self._make_column_data(fields, types, count)
+            records = None
+            if structured:
+                coldata, storage, records = self._make_record_data(
+                    fields, types, count, masked)
+            else:
+                coldata, storage = self._make_raw_column_data(
+                    fields, types, count, out, masked)
             cursor = None
             try:
                 collection = self._get_collection(db, coll)
@@ -880,82 +2942,362 @@ class Monary(object):
                 err = get_empty_bson_error()
                 cursor = cmonary.monary_init_aggregate(collection,
                                                        encoded_pipeline,
+                                                       encoded_options,
                                                        coldata,
                                                        ctypes.byref(err))
                 if cursor is None:
                     raise MonaryError(err.message)
 
-                if cmonary.monary_load_query(cursor, ctypes.byref(err)) < 0:
-                    raise MonaryError(err.message)
+                if growable:
+                    colarrays = self._load_growable(cursor, coldata, storage,
+                                                    records)
+                    num_rows = count_rows(colarrays)
+                else:
+                    num_rows = cmonary.monary_load_query(cursor, 0,
+                                                         ctypes.byref(err))
+                    if num_rows < 0:
+                        raise MonaryError(err.message)
+                    colarrays = [make_masked_array(*column)
+                                 for column in storage]
+                if records is not None:
+                    result = finish_records(records[0], records[1], num_rows,
+                                            mask, fill_value, types)
+                else:
+                    result = apply_mask_mode(
+                        fields,
+                        self._finish_columns(
+                            fields, types, colarrays, num_rows,
+                            self._snapshot_columns(cursor, coldata, fields,
+                                                   types)),
+                        mask, fill_value, types)
+                if check_out and num_rows == count:
+                    self._check_out_exhausted(cursor, fields, types, masked,
+                                              count)
             finally:
                 if cursor is not None:
                     cmonary.monary_close_query(cursor)
                 if collection is not None:
-                    cmonary.monary_destroy_collection(collection)
+                    self._release_collection(collection)
         finally:
             if coldata is not None:
                 cmonary.monary_free_column_data(coldata)
-        return colarrays
+        return result
 
     def block_aggregate(self, db, coll, pipeline, fields, types,
-                        block_size=8192, limit=0):
+                        block_size=8192, limit=0, prefetch=0,
+                        cursor_options=None, out=None, mask="bytes",
+                        fill_value=None, structured=False):
         """Performs an aggregation operation.
 
            Perform an aggregation operation on a collection, returning the
-           results in blocks of size ``block_size``.
+           results in blocks of size ``block_size``. The pipeline is run
+           only once; the results are never counted beforehand.
+
+           :param: db: name of database
+           :param coll: name of collection on which to perform the aggregation
+           :param pipeline: a list of pipeline stages
+           :param fields: list of fields to be extracted from the result
+           :param types: corresponding list of field types
+           :param block_size: (optional) size in number of rows of each
+                              yielded list
+           :param limit: (optional) limit the total number of records
+           :param int prefetch: (optional) read up to this many blocks
+                                ahead in a background thread, as in
+                                ``block_query``
+           :param cursor_options: (optional) a CursorOptions controlling the
+                                  batch size and ``allowDiskUse``; the batch
+                                  size defaults to ``block_size``
+           :param out: (optional) list of preallocated arrays to load every
+                       block into, as for ``block_query``
+           :param str mask: (optional) how missing values are reported, as
+                            for ``query``
+           :param fill_value: (optional) with ``mask="fill"``, the value
+                              written over missing values, as for ``query``
+           :param bool structured: (optional) load each block into one
+                                   structured array, as for ``query``; not
+                                   supported with ``prefetch``
+
+           :returns: list of numpy.ndarray, corresponding to the requested
+                     fields and types
+           :rtype: list
         """
         if block_size < 1:
             block_size = 1
+        if out is not None and prefetch > 0:
+            raise ValueError("out cannot be combined with prefetch, which "
+                             "needs several sets of arrays")
+        masked = get_masked_columns(fields, types, mask)
+        validate_fill_value(fields, types, mask, fill_value)
+        if structured:
+            validate_record_options(mask, out, prefetch)
+
+        if cursor_options is None:
+            cursor_options = CursorOptions()
+        encoded_options = cursor_options.get_aggregate_options(block_size)
 
         pipeline = get_pipeline(pipeline)
+        if limit > 0:
+            pipeline = add_pipeline_limit(pipeline, limit)
         encoded_pipeline = get_plain_query(pipeline)
 
         coldata = None
         collection = None
         try:
-            coldata, colarrays = self._make_column_data(fields,
-                                                        types,
-                                                        block_size)
+            records = None
+            if structured:
+                coldata, storage, records = self._make_record_data(
+                    fields, types, block_size, masked)
+            else:
+                coldata, colarrays = self._make_column_data(fields,
+                                                            types,
+                                                            block_size,
+                                                            out,
+                                                            masked)
             cursor = None
+            blocks = None
             try:
-                collection = self._get_collection(db, coll)
+                # A prefetching thread must not share the connection's
+                # client with the caller.
+                collection = self._get_collection(db, coll,
+                                                  dedicated=prefetch > 0)
                 if collection is None:
                     raise MonaryError("Unable to get the collection")
                 err = get_empty_bson_error()
                 cursor = cmonary.monary_init_aggregate(collection,
                                                        encoded_pipeline,
+                                                       encoded_options,
                                                        coldata,
                                                        ctypes.byref(err))
                 if cursor is None:
                     raise MonaryError(err.message)
-
-                err = get_empty_bson_error()
-                while True:
-                    num_rows = cmonary.monary_load_query(cursor,
-                                                         ctypes.byref(err))
-                    if num_rows < 0:
-                        raise MonaryError(err.message)
-                    if num_rows == block_size:
-                        yield colarrays
-                    elif num_rows > 0:
-                        yield [arr[:num_rows] for arr in colarrays]
-                        break
-                    else:
-                        break
+                if records is not None:
+                    blocks = self._load_record_blocks(cursor, records, mask,
+                                                      fill_value, types)
+                elif prefetch > 0:
+                    blocks = self._prefetch_blocks(cursor, coldata,
+                                                   colarrays, fields, types,
+                                                   prefetch, masked)
+                else:
+                    blocks = self._load_blocks(cursor, coldata, colarrays,
+                                               fields, types)
+                for block in blocks:
+                    if records is None:
+                        block = apply_mask_mode(fields, block, mask,
+                                                fill_value, types)
+                    yield block
             finally:
+                # Stop any prefetching before the cursor goes away.
+                if blocks is not None:
+                    blocks.close()
                 if cursor is not None:
                     cmonary.monary_close_query(cursor)
                 if collection is not None:
-                    cmonary.monary_destroy_collection(collection)
+                    self._release_collection(collection)
         finally:
             if coldata is not None:
                 cmonary.monary_free_column_data(coldata)
 
+    def _to_dataframe(self, fields, types, columns):
+        """Builds a DataFrame from the columns of a query, rejecting lists,
+        whose items do not line up with the documents.
+        """
+        for field, parent in zip(fields, get_list_parents(fields, types)):
+            if parent is not None:
+                raise ValueError("%r is a list item, and cannot be placed in "
+                                 "a DataFrame" % field)
+        return to_dataframe(fields, types, columns)
+
+    def query_df(self, db, coll, query, fields, types, **kwargs):
+        """Performs an array query, like ``query``, and returns the results
+           as a ``pandas.DataFrame`` with one column per field.
+
+           Numeric, date and category columns are handed to pandas without
+           copying: missing floats and dates become NaN and NaT, missing
+           integers and booleans become pandas nullable arrays over the
+           loaded data and mask, ``date`` columns become ``datetime64``, and
+           ``category`` columns become ``pandas.Categorical``. See
+           ``monary.frame.to_dataframe``.
+
+           :param db: name of database
+           :param coll: name of the collection to be queried
+           :param query: dictionary of Mongo query parameters
+           :param fields: list of fields to be extracted from each record
+           :param types: corresponding list of field types
+           :param kwargs: any other arguments of ``query``
+
+           :returns: the results, with a column named after each field
+           :rtype: pandas.DataFrame
+        """
+        columns = self.query(db, coll, query, fields, types, **kwargs)
+        return self._to_dataframe(fields, types, columns)
+
+    def block_query_df(self, db, coll, query, fields, types, **kwargs):
+        """Performs a block query, like ``block_query``, yielding each
+           block as a ``pandas.DataFrame`` (see ``query_df``).
+
+           .. note:: Each DataFrame shares memory with the block's arrays,
+                     which are reused between iterations. Copy a DataFrame
+                     to keep it past the next block.
+        """
+        for block in self.block_query(db, coll, query, fields, types,
+                                      **kwargs):
+            yield self._to_dataframe(fields, types, block)
+
+    def aggregate_df(self, db, coll, pipeline, fields, types, **kwargs):
+        """Performs an aggregation operation, like ``aggregate``, and
+           returns the results as a ``pandas.DataFrame`` (see ``query_df``).
+        """
+        columns = self.aggregate(db, coll, pipeline, fields, types, **kwargs)
+        return self._to_dataframe(fields, types, columns)
+
+    def block_aggregate_df(self, db, coll, pipeline, fields, types,
+                           **kwargs):
+        """Performs an aggregation operation, like ``block_aggregate``,
+           yielding each block as a ``pandas.DataFrame`` (see
+           ``block_query_df``).
+        """
+        for block in self.block_aggregate(db, coll, pipeline, fields, types,
+                                          **kwargs):
+            yield self._to_dataframe(fields, types, block)
+
+    def query_arrow(self, db, coll, query, fields, types, **kwargs):
+        """Performs an array query, like ``query``, and returns the results
+           as a ``pyarrow.Table`` with one column per field.
+
+           The loaded values, offsets and variable-length data are shared
+           with Arrow rather than copied; masks are packed into validity
+           bitmaps. ``date`` columns become millisecond timestamps,
+           ``category`` columns become dictionary arrays, and the item
+           columns of each ``list`` are placed inside it. See
+           ``monary.record_batch.to_record_batch``.
+
+           :param db: name of database
+           :param coll: name of the collection to be queried
+           :param query: dictionary of Mongo query parameters
+           :param fields: list of fields to be extracted from each record
+           :param types: corresponding list of field types
+           :param kwargs: any other arguments of ``query``
+
+           :returns: the results, with a column named after each field
+           :rtype: pyarrow.Table
+        """
+        columns = self.query(db, coll, query, fields, types, **kwargs)
+        batch = to_record_batch(fields, types, columns,
+                                get_list_parents(fields, types))
+        return pyarrow.Table.from_batches([batch])
+
+    def block_query_arrow(self, db, coll, query, fields, types, **kwargs):
+        """Performs a block query, like ``block_query``, yielding each
+           block as a ``pyarrow.RecordBatch`` (see ``query_arrow``).
+
+           .. note:: Each RecordBatch shares memory with the block's arrays,
+                     which are reused between iterations. Write a batch out,
+                     or copy it, before asking for the next one.
+        """
+        parents = get_list_parents(fields, types)
+        for block in self.block_query(db, coll, query, fields, types,
+                                      **kwargs):
+            yield to_record_batch(fields, types, block, parents)
+
+    def aggregate_arrow(self, db, coll, pipeline, fields, types, **kwargs):
+        """Performs an aggregation operation, like ``aggregate``, and
+           returns the results as a ``pyarrow.Table`` (see ``query_arrow``).
+        """
+        columns = self.aggregate(db, coll, pipeline, fields, types, **kwargs)
+        batch = to_record_batch(fields, types, columns,
+                                get_list_parents(fields, types))
+        return pyarrow.Table.from_batches([batch])
+
+    def block_aggregate_arrow(self, db, coll, pipeline, fields, types,
+                              **kwargs):
+        """Performs an aggregation operation, like ``block_aggregate``,
+           yielding each block as a ``pyarrow.RecordBatch`` (see
+           ``block_query_arrow``).
+        """
+        parents = get_list_parents(fields, types)
+        for block in self.block_aggregate(db, coll, pipeline, fields, types,
+                                          **kwargs):
+            yield to_record_batch(fields, types, block, parents)
+
+    def infer_schema(self, db, coll, query=None, sample=1000, varlen=False,
+                     refresh=False):
+        """Infers the fields and types of a collection from a sample of its
+           documents.
+
+           :param db: name of database
+           :param coll: name of the collection to be sampled
+           :param query: (optional) dictionary of Mongo query parameters
+                         selecting the documents to sample
+           :param int sample: (optional) number of documents to sample with
+                              ``$sample``; if 0, every matching document is
+                              read
+           :param bool varlen: (optional) use the variable-length
+                               ``varstring`` and ``varbinary`` types instead
+                               of fixed widths sized to the longest value
+                               seen
+           :param bool refresh: (optional) sample the collection again even
+                                if this connection already inferred its
+                                schema with the same arguments
+
+           :returns: the schema, which unpacks into fields and types that
+                     can be passed to ``query``, ``block_query`` or
+                     ``aggregate``
+           :rtype: Schema
+
+           Each field is named by its dotted path; subdocuments are
+           described by their fields rather than as a whole, and arrays are
+           skipped. A field's type is its most common BSON type, with
+           numbers of different types counted together and widened as
+           needed. Fields that appear in only some documents are included,
+           and are masked where they are missing.
+        """
+        key = (db, coll, get_plain_query(query), sample, varlen)
+        if not refresh and key in self._schema_cache:
+            return self._schema_cache[key]
+
+        pipeline = []
+        if query:
+            pipeline.append({"$match": query})
+        if sample > 0:
+            pipeline.append({"$sample": {"size": sample}})
+        encoded_pipeline = get_plain_query(get_pipeline(pipeline))
+
+        result = None
+        collection = None
+        try:
+            collection = self._get_collection(db, coll)
+            if collection is None:
+                raise MonaryError("Unable to get the collection")
+            err = get_empty_bson_error()
+            result = cmonary.monary_infer_schema(collection,
+                                                 encoded_pipeline,
+                                                 ctypes.byref(err))
+            if result is None:
+                raise MonaryError(err.message)
+            size, = struct.unpack("<i", ctypes.string_at(result, 4))
+            observations = bson.BSON(ctypes.string_at(result, size)).decode()
+        finally:
+            if result is not None:
+                cmonary.monary_free_bson(result)
+            if collection is not None:
+                self._release_collection(collection)
+
+        schema = Schema.from_observations(observations, varlen)
+        self._schema_cache[key] = schema
+        return schema
+
     def close(self):
         """Closes the current connection, if any."""
+        self._clear_collections()
         if self._connection is not None:
             cmonary.monary_disconnect(self._connection)
             self._connection = None
+        if self._pool is not None:
+            release_pool(self._client_args)
+            self._pool = None
+        if self._reader_pool is not None:
+            release_pool(self._client_args)
+            self._reader_pool = None
 
     def __enter__(self):
         """Monary connections meet the ContextManager protocol."""
@@ -1,12 +1,15 @@
 # Monary - Copyright 2011-2014 David J. C. Beach
 # Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
 
-from .monary import get_monary_numpy_type
+import numpy
+
+from .datehelper import TIMESTAMP_DTYPE, join_timestamps
+from .monary import get_monary_numpy_type, get_vector_type
 
 _SUPPORTED_TYPES = ["bool", "int8", "int16", "int32", "int64",
                     "uint8", "uint16", "uint32", "uint64", "float32",
                     "float64", "date", "id", "timestamp", "string",
-                    "binary", "bson"]
+                    "binary", "bson", "datetime64", "timedelta64"]
 
 _CMONARY_MAX_RECURSION = 100
 
@@ -26,7 +29,11 @@ class MonaryParam(object):
            will be used as the field name.
          - `mtype` (optional): The Monary type that corresponds to the numpy
            dtype of the array. This is require for the following types: binary,
-           bson, id, datetime, timestamp, and string.
+           bson, id, datetime, timestamp, and string. ``datetime64`` and
+           ``timedelta64`` arrays of any unit are stored as milliseconds,
+           and arrays of ``TIMESTAMP_DTYPE`` as timestamps. A 2-D array can be
+           inserted as binary vectors by giving a type such as
+           ``binary_float32[128]``.
         """
         if field is None:
             if mtype is not None:
@@ -50,7 +57,24 @@ class MonaryParam(object):
         elif mtype is None:
             mtype = str(array.data.dtype)
 
-        if mtype.split(":")[0] not in _SUPPORTED_TYPES:
+        # NumPy datetimes and durations of any unit are stored in
+        # milliseconds, and split timestamps are packed back together.
+        dtype = array.data.dtype
+        if dtype.kind == "M" and mtype in (str(dtype), "date", "datetime64"):
+            array, mtype = array.astype("datetime64[ms]"), "datetime64"
+        elif dtype.kind == "m" and mtype in (str(dtype), "timedelta64"):
+            array, mtype = array.astype("timedelta64[ms]"), "timedelta64"
+        elif dtype == TIMESTAMP_DTYPE and mtype in (str(dtype), "timestamp",
+                                                    "timestamp_parts"):
+            array, mtype = join_timestamps(array), "timestamp"
+
+        vector = get_vector_type(mtype)
+        if vector is not None:
+            if not vector[2]:
+                raise ValueError("MonaryParam cannot be of type %r; use %r "
+                                 "to insert vectors as binary data." %
+                                 (mtype, "binary_" + mtype))
+        elif mtype.split(":")[0] not in _SUPPORTED_TYPES:
             raise ValueError("MonaryParam cannot be of type %r." % mtype)
 
         self.array, self.field, self.mtype = array, field, mtype
@@ -58,7 +82,9 @@ class MonaryParam(object):
         m_np_t = get_monary_numpy_type(self.mtype)
         self.cmonary_type, self.cmonary_type_arg, self.numpy_type = m_np_t
 
-        if self.array.data.dtype != self.numpy_type:
+        expected = numpy.dtype(self.numpy_type)
+        if (self.array.data.dtype != expected.base or
+                self.array.shape[1:] != expected.shape):
             raise ValueError("Wrong type specified: given %r expected %r." %
                              (self.array.data.dtype, self.numpy_type))
 
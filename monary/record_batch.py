@@ -0,0 +1,180 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from .bitmask import BitmaskColumn
+from .category import CategoricalColumn
+from .list_column import ListColumn
+from .varlen import VarLenColumn
+
+# Arrow types of the values of each kind of VarLenColumn, which already use
+# Arrow's layout with int64 offsets.
+_VARLEN_ARROW_TYPES = {
+    "string": "large_string",
+    "binary": "large_binary",
+    "bson": "large_binary",
+}
+
+
+def _validity(mask):
+    """Packs a byte-per-row mask into an Arrow validity bitmap, or returns
+    None if nothing is missing."""
+    mask = numpy.asarray(mask, dtype=bool)
+    if not mask.any():
+        return None
+    return pyarrow.py_buffer(numpy.packbits(~mask, bitorder="little"))
+
+
+def _values_buffer(data):
+    """Returns an Arrow buffer over a column's values, which shares their
+    memory unless they are booleans, which Arrow packs into bits."""
+    data = numpy.ascontiguousarray(data)
+    if data.dtype == bool:
+        return pyarrow.py_buffer(numpy.packbits(data, bitorder="little"))
+    return pyarrow.py_buffer(data)
+
+
+def _arrow_type(dtype, typename):
+    """Returns the Arrow type of a column's fixed-size values."""
+    if typename == "date":
+        return pyarrow.timestamp("ms")
+    if dtype.kind == "V":
+        # ObjectIds, binary values and BSON documents.
+        return pyarrow.binary(dtype.itemsize)
+    return pyarrow.from_numpy_dtype(dtype)
+
+
+def _masked_to_arrow(column, typename):
+    """Converts a masked array into an Arrow array over the same values."""
+    data = numpy.ma.getdata(column)
+    mask = numpy.ma.getmaskarray(column)
+    if data.dtype.names:
+        # Split timestamps.
+        return pyarrow.StructArray.from_arrays(
+            [_masked_to_arrow(column[name], typename)
+             for name in data.dtype.names],
+            names=list(data.dtype.names))
+    if data.ndim > 1:
+        # Vectors: the elements, one row of ``dim`` after another, with the
+        # rows that are entirely missing marked as null lists.
+        dim = data.shape[1]
+        elements = _masked_to_arrow(
+            numpy.ma.masked_array(data.reshape(-1), mask.reshape(-1)),
+            typename)
+        row_mask = mask.all(axis=1)
+        return pyarrow.Array.from_buffers(
+            pyarrow.list_(elements.type, dim), len(data),
+            [_validity(row_mask)], children=[elements])
+    if data.dtype.kind == "S":
+        # Fixed-size strings are padded with nulls, which Arrow strings do
+        # not strip, so these are copied.
+        return pyarrow.array(data, mask=mask).cast(pyarrow.string())
+    arrow_type = _arrow_type(data.dtype, typename)
+    return pyarrow.Array.from_buffers(arrow_type, len(data),
+                                      [_validity(mask), _values_buffer(data)])
+
+
+def _bitmask_to_arrow(column, typename):
+    """Converts a BitmaskColumn into an Arrow array, sharing its validity
+    bitmap where Arrow's layout allows."""
+    data = column.data
+    if data.ndim > 1 or data.dtype.names or data.dtype.kind == "S":
+        return _masked_to_arrow(column.to_masked(), typename)
+    validity = None
+    if column.count() < len(data):
+        validity = pyarrow.py_buffer(column.validity)
+    return pyarrow.Array.from_buffers(_arrow_type(data.dtype, typename),
+                                      len(data),
+                                      [validity, _values_buffer(data)])
+
+
+def _to_arrow(column, typename):
+    """Converts one Monary column other than a list into an Arrow array."""
+    if isinstance(column, BitmaskColumn):
+        return _bitmask_to_arrow(column, typename)
+    if isinstance(column, VarLenColumn):
+        arrow_type = getattr(pyarrow, _VARLEN_ARROW_TYPES[column.kind])()
+        return pyarrow.Array.from_buffers(
+            arrow_type, len(column),
+            [_validity(column.mask), pyarrow.py_buffer(column.offsets),
+             pyarrow.py_buffer(column.data)])
+    if isinstance(column, CategoricalColumn):
+        dictionary = pyarrow.array(list(column.categories),
+                                   type=pyarrow.string())
+        return pyarrow.DictionaryArray.from_arrays(
+            _masked_to_arrow(column.codes, "int32"), dictionary)
+    return _masked_to_arrow(column, typename)
+
+
+def _list_to_arrow(column, items):
+    """Converts a ListColumn and its item columns into an Arrow list array.
+    A single ``$`` item column holds the elements themselves; otherwise each
+    element is a struct of the item columns.
+
+    :Parameters:
+     - `column`: the ListColumn.
+     - `items`: list of (name, Arrow array) of its item columns, named by
+       their field below the list's field.
+    """
+    if len(items) == 1 and items[0][0] == "$":
+        child = items[0][1]
+    elif items:
+        child = pyarrow.StructArray.from_arrays(
+            [array for name, array in items],
+            names=[name for name, array in items])
+    else:
+        child = pyarrow.nulls(int(column.offsets[-1]))
+    offsets = numpy.ascontiguousarray(column.offsets, dtype=numpy.int64)
+    start = int(offsets[0])
+    if start:
+        child = child.slice(start)
+        offsets = offsets - start
+    return pyarrow.Array.from_buffers(
+        pyarrow.large_list(child.type), len(column),
+        [_validity(column.mask), pyarrow.py_buffer(offsets)],
+        children=[child])
+
+
+def to_record_batch(fields, types, columns, parents):
+    """Builds a ``pyarrow.RecordBatch`` from the columns returned by a Monary
+    query, with a column named after each field.
+
+    The values, offsets and string data of the columns are shared with
+    Arrow rather than copied; only masks are packed into validity bitmaps,
+    booleans into bits, and fixed-size strings are copied without their
+    padding. Item columns of a ``list`` are placed inside it,
+    as a ``large_list`` of their values (for ``$``) or of structs of them.
+
+    :Parameters:
+     - `fields`: list of field names, as passed to the query.
+     - `types`: list of Monary type names, as passed to the query.
+     - `columns`: the list of columns returned by the query.
+     - `parents`: the list column of each column, from
+       ``get_list_parents``.
+    """
+    if pyarrow is None:
+        raise RuntimeError("pyarrow is required to return Arrow data")
+    items = dict((i, []) for i, typename in enumerate(types)
+                 if typename == "list")
+    for i, parent in enumerate(parents):
+        if parent is not None:
+            name = fields[i][len(fields[parent]) + 1:]
+            items[parent].append((name, _to_arrow(columns[i], types[i])))
+    names = []
+    arrays = []
+    for i, (field, typename, column) in enumerate(zip(fields, types,
+                                                      columns)):
+        if parents[i] is not None:
+            continue
+        if isinstance(column, ListColumn):
+            arrays.append(_list_to_arrow(column, items[i]))
+        else:
+            arrays.append(_to_arrow(column, typename))
+        names.append(field)
+    return pyarrow.RecordBatch.from_arrays(arrays, names=names)
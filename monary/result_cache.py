@@ -0,0 +1,185 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import threading
+import time
+
+import numpy
+
+try:
+    # if we are using Python 2.7+.
+    from collections import OrderedDict
+except ImportError:
+    # for Python 2.6 and earlier.
+    from .ordereddict import OrderedDict
+
+_clock = getattr(time, "monotonic", time.time)
+
+
+def _result_arrays(value):
+    """Yields every NumPy array held by a query result: the columns in a
+    list, the data and mask of masked arrays, and the arrays held by
+    VarLenColumn, CategoricalColumn, ListColumn and BitmaskColumn
+    objects."""
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            for array in _result_arrays(item):
+                yield array
+    elif isinstance(value, numpy.ma.MaskedArray):
+        yield value
+        yield numpy.ma.getdata(value)
+        if numpy.ma.getmask(value) is not numpy.ma.nomask:
+            yield numpy.ma.getmask(value)
+    elif isinstance(value, numpy.ndarray):
+        yield value
+    elif hasattr(value, "__dict__"):
+        for item in vars(value).values():
+            for array in _result_arrays(item):
+                yield array
+
+
+def result_nbytes(result):
+    """Returns the number of bytes of memory held by a query result. Arrays
+    that are views of a larger array, such as trimmed columns, count the
+    whole of the array they view, once.
+
+    :Parameters:
+     - `result`: a list of columns, or a structured array.
+    """
+    bases = {}
+    for array in _result_arrays(result):
+        while isinstance(array.base, numpy.ndarray):
+            array = array.base
+        bases[id(array)] = array.nbytes
+    return sum(bases.values())
+
+
+def make_read_only(result):
+    """Marks every array of a query result read-only, so that callers
+    sharing a cached result cannot change it.
+
+    :Parameters:
+     - `result`: a list of columns, or a structured array.
+    """
+    for array in _result_arrays(result):
+        array.flags.writeable = False
+
+
+def _copy_result(result):
+    """Returns a new list of the columns of a query result, or a structured
+    array as is."""
+    if isinstance(result, list):
+        return list(result)
+    return result
+
+
+class ResultCache(object):
+    """A cache of query results for a Monary connection, which keeps the
+    most recently used results within a budget of bytes.
+
+    Results are stored by their collection and an opaque key describing the
+    query, and are marked read-only, since every hit returns the same
+    arrays; each caller gets its own list of them. Counters of hits, misses
+    and evictions are kept in the ``hits``, ``misses`` and ``evictions``
+    attributes.
+    """
+    def __init__(self, max_bytes, ttl=None):
+        """Create a new ResultCache.
+
+        :Parameters:
+         - `max_bytes`: the most bytes of results to keep. The least recently
+           used results are evicted to make room for new ones, and results
+           larger than this are not kept at all.
+         - `ttl` (optional): the number of seconds a result is kept, or None
+           to keep results until they are evicted or invalidated.
+        """
+        if max_bytes < 0:
+            raise ValueError("max_bytes must not be negative")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of results kept."""
+        return len(self._entries)
+
+    def get(self, db, coll, key):
+        """Return the result kept for a query, or None.
+
+        :Parameters:
+         - `db`: name of the database queried.
+         - `coll`: name of the collection queried.
+         - `key`: the hashable description of the query.
+        """
+        with self._lock:
+            entry = self._entries.pop((db, coll, key), None)
+            if entry is not None and entry[2] is not None and \
+                    entry[2] <= _clock():
+                self.nbytes -= entry[1]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            # The most recently used result goes last.
+            self._entries[(db, coll, key)] = entry
+            self.hits += 1
+            return _copy_result(entry[0])
+
+    def put(self, db, coll, key, result):
+        """Keep the result of a query and return it. Its arrays are marked
+        read-only even if it is too large to keep, so that a result is the
+        same whether or not it came from the cache.
+
+        :Parameters:
+         - `db`: name of the database queried.
+         - `coll`: name of the collection queried.
+         - `key`: the hashable description of the query.
+         - `result`: the result.
+        """
+        make_read_only(result)
+        nbytes = result_nbytes(result)
+        if nbytes > self.max_bytes:
+            return result
+        expires = None
+        if self.ttl is not None:
+            expires = _clock() + self.ttl
+        with self._lock:
+            old = self._entries.pop((db, coll, key), None)
+            if old is not None:
+                self.nbytes -= old[1]
+            while self._entries and self.nbytes + nbytes > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted[1]
+                self.evictions += 1
+            self._entries[(db, coll, key)] = (_copy_result(result), nbytes,
+                                              expires)
+            self.nbytes += nbytes
+        return result
+
+    def invalidate(self, db=None, coll=None):
+        """Drop the results kept for a collection, a database or, by
+        default, every collection.
+
+        :Parameters:
+         - `db` (optional): name of the database.
+         - `coll` (optional): name of the collection in `db`.
+        """
+        with self._lock:
+            for entry_key in list(self._entries):
+                if (db is None or entry_key[0] == db) and \
+                        (coll is None or entry_key[1] == coll):
+                    self.nbytes -= self._entries.pop(entry_key)[1]
+
+    def clear(self):
+        """Drop every result and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = self.misses = self.evictions = 0
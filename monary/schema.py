@@ -0,0 +1,157 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+# BSON type codes, as per the BSON specification.
+BSON_DOUBLE = 1
+BSON_STRING = 2
+BSON_DOCUMENT = 3
+BSON_ARRAY = 4
+BSON_BINARY = 5
+BSON_OBJECTID = 7
+BSON_BOOL = 8
+BSON_DATE = 9
+BSON_NULL = 10
+BSON_INT32 = 16
+BSON_TIMESTAMP = 17
+BSON_INT64 = 18
+
+# Monary type names for BSON types that map to a single type. Strings,
+# binary data and numbers are handled separately.
+_SIMPLE_TYPES = {
+    BSON_OBJECTID: "id",
+    BSON_BOOL: "bool",
+    BSON_DATE: "date",
+    BSON_TIMESTAMP: "timestamp",
+}
+
+_NUMERIC_TYPES = (BSON_DOUBLE, BSON_INT32, BSON_INT64)
+
+# Stands for all of the numeric types when choosing the dominant type.
+_NUMERIC = 0
+
+
+def get_monary_type(type_counts, max_size, varlen=False):
+    """Choose the Monary type name for a field from the BSON types seen in
+       it.
+
+       Numbers of different BSON types are counted together, and stored in
+       the narrowest type that holds them all: ``int32``, ``int64`` or
+       ``float64``. Nulls are ignored, since they are masked whatever the
+       type. Subdocuments and arrays have no type of their own, since their
+       fields are listed separately.
+
+       :param dict type_counts: number of values seen of each BSON type code
+       :param int max_size: largest size in bytes of a string or binary
+                            value seen
+       :param bool varlen: use the variable-length ``varstring`` and
+                           ``varbinary`` types instead of fixed widths
+
+       :returns: the Monary type name, or None if the field has no suitable
+                 type
+       :rtype: str
+    """
+    candidates = {}
+    numeric = 0
+    for code, count in type_counts.items():
+        if code in _NUMERIC_TYPES:
+            numeric += count
+        elif code in _SIMPLE_TYPES or code in (BSON_STRING, BSON_BINARY):
+            candidates[code] = count
+    if numeric:
+        candidates[_NUMERIC] = numeric
+    if not candidates:
+        return None
+
+    # Ties go to the lowest type code, so the result is deterministic.
+    dominant = sorted(candidates.items(),
+                      key=lambda item: (-item[1], item[0]))[0][0]
+    if dominant == _NUMERIC:
+        if type_counts.get(BSON_DOUBLE):
+            return "float64"
+        if type_counts.get(BSON_INT64):
+            return "int64"
+        return "int32"
+    if dominant == BSON_STRING:
+        return "varstring" if varlen else "string:%d" % max(max_size, 1)
+    if dominant == BSON_BINARY:
+        return "varbinary" if varlen else "binary:%d" % max(max_size, 1)
+    return _SIMPLE_TYPES[dominant]
+
+
+class Schema(object):
+    """The fields and types of a collection, as inferred from a sample of its
+    documents by ``Monary.infer_schema``.
+
+    A Schema unpacks into its ``fields`` and ``types`` lists, so it can be
+    passed straight back into a query::
+
+        schema = m.infer_schema("finance", "assets")
+        arrays = m.query("finance", "assets", {}, *schema)
+    """
+    def __init__(self, fields, types, counts=None, sizes=None, num_docs=0):
+        """Create a new Schema.
+
+        :Parameters:
+         - `fields`: List of dotted field names.
+         - `types`: Corresponding list of Monary type names.
+         - `counts` (optional): Number of sampled documents in which each
+           field appeared.
+         - `sizes` (optional): Largest size in bytes of each field's string,
+           binary or document values.
+         - `num_docs` (optional): Number of documents sampled.
+        """
+        if len(fields) != len(types):
+            raise ValueError("Number of fields and types do not match")
+        self.fields = list(fields)
+        self.types = list(types)
+        if counts is None:
+            counts = [0] * len(fields)
+        if sizes is None:
+            sizes = [0] * len(fields)
+        self.counts = list(counts)
+        self.sizes = list(sizes)
+        self.num_docs = num_docs
+
+    @classmethod
+    def from_observations(cls, observations, varlen=False):
+        """Create a Schema from the fields observed by cmonary.
+
+        :Parameters:
+         - `observations`: A dict with "num_docs" and "fields", a list of
+           dicts with "path", "count", "max_size" and "types".
+         - `varlen` (optional): Use variable-length types for strings and
+           binary data.
+        """
+        fields, types, counts, sizes = [], [], [], []
+        for observed in observations["fields"]:
+            type_counts = dict((int(code), count)
+                               for code, count in observed["types"].items())
+            typename = get_monary_type(type_counts, observed["max_size"],
+                                       varlen)
+            if typename is None:
+                continue
+            fields.append(observed["path"])
+            types.append(typename)
+            counts.append(observed["count"])
+            sizes.append(observed["max_size"])
+        return cls(fields, types, counts, sizes, observations["num_docs"])
+
+    def to_dict(self):
+        """Return the Schema as a dict of lists, for storage as JSON."""
+        return {"fields": self.fields, "types": self.types,
+                "counts": self.counts, "sizes": self.sizes,
+                "num_docs": self.num_docs}
+
+    @classmethod
+    def from_dict(cls, obj):
+        """Create a Schema from the output of ``to_dict``."""
+        return cls(obj["fields"], obj["types"], obj.get("counts"),
+                   obj.get("sizes"), obj.get("num_docs", 0))
+
+    def __iter__(self):
+        """Yield the fields, then the types."""
+        yield self.fields
+        yield self.types
+
+    def __repr__(self):
+        return "Schema(%r, %r)" % (self.fields, self.types)
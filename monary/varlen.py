@@ -0,0 +1,172 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+# Monary type names of the variable-length columns, and the kind of value
+# each holds.
+VARLEN_KINDS = {
+    "varstring": "string",
+    "varbinary": "binary",
+    "varbson": "bson",
+}
+
+
+def _string_dtype():
+    """Returns NumPy's variable-width string dtype, with None marking
+    missing values, or None if this version of NumPy lacks it."""
+    dtypes = getattr(numpy, "dtypes", None)
+    string_dtype = getattr(dtypes, "StringDType", None)
+    if string_dtype is None:
+        return None
+    return string_dtype(na_object=None)
+
+
+class VarLenColumn(object):
+    """A column of variable-length values, stored in the Arrow layout: the
+    value of row ``i`` is ``data[offsets[i]:offsets[i + 1]]``, and is missing
+    if ``mask[i]`` is True (in which case it is empty)."""
+    def __init__(self, offsets, data, mask, kind="string"):
+        """Create a new VarLenColumn.
+
+        :Parameters:
+         - `offsets`: int64 array of one more offset than there are rows.
+         - `data`: uint8 array holding the values back to back.
+         - `mask`: bool array; True where a value is missing.
+         - `kind` (optional): "string", "binary" or "bson".
+        """
+        if len(offsets) != len(mask) + 1:
+            raise ValueError("Expected %d offsets for %d rows, got %d." %
+                             (len(mask) + 1, len(mask), len(offsets)))
+        if kind not in ("string", "binary", "bson"):
+            raise ValueError("Unknown kind of variable-length column: %r." %
+                             kind)
+        self.offsets = offsets
+        self.data = data
+        self.mask = mask
+        self.kind = kind
+
+    @classmethod
+    def from_ends(cls, ends, data, mask, kind="string"):
+        """Create a VarLenColumn from the offset at which each row ends.
+
+        :Parameters:
+         - `ends`: int64 array of the end offset of each row.
+         - `data`: uint8 array holding the values back to back.
+         - `mask`: bool array; True where a value is missing.
+         - `kind` (optional): "string", "binary" or "bson".
+        """
+        offsets = numpy.zeros(len(ends) + 1, dtype=numpy.int64)
+        offsets[1:] = ends
+        return cls(offsets, data, numpy.array(mask, dtype=bool), kind)
+
+    @classmethod
+    def concatenate(cls, columns, kind="string"):
+        """Join VarLenColumns of the same kind end to end.
+
+        :Parameters:
+         - `columns`: a list of VarLenColumns.
+         - `kind` (optional): The kind of the result if `columns` is empty.
+        """
+        if columns:
+            kind = columns[0].kind
+        datas = [numpy.zeros(0, dtype=numpy.uint8)]
+        offsets = [numpy.zeros(1, dtype=numpy.int64)]
+        base = 0
+        for column in columns:
+            start, stop = column.offsets[0], column.offsets[-1]
+            datas.append(column.data[start:stop])
+            offsets.append(column.offsets[1:] - start + base)
+            base += stop - start
+        return cls(numpy.concatenate(offsets),
+                   numpy.concatenate(datas),
+                   numpy.concatenate([numpy.zeros(0, dtype=bool)] +
+                                     [column.mask for column in columns]),
+                   kind)
+
+    def __len__(self):
+        """Return the number of rows."""
+        return len(self.mask)
+
+    def _value(self, raw):
+        if self.kind == "string":
+            return raw.decode("utf-8")
+        return raw
+
+    def __getitem__(self, key):
+        """Return the value of a row (numpy.ma.masked if it is missing), or
+        a VarLenColumn of the rows selected by a slice or index array.
+
+        :Parameters:
+         - `key`: An integer, slice, or array of integers or booleans.
+        """
+        if isinstance(key, (int, numpy.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("Index out of range.")
+            if self.mask[key]:
+                return numpy.ma.masked
+            start, stop = self.offsets[key], self.offsets[key + 1]
+            return self._value(self.data[start:stop].tobytes())
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                stop = max(start, stop)
+                return VarLenColumn(self.offsets[start:stop + 1], self.data,
+                                    self.mask[start:stop], self.kind)
+            key = numpy.arange(start, stop, step)
+        return self.take(key)
+
+    def take(self, indices):
+        """Return a VarLenColumn of the given rows, with its own data.
+
+        :Parameters:
+         - `indices`: An array of integers or booleans selecting rows.
+        """
+        indices = numpy.arange(len(self))[indices]
+        starts = self.offsets[indices]
+        lengths = self.offsets[indices + 1] - starts
+        offsets = numpy.zeros(len(indices) + 1, dtype=numpy.int64)
+        numpy.cumsum(lengths, out=offsets[1:])
+        # Position of every byte to copy, in the old data.
+        positions = (numpy.arange(offsets[-1], dtype=numpy.int64) +
+                     numpy.repeat(starts - offsets[:-1], lengths))
+        return VarLenColumn(offsets, self.data[positions],
+                            self.mask[indices], self.kind)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def lengths(self):
+        """Return an int64 array of the size in bytes of each value."""
+        return numpy.diff(self.offsets)
+
+    def count(self):
+        """Return the number of values that are not missing."""
+        return int(len(self) - numpy.count_nonzero(self.mask))
+
+    def tolist(self):
+        """Return the values as a list, with None for missing values."""
+        return [None if value is numpy.ma.masked else value
+                for value in self]
+
+    def to_numpy(self):
+        """Return the values as a NumPy array.
+
+        String columns become a StringDType array, with None for missing
+        values, where NumPy supports it (NumPy 2.0 and later). Otherwise, the
+        result is a masked array of Python objects.
+        """
+        values = self.tolist()
+        if self.kind == "string":
+            string_dtype = _string_dtype()
+            if string_dtype is not None:
+                return numpy.array(values, dtype=string_dtype)
+        array = numpy.empty(len(values), dtype=object)
+        array[:] = values
+        return numpy.ma.masked_array(array, self.mask.copy())
+
+    def __repr__(self):
+        return "VarLenColumn(%r, kind=%r)" % (self.tolist(), self.kind)
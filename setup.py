@@ -41,16 +41,33 @@ settings = {
                        "monary_cleanup",
                        "monary_connect",
                        "monary_disconnect",
+                       "monary_pool_new",
+                       "monary_pool_pop",
+                       "monary_pool_push",
+                       "monary_pool_destroy",
                        "monary_use_collection",
                        "monary_destroy_collection",
                        "monary_alloc_column_data",
                        "monary_free_column_data",
                        "monary_set_column_item",
+                       "monary_set_column_vector",
+                       "monary_set_column_stride",
+                       "monary_set_column_list_item",
+                       "monary_set_column_storage",
+                       "monary_resize_column_data",
+                       "monary_take_column_varbuf",
+                       "monary_free_buffer",
+                       "monary_column_items",
                        "monary_query_count",
+                       "monary_get_projection",
                        "monary_init_query",
                        "monary_init_aggregate",
                        "monary_load_query",
+                       "monary_set_query_column_data",
+                       "monary_query_categories",
                        "monary_close_query",
+                       "monary_infer_schema",
+                       "monary_free_bson",
                        "monary_create_write_concern",
                        "monary_destroy_write_concern",
                        "monary_insert"],
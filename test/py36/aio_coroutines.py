@@ -0,0 +1,78 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+# The coroutines used by test_aio. They need Python 3.6 syntax, so they are
+# kept out of the test package, whose modules are all imported by
+# "python setup.py test" on every version of Python.
+
+import asyncio
+
+from monary.aio import AsyncMonary, iterate_in_executor, run_in_executor
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def cancel_running(executor, func, started):
+    """Cancels a call to func once it has started, returning whether the
+    task was still waiting for the call after being cancelled, and whether
+    it then raised CancelledError."""
+    task = asyncio.ensure_future(run_in_executor(executor, func))
+    while not started.is_set():
+        await asyncio.sleep(0.01)
+    task.cancel()
+    await asyncio.sleep(0.01)
+    waiting = not task.done()
+    try:
+        await task
+    except asyncio.CancelledError:
+        return waiting, True
+    return waiting, False
+
+
+async def take(executor, iterator, n):
+    """Returns up to n items of an iterator read in the executor."""
+    items = []
+    aiterator = iterate_in_executor(executor, iterator)
+    async for item in aiterator:
+        items.append(item)
+        if len(items) == n:
+            break
+    await aiterator.aclose()
+    return items
+
+
+async def concurrent_queries(num_queries):
+    async with AsyncMonary("127.0.0.1", max_workers=4) as m:
+        count = await m.count("monary_test", "test_data", {})
+        results = await asyncio.gather(*[
+            m.query("monary_test", "test_data", {}, ["x"], ["int64"],
+                    sort="_id")
+            for _ in range(num_queries)])
+        totals = await m.aggregate(
+            "monary_test", "test_data",
+            [{"$group": {"_id": None, "x": {"$sum": "$x"}}}],
+            ["x"], ["int64"])
+    return count, results, totals
+
+
+async def count_blocks(limit):
+    """Counts the rows of a block query until it has read limit of them,
+    returning the count and the number of clients the connection still
+    had checked out after the query was closed."""
+    total = 0
+    async with AsyncMonary("127.0.0.1") as m:
+        iterator = m.block_query("monary_test", "test_data", {}, ["x"],
+                                 ["int64"], block_size=1000)
+        async for x, in iterator:
+            total += len(x)
+            if total >= limit:
+                break
+        await iterator.aclose()
+        checked_out = len(m.monary._pooled_clients)
+    return total, checked_out
@@ -52,3 +52,10 @@ class TestAggregation(unittest.TestCase):
         result = self.aggregate_monary_column("b", "int32", pipeline)
         assert numpy.count_nonzero(result.mask) == NUM_TEST_RECORDS / 2
         assert result.sum() == NUM_TEST_RECORDS / 2
+
+    def test_no_count(self):
+        pipeline = [{"$match": {"a": 0}}, {"$sort": {"_id": 1}}]
+        result = self.aggregate_monary_column("_id", "int32", pipeline,
+                                              do_count=False)
+        assert len(result) == NUM_TEST_RECORDS / 2
+        assert (result == list(range(0, NUM_TEST_RECORDS, 2))).all()
@@ -0,0 +1,110 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import sys
+import threading
+
+import pymongo
+
+from test import db_err, unittest
+
+aio_err = ""
+if sys.version_info >= (3, 6):
+    import concurrent.futures
+    from monary.aio import run_in_executor
+    from test.py36 import aio_coroutines
+else:
+    aio_err = "AsyncMonary requires Python 3.6 or later"
+
+NUM_TEST_RECORDS = 5000
+
+
+@unittest.skipIf(aio_err, aio_err)
+class TestExecutorHelpers(unittest.TestCase):
+    def setUp(self):
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_run(self):
+        result = aio_coroutines.run(run_in_executor(self.executor, divmod,
+                                                    7, 2))
+        assert result == (3, 1)
+        with self.assertRaises(ZeroDivisionError):
+            aio_coroutines.run(run_in_executor(self.executor, divmod, 7, 0))
+
+    def test_cancel_waits_for_call(self):
+        started = threading.Event()
+        release = threading.Event()
+        finished = []
+
+        def work():
+            started.set()
+            release.wait()
+            finished.append(True)
+
+        # The call cannot be interrupted, so the task keeps waiting for it;
+        # let it finish once the task has been cancelled.
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        waiting, cancelled = aio_coroutines.run(
+            aio_coroutines.cancel_running(self.executor, work, started))
+        timer.join()
+        assert waiting
+        assert cancelled
+        assert finished == [True]
+
+    def test_iterate_closes_early(self):
+        closed = []
+
+        def blocks():
+            try:
+                for i in range(10):
+                    yield i
+            finally:
+                closed.append(True)
+
+        items = aio_coroutines.run(
+            aio_coroutines.take(self.executor, blocks(), 3))
+        assert items == [0, 1, 2]
+        assert closed == [True]
+        items = aio_coroutines.run(
+            aio_coroutines.take(self.executor, blocks(), 20))
+        assert items == list(range(10))
+
+
+@unittest.skipIf(aio_err, aio_err)
+@unittest.skipIf(db_err, db_err)
+class TestAsyncMonary(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+            records = [{"_id": i, "x": i * 2}
+                       for i in range(NUM_TEST_RECORDS)]
+            c.monary_test.test_data.insert(records, safe=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+
+    def test_concurrent_queries(self):
+        count, results, totals = aio_coroutines.run(
+            aio_coroutines.concurrent_queries(8))
+        assert count == NUM_TEST_RECORDS
+        for x, in results:
+            assert x.tolist() == [i * 2 for i in range(NUM_TEST_RECORDS)]
+        assert totals[0][0] == NUM_TEST_RECORDS * (NUM_TEST_RECORDS - 1)
+
+    def test_block_query(self):
+        total, checked_out = aio_coroutines.run(
+            aio_coroutines.count_blocks(NUM_TEST_RECORDS))
+        assert total == NUM_TEST_RECORDS
+        # Closing the cursor returned its client to the pool.
+        assert checked_out == 0
+        total, checked_out = aio_coroutines.run(
+            aio_coroutines.count_blocks(2000))
+        assert total == 2000
+        assert checked_out == 0
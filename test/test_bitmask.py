@@ -0,0 +1,41 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+from monary.bitmask import BitmaskColumn
+from test import unittest
+
+
+class TestBitmaskColumn(unittest.TestCase):
+    def test_from_mask(self):
+        mask = numpy.array([False, True, False] * 3)
+        column = BitmaskColumn.from_mask(numpy.arange(9), mask)
+        assert len(column) == 9
+        assert len(column.validity) == 2
+        # Bit i of the bitmap is set where row i is present.
+        assert column.validity.tolist() == [0b01101101, 0b1]
+        assert column.mask.tolist() == mask.tolist()
+        assert column.count() == 6
+
+    def test_getitem(self):
+        column = BitmaskColumn.from_mask(numpy.array([1.5, 2.5, 3.5]),
+                                         [False, True, False])
+        assert column[0] == 1.5
+        assert column[1] is numpy.ma.masked
+        assert column[-1] == 3.5
+        with self.assertRaises(IndexError):
+            column[3]
+        assert column[1:].tolist() == [None, 3.5]
+
+    def test_vectors(self):
+        data = numpy.arange(6, dtype=numpy.float32).reshape(3, 2)
+        mask = numpy.array([[False, False], [True, True], [False, True]])
+        column = BitmaskColumn.from_mask(data, mask)
+        assert len(column) == 3
+        assert column.mask.tolist() == mask.tolist()
+        assert column.to_masked()[2].tolist() == [4.0, None]
+
+    def test_wrong_validity_length(self):
+        with self.assertRaises(ValueError):
+            BitmaskColumn(numpy.arange(9), numpy.zeros(1, dtype=numpy.uint8))
@@ -57,3 +57,23 @@ class TestBlockAggregation(unittest.TestCase):
         result = self.aggregate_monary_column("b", "int32", pipeline)
         assert numpy.count_nonzero(result.mask) == NUM_TEST_RECORDS / 2
         assert result.sum() == NUM_TEST_RECORDS / 2
+
+    def test_limit(self):
+        with monary.Monary("127.0.0.1") as m:
+            total = 0
+            for block, in m.block_aggregate("monary_test", "data",
+                                            [{"$sort": {"_id": 1}}],
+                                            ["_id"], ["int32"],
+                                            block_size=64, limit=100):
+                total += len(block)
+        assert total == 100
+
+    def test_limit_before_out(self):
+        with monary.Monary("127.0.0.1") as m:
+            blocks = list(m.block_aggregate(
+                "monary_test", "data",
+                [{"$sort": {"_id": 1}}, {"$out": "limited"}],
+                ["_id"], ["int32"], limit=10))
+        assert sum(len(block) for block, in blocks) == 0
+        with pymongo.MongoClient() as c:
+            assert c.monary_test.limited.count() == 10
@@ -1,6 +1,7 @@
 # Monary - Copyright 2011-2014 David J. C. Beach
 # Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
 
+import numpy
 import pymongo
 
 import monary
@@ -34,11 +35,12 @@ class TestBlockQuery(unittest.TestCase):
     def get_monary_connection(self):
         return monary.Monary("127.0.0.1", 27017)
 
-    def get_monary_blocks(self, colname, coltype):
+    def get_monary_blocks(self, colname, coltype, **kwargs):
         with self.get_monary_connection() as m:
             for block, in m.block_query("monary_test", "test_data",
                                         {}, [colname], [coltype],
-                                        block_size=BLOCK_SIZE, sort="_id"):
+                                        block_size=BLOCK_SIZE, sort="_id",
+                                        **kwargs):
                 yield block
 
     def test_count(self):
@@ -60,3 +62,49 @@ class TestBlockQuery(unittest.TestCase):
             total += block.sum()
         target_sum = NUM_TEST_RECORDS * (NUM_TEST_RECORDS - 1) / 2
         assert total == target_sum
+
+    def test_out(self):
+        out = numpy.empty(BLOCK_SIZE, dtype=numpy.int32)
+        total = 0
+        for block in self.get_monary_blocks("_id", "int32", out=[out]):
+            assert numpy.shares_memory(block.data, out)
+            total += block.sum()
+        target_sum = NUM_TEST_RECORDS * (NUM_TEST_RECORDS - 1) / 2
+        assert total == target_sum
+
+    def test_structured(self):
+        total = 0
+        with self.get_monary_connection() as m:
+            for block in m.block_query("monary_test", "test_data", {},
+                                       ["_id", "x"], ["int32", "int8"],
+                                       block_size=BLOCK_SIZE, sort="_id",
+                                       structured=True):
+                assert block.dtype.names == ("_id", "x")
+                total += block["_id"].sum()
+        target_sum = NUM_TEST_RECORDS * (NUM_TEST_RECORDS - 1) / 2
+        assert total == target_sum
+
+    def test_prefetch(self):
+        total = 0
+        expected_start = 0
+        for block in self.get_monary_blocks("_id", "int32", prefetch=2):
+            assert block[0] == expected_start
+            expected_start += len(block)
+            total += block.sum()
+        target_sum = NUM_TEST_RECORDS * (NUM_TEST_RECORDS - 1) / 2
+        assert total == target_sum
+
+    def test_prefetch_shares_connection(self):
+        total = 0
+        with self.get_monary_connection() as m:
+            for block, in m.block_query("monary_test", "test_data", {},
+                                        ["_id"], ["int32"],
+                                        block_size=BLOCK_SIZE, sort="_id",
+                                        prefetch=2):
+                # The prefetching thread has a client of its own, so the
+                # connection can be used while it runs.
+                assert m.count("monary_test", "test_data") == \
+                    NUM_TEST_RECORDS
+                total += len(block)
+            assert not m._pooled_clients
+        assert total == NUM_TEST_RECORDS
@@ -0,0 +1,34 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+from monary.category import CategoricalColumn
+from test import unittest
+
+
+def make_column(codes, categories):
+    codes = numpy.array(codes, dtype=numpy.int32)
+    categories_array = numpy.empty(len(categories), dtype=object)
+    categories_array[:] = categories
+    return CategoricalColumn(numpy.ma.masked_array(codes, codes < 0),
+                             categories_array)
+
+
+class TestCategoricalColumn(unittest.TestCase):
+    def test_values(self):
+        column = make_column([0, 1, -1, 0], ["up", "down"])
+        assert len(column) == 4
+        assert column.tolist() == ["up", "down", None, "up"]
+        assert column[2] is numpy.ma.masked
+        assert column[1:].tolist() == ["down", None, "up"]
+        assert column.count() == 3
+        assert list(column.to_numpy().compressed()) == ["up", "down", "up"]
+
+    def test_concatenate(self):
+        first = make_column([0, 1, -1], ["up", "down"])
+        second = make_column([1, 0, 2], ["left", "down", "up"])
+        joined = CategoricalColumn.concatenate([first, second])
+        assert list(joined.categories) == ["up", "down", "left"]
+        assert joined.tolist() == ["up", "down", None, "down", "left", "up"]
+        assert list(joined.codes.data) == [0, 1, -1, 1, 2, 0]
@@ -116,6 +116,20 @@ class TestColumnTypes(unittest.TestCase):
         expected = self.get_record_values("_id")
         assert data == expected
 
+    def test_id_helpers(self):
+        column = self.get_monary_array("_id", "id")
+        expected = self.get_record_values("_id")
+        assert monary.ids_to_objectids(column) == expected
+        assert monary.ids_to_hex(column).tolist() == [str(oid)
+                                                      for oid in expected]
+
+    def test_id_time_column(self):
+        column = self.get_monary_array("_id", "id_time")
+        expected = [oid.generation_time.replace(tzinfo=None)
+                    for oid in self.get_record_values("_id")]
+        assert column.dtype == numpy.dtype("datetime64[ms]")
+        assert column.tolist() == expected
+
     def test_bool_column(self):
         data = self.get_monary_column("boolval", "bool")
         expected = self.get_record_values("boolval")
@@ -133,6 +147,30 @@ class TestColumnTypes(unittest.TestCase):
         expected = [(ts.time, ts.inc) for ts in timestamps]
         assert data == expected
 
+    def get_monary_array(self, colname, coltype):
+        with monary.Monary("127.0.0.1") as m:
+            [column] = m.query("monary_test", "test_data", {},
+                               [colname], [coltype], sort="sequence")
+        return column
+
+    def test_datetime64_column(self):
+        column = self.get_monary_array("dateval", "datetime64")
+        expected = self.get_record_values("dateval")
+        assert column.dtype == numpy.dtype("datetime64[ms]")
+        assert column.tolist() == expected
+
+    def test_timedelta64_column(self):
+        column = self.get_monary_array("intval", "timedelta64")
+        expected = self.get_record_values("intval")
+        assert column.dtype == numpy.dtype("timedelta64[ms]")
+        assert column.view(numpy.int64).tolist() == expected
+
+    def test_timestamp_parts_column(self):
+        column = self.get_monary_array("timestampval", "timestamp_parts")
+        timestamps = self.get_record_values("timestampval")
+        assert column["time"].tolist() == [ts.time for ts in timestamps]
+        assert column["inc"].tolist() == [ts.inc for ts in timestamps]
+
     def test_string_column(self):
         data = self.get_monary_column("stringval", "string:5")
         expected = [s.encode('ascii')
@@ -154,6 +192,89 @@ class TestColumnTypes(unittest.TestCase):
                         for b in self.get_record_values("binaryval")]
         assert data == expected
 
+    def test_varstring_column(self):
+        data = self.get_monary_column("stringval", "varstring")
+        expected = self.get_record_values("stringval")
+        assert data == expected
+
+    def test_varbinary_column(self):
+        data = [bytes(x)
+                for x in self.get_monary_column("binaryval", "varbinary")]
+        expected = [bytes(b) for b in self.get_record_values("binaryval")]
+        assert data == expected
+
+    def test_varbson_column(self):
+        rawdata = self.get_monary_column("subdocumentval", "varbson")
+        expected = self.get_record_values("subdocumentval")
+        data = [bson.BSON(x).decode() for x in rawdata]
+        assert data == expected
+
+    def test_category_column(self):
+        with monary.Monary("127.0.0.1") as m:
+            [column] = m.query("monary_test", "test_data", {},
+                               ["stringval"], ["category"], sort="sequence")
+        expected = self.get_record_values("stringval")
+        assert column.tolist() == expected
+        assert column.codes.dtype == numpy.int32
+        assert sorted(column.categories) == sorted(set(expected))
+
+    def test_category_blocks(self):
+        values = []
+        categories = []
+        with monary.Monary("127.0.0.1") as m:
+            for [block] in m.block_query("monary_test", "test_data", {},
+                                         ["stringval"], ["category"],
+                                         block_size=7, sort="sequence"):
+                values.extend(block.tolist())
+                categories.append(list(block.categories))
+        assert values == self.get_record_values("stringval")
+        # Codes keep their meaning from block to block.
+        for before, after in zip(categories, categories[1:]):
+            assert after[:len(before)] == before
+        with self.assertRaises(ValueError):
+            monary.monary.get_monary_numpy_type("category:8")
+
+    def test_vector_column(self):
+        with monary.Monary("127.0.0.1") as m:
+            [column] = m.query("monary_test", "test_data", {},
+                               ["intlistval"], ["int32[3]"], sort="sequence")
+        assert column.shape == (NUM_TEST_RECORDS, 3)
+        assert column.dtype == numpy.int32
+        expected_rows = self.get_record_values("intlistval")
+        for row, expected in zip(column, expected_rows):
+            if len(expected) == 3:
+                assert row.tolist() == expected
+            else:
+                # Arrays of any other length are masked.
+                assert row.mask.all()
+
+    def test_binary_vector_column(self):
+        with monary.Monary("127.0.0.1") as m:
+            [column] = m.query("monary_test", "test_data", {},
+                               ["binaryval"], ["binary_uint8[5]"],
+                               sort="sequence")
+        assert column.shape == (NUM_TEST_RECORDS, 5)
+        assert column.dtype == numpy.uint8
+        expected_rows = self.get_record_values("binaryval")
+        for row, expected in zip(column, expected_rows):
+            expected = bytearray(expected)
+            if len(expected) == 5:
+                assert row.tolist() == list(expected)
+            else:
+                # Binary data of any other length is masked.
+                assert row.mask.all()
+
+    def test_list_column(self):
+        with monary.Monary("127.0.0.1") as m:
+            lists, items = m.query("monary_test", "test_data", {},
+                                   ["intlistval", "intlistval.$"],
+                                   ["list", "int32"], sort="sequence")
+        expected = self.get_record_values("intlistval")
+        assert len(lists) == NUM_TEST_RECORDS
+        assert list(lists.lengths()) == [len(l) for l in expected]
+        assert [list(row) for row in lists.split(items)] == expected
+        assert items.count() == sum(len(l) for l in expected)
+
     def test_nested_field(self):
         data = self.get_monary_column("subdocumentval.subkey", "int32")
         expected = [r["subkey"]
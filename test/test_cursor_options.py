@@ -0,0 +1,91 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import pymongo
+
+import monary
+from test import db_err, unittest
+
+NUM_TEST_RECORDS = 5000
+BLOCK_SIZE = 1000
+
+
+class TestCursorOptionsSpec(unittest.TestCase):
+    def test_query_flags(self):
+        options = monary.CursorOptions(exhaust=True, no_cursor_timeout=True)
+        assert options.get_query_flags() == (
+            monary.MONARY_QUERY_EXHAUST |
+            monary.MONARY_QUERY_NO_CURSOR_TIMEOUT)
+        assert (monary.CursorOptions().get_query_flags() ==
+                monary.MONARY_QUERY_NONE)
+
+    def test_batch_size(self):
+        assert monary.CursorOptions().get_batch_size(7) == 7
+        assert monary.CursorOptions(batch_size=3).get_batch_size(7) == 3
+        with self.assertRaises(ValueError):
+            monary.CursorOptions(batch_size=-1)
+
+    def test_aggregate_options(self):
+        assert monary.CursorOptions().get_aggregate_options() is None
+        options = monary.CursorOptions(allow_disk_use=True)
+        assert options.get_aggregate_options(10) is not None
+        with self.assertRaises(ValueError):
+            monary.CursorOptions(exhaust=True).get_aggregate_options()
+
+
+@unittest.skipIf(db_err, db_err)
+class TestCursorOptions(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with pymongo.MongoClient("127.0.0.1", 27017) as c:
+            c.drop_database("monary_test")
+            records = [{"_id": i, "x": i} for i in range(NUM_TEST_RECORDS)]
+            c.monary_test.test_data.insert(records, safe=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+
+    def test_query(self):
+        target_sum = NUM_TEST_RECORDS * (NUM_TEST_RECORDS - 1) / 2
+        for options in [monary.CursorOptions(batch_size=100),
+                        monary.CursorOptions(exhaust=True),
+                        monary.CursorOptions(no_cursor_timeout=True)]:
+            with monary.Monary("127.0.0.1") as m:
+                x, = m.query("monary_test", "test_data", {}, ["x"],
+                             ["int32"], cursor_options=options)
+            assert x.count() == NUM_TEST_RECORDS
+            assert x.sum() == target_sum
+
+    def test_block_query(self):
+        total = 0
+        options = monary.CursorOptions(exhaust=True)
+        with monary.Monary("127.0.0.1") as m:
+            for x, in m.block_query("monary_test", "test_data", {}, ["x"],
+                                    ["int32"], block_size=BLOCK_SIZE,
+                                    cursor_options=options):
+                total += x.count()
+        assert total == NUM_TEST_RECORDS
+
+    def test_exhaust_with_limit(self):
+        with monary.Monary("127.0.0.1") as m:
+            with self.assertRaises(ValueError):
+                m.query("monary_test", "test_data", {}, ["x"], ["int32"],
+                        limit=10,
+                        cursor_options=monary.CursorOptions(exhaust=True))
+
+    def test_aggregate(self):
+        options = monary.CursorOptions(batch_size=100, allow_disk_use=True)
+        pipeline = [{"$sort": {"x": -1}}]
+        with monary.Monary("127.0.0.1") as m:
+            x, = m.aggregate("monary_test", "test_data", pipeline, ["x"],
+                             ["int32"], cursor_options=options)
+            assert x[0] == NUM_TEST_RECORDS - 1
+            total = 0
+            for x, in m.block_aggregate("monary_test", "test_data",
+                                        pipeline, ["x"], ["int32"],
+                                        block_size=BLOCK_SIZE,
+                                        cursor_options=options):
+                total += x.count()
+        assert total == NUM_TEST_RECORDS
@@ -3,7 +3,14 @@
 
 import datetime
 
-from monary.datehelper import datetime_to_mongodate, mongodate_to_datetime
+import numpy
+
+from monary.datehelper import (datetime_to_mongodate, mongodate_to_datetime,
+                               mongodates_to_datetime64,
+                               datetime64_to_mongodates,
+                               mongodeltas_to_timedelta64,
+                               timedelta64_to_mongodeltas, split_timestamps,
+                               join_timestamps)
 from test import unittest
 
 DT = datetime.datetime
@@ -23,3 +30,44 @@ class TestDateHelper(unittest.TestCase):
     def test_mongo_to_datetime(self):
         for dt, mongo in DATES:
             assert mongodate_to_datetime(mongo) == dt
+
+    def test_mongodates_to_datetime64(self):
+        mongodates = numpy.ma.masked_array(
+            numpy.array([mongo for dt, mongo in DATES], dtype=numpy.int64),
+            [False, True, False])
+        dts = mongodates_to_datetime64(mongodates)
+        assert dts.dtype == numpy.dtype("datetime64[ms]")
+        assert dts.mask.tolist() == [False, True, False]
+        assert dts[0] == numpy.datetime64(DATES[0][0], "ms")
+        assert dts[2] == numpy.datetime64(DATES[2][0], "ms")
+        # int64 dates are viewed rather than copied.
+        mongodates[0] = 1
+        assert dts[0] == numpy.datetime64(1, "ms")
+
+    def test_datetime64_to_mongodates(self):
+        dts = numpy.array([dt for dt, mongo in DATES], dtype="datetime64[s]")
+        mongodates = datetime64_to_mongodates(dts)
+        assert mongodates.dtype == numpy.int64
+        assert mongodates.tolist() == [mongo for dt, mongo in DATES]
+
+    def test_timedelta64(self):
+        deltas = mongodeltas_to_timedelta64([0, 1500, -20])
+        assert deltas.dtype == numpy.dtype("timedelta64[ms]")
+        assert deltas[1] == numpy.timedelta64(1500, "ms")
+        minutes = numpy.array([1, 2], dtype="timedelta64[m]")
+        assert timedelta64_to_mongodeltas(minutes).tolist() == [60000,
+                                                                120000]
+
+    def test_split_timestamps(self):
+        # A timestamp column holds the seconds, then the increment.
+        raw = numpy.array([(5, 7), (10, 1)],
+                          dtype=[("time", "u4"), ("inc", "u4")])
+        packed = numpy.ma.masked_array(raw.view(numpy.uint64), [False, True])
+        parts = split_timestamps(packed)
+        assert parts["time"][0] == 5
+        assert parts["inc"][0] == 7
+        assert parts.mask[1]["time"] and parts.mask[1]["inc"]
+        rejoined = join_timestamps(parts)
+        assert rejoined.dtype == numpy.uint64
+        assert rejoined[0] == packed[0]
+        assert rejoined.mask.tolist() == [False, True]
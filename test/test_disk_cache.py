@@ -0,0 +1,109 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import os
+import shutil
+import tempfile
+import time
+
+import numpy
+
+from monary.bitmask import BitmaskColumn
+from monary.category import CategoricalColumn
+from monary.disk_cache import DiskResultCache
+from monary.list_column import ListColumn
+from monary.varlen import VarLenColumn
+from test import unittest
+
+
+def column(values, mask=None):
+    if mask is None:
+        mask = [False] * len(values)
+    return numpy.ma.masked_array(numpy.array(values, dtype=numpy.int64), mask)
+
+
+class TestDiskResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        cache = DiskResultCache(self.directory, 1 << 20)
+        categories = numpy.empty(2, dtype=object)
+        categories[:] = ["up", "down"]
+        codes = numpy.ma.masked_array(numpy.array([1, -1], dtype=numpy.int32),
+                                      [False, True])
+        result = [
+            column([1, 2, 3], [False, True, False]),
+            numpy.arange(3.0),
+            VarLenColumn.from_ends(numpy.array([2, 2, 5]),
+                                   numpy.frombuffer(b"hibye", numpy.uint8),
+                                   numpy.array([False, True, False])),
+            CategoricalColumn(codes, categories),
+            ListColumn.from_ends([1, 1, 3], [False, True, False]),
+            BitmaskColumn.from_mask(numpy.arange(3), [True, False, False]),
+        ]
+        assert cache.get("db", "coll", "key") is None
+        assert cache.put("db", "coll", "key", result) is result
+        # Another process sees the same files.
+        loaded = DiskResultCache(self.directory, 1 << 20).get("db", "coll",
+                                                              "key")
+        assert loaded[0].tolist() == [1, None, 3]
+        # Memory maps of the files are read-only.
+        with self.assertRaises(ValueError):
+            loaded[0][0] = 5
+        assert loaded[1].tolist() == [0.0, 1.0, 2.0]
+        assert loaded[2].tolist() == ["hi", None, "bye"]
+        assert loaded[3].categories.tolist() == ["up", "down"]
+        assert loaded[3].codes.tolist() == [1, None]
+        assert loaded[4].offsets.tolist() == [0, 1, 1, 3]
+        assert loaded[5].mask.tolist() == [True, False, False]
+        assert (cache.hits, cache.misses) == (0, 1)
+        assert len(os.listdir(self.directory)) == 1
+        assert len(cache) == 1
+
+    def test_structured(self):
+        cache = DiskResultCache(self.directory, 1 << 20)
+        records = numpy.zeros(2, dtype=[("a", "i4"), ("b", "f8")])
+        records["a"] = [1, 2]
+        cache.put("db", "coll", "key", records)
+        loaded = cache.get("db", "coll", "key")
+        assert loaded["a"].tolist() == [1, 2]
+        assert cache.hits == 1
+
+    def test_objects_not_kept(self):
+        cache = DiskResultCache(self.directory, 1 << 20)
+        values = numpy.empty(1, dtype=object)
+        cache.put("db", "coll", "key", [values])
+        assert len(cache) == 0
+
+    def test_eviction(self):
+        cache = DiskResultCache(self.directory, 200)
+        cache.put("db", "coll", "a", [column(range(10))])
+        cache.put("db", "coll", "b", [column(range(10))])
+        # Using "a" makes "b" the least recently used.
+        past = time.time() - 10
+        for name in os.listdir(self.directory):
+            os.utime(os.path.join(self.directory, name), (past, past))
+        cache.get("db", "coll", "a")
+        cache.put("db", "coll", "c", [column(range(10))])
+        assert cache.evictions == 1
+        assert cache.get("db", "coll", "b") is None
+        assert cache.get("db", "coll", "a") is not None
+        assert cache.nbytes == 180
+        cache.put("db", "coll", "d", [column(range(100))])
+        assert len(cache) == 2
+
+    def test_ttl_and_invalidate(self):
+        cache = DiskResultCache(self.directory, 1 << 20, ttl=60)
+        cache.put("db", "a", "key", [column([1])])
+        cache.put("db", "b", "key", [column([1])])
+        assert cache.get("db", "a", "key") is not None
+        cache.ttl = 1e-9
+        assert cache.get("db", "a", "key") is None
+        assert len(cache) == 1
+        cache.invalidate("db", "b")
+        assert len(cache) == 0
+        assert not os.listdir(self.directory)
@@ -0,0 +1,121 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import bson
+import pymongo
+
+import monary
+from test import db_err, unittest
+
+NUM_TEST_RECORDS = 1000
+
+
+@unittest.skipIf(db_err, db_err)
+class TestFieldPlan(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+            records = []
+            for i in range(NUM_TEST_RECORDS):
+                # Alternate the field order so that both the positional fast
+                # path and the fallback lookup are exercised.
+                sub = [("x", i), ("y", {"z": i * 2})]
+                fields = [("_id", i), ("a", i), ("sub", bson.SON(sub)),
+                          ("arr", [i, {"q": i * 3}])]
+                if i % 3 == 0:
+                    sub.reverse()
+                    fields.reverse()
+                    fields = [f for f in fields if f[0] != "a"]
+                records.append(bson.SON(fields))
+            c.monary_test.test_data.insert(records, safe=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+
+    def get_monary_columns(self, fields, types):
+        with monary.Monary("127.0.0.1") as m:
+            return m.query("monary_test", "test_data", {}, fields, types,
+                           sort="_id")
+
+    def test_nested_fields(self):
+        x, z, q = self.get_monary_columns(["sub.x", "sub.y.z", "arr.1.q"],
+                                          ["int32", "int32", "int32"])
+        assert (x == list(range(NUM_TEST_RECORDS))).all()
+        assert (z == x * 2).all()
+        assert (q == x * 3).all()
+
+    def test_shared_field(self):
+        val, typ, length = self.get_monary_columns(["sub", "sub", "sub"],
+                                                   ["bson:64", "type",
+                                                    "length"])
+        assert val.count() == NUM_TEST_RECORDS
+        assert (typ == 3).all()
+        assert (length == 2).all()
+
+    def test_missing_fields(self):
+        a, missing = self.get_monary_columns(["a", "sub.missing"],
+                                             ["int32", "int32"])
+        assert a.count() == NUM_TEST_RECORDS - len(
+            range(0, NUM_TEST_RECORDS, 3))
+        assert missing.count() == 0
+
+    def test_projection(self):
+        fields = ["sub.y", "sub", "sub.x", "arr.1.q", "arr", "arr"]
+        types = ["bson:64", "length", "int32", "int32", "int64[2]", "length"]
+        with monary.Monary("127.0.0.1") as m:
+            projected = m.query("monary_test", "test_data", {}, fields,
+                                types, sort="_id")
+            whole = m.query("monary_test", "test_data", {}, fields, types,
+                            sort="_id", select_fields=False)
+            projection = m._get_projection(fields, types)
+            vector_projection = m._get_projection(["arr"], ["int64[2]"])
+            id_projection = m._get_projection(["_id", "a"],
+                                              ["int32", "int32"])
+            list_projection = m._get_projection(
+                ["arr", "arr.$", "arr.q", "a"],
+                ["list", "int64", "int32", "int32"])
+        for p, w in zip(projected, whole):
+            assert p.tolist() == w.tolist()
+        # Fields below a selected one are dropped, paths through an array
+        # index select the whole array, and _id is left out.
+        assert projection == {"sub": 1, "arr": 1, "_id": 0}
+        # A vector selects one element more than its dimension; _id is then
+        # selected to make the projection an inclusion.
+        assert vector_projection == {"arr": {"$slice": 3}, "_id": 1}
+        assert id_projection == {"_id": 1, "a": 1}
+        # A list is selected whole for its item columns.
+        assert list_projection == {"arr": 1, "a": 1, "_id": 0}
+        # _id is only fetched when it is read.
+        id_types, = self.get_monary_columns(["_id"], ["type"])
+        assert (id_types == 16).all()
+
+    def test_select_fields_default(self):
+        get_select_fields = monary.monary.get_select_fields
+        assert get_select_fields(["a", "b.0.c"], ["int32", "int32"])
+        assert not get_select_fields(["a", "b.$c"], ["int32", "int32"])
+        assert not get_select_fields(["a"], ["int32"], False)
+        assert get_select_fields(["a.$c"], ["int32"], True)
+        # Item columns are fetched with their list, so they do not stop
+        # the projection.
+        assert get_select_fields(["l", "l.$", "l.$c"],
+                                 ["list", "int32", "int32"])
+
+    def test_list_items(self):
+        fields = ["arr", "arr.$", "arr.q"]
+        types = ["list", "int64", "int32"]
+        with monary.Monary("127.0.0.1") as m:
+            arr, elems, qs = m.query("monary_test", "test_data", {}, fields,
+                                     types, sort="_id", do_count=False)
+            # Item columns get no per-row storage of their own.
+            coldata, storage = m._make_raw_column_data(fields, types, 10)
+            monary.monary.cmonary.monary_free_column_data(coldata)
+        assert [len(data) for data, mask in storage] == [10, 0, 0]
+        assert list(arr.lengths()) == [2] * NUM_TEST_RECORDS
+        # Each element is either a number or a document holding q, whether
+        # or not "$" is asked for alongside q.
+        assert elems.compressed().tolist() == list(range(NUM_TEST_RECORDS))
+        assert qs.compressed().tolist() == [i * 3 for i in
+                                            range(NUM_TEST_RECORDS)]
@@ -0,0 +1,131 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+import pymongo
+
+import monary
+from monary.category import CategoricalColumn
+from monary.datehelper import split_timestamps
+from monary.frame import pandas, to_dataframe
+from monary.list_column import ListColumn
+from monary.varlen import VarLenColumn
+from test import db_err, unittest
+
+NUM_TEST_RECORDS = 30
+
+
+def masked(values, mask, dtype):
+    return numpy.ma.masked_array(numpy.array(values, dtype=dtype), mask)
+
+
+@unittest.skipIf(pandas is None, "pandas is not installed")
+class TestToDataFrame(unittest.TestCase):
+    def test_unmasked_columns_are_shared(self):
+        ints = masked([1, 2, 3], [False] * 3, numpy.int32)
+        floats = masked([0.5, 1.5, 2.5], [False] * 3, numpy.float64)
+        frame = to_dataframe(["a", "b"], ["int32", "float64"],
+                             [ints, floats])
+        assert list(frame.columns) == ["a", "b"]
+        assert frame["a"].tolist() == [1, 2, 3]
+        assert numpy.shares_memory(frame["b"].to_numpy(), floats.data)
+
+    def test_missing_values(self):
+        ints = masked([1, 2, 3], [False, True, False], numpy.int64)
+        bools = masked([True, False, True], [True, False, False], bool)
+        floats = masked([0.5, 1.5, 2.5], [False, False, True],
+                        numpy.float64)
+        frame = to_dataframe(["i", "b", "f"], ["int64", "bool", "float64"],
+                             [ints, bools, floats])
+        assert str(frame["i"].dtype) == "Int64"
+        assert frame["i"].isna().tolist() == [False, True, False]
+        assert str(frame["b"].dtype) == "boolean"
+        assert frame["b"].isna().tolist() == [True, False, False]
+        assert frame["f"].isna().tolist() == [False, False, True]
+
+    def test_dates(self):
+        dates = masked([0, 86400000, 5], [False, False, True], numpy.int64)
+        frame = to_dataframe(["d"], ["date"], [dates])
+        assert frame["d"].dtype.kind == "M"
+        assert str(frame["d"][1].date()) == "1970-01-02"
+        assert frame["d"].isna().tolist() == [False, False, True]
+
+    def test_categories_and_strings(self):
+        categories = numpy.empty(2, dtype=object)
+        categories[:] = ["up", "down"]
+        codes = numpy.array([1, -1, 0], dtype=numpy.int32)
+        category = CategoricalColumn(numpy.ma.masked_array(codes, codes < 0),
+                                     categories)
+        strings = VarLenColumn.from_ends(
+            numpy.array([2, 2, 5]), numpy.frombuffer(b"hibye", numpy.uint8),
+            numpy.array([False, True, False]), "string")
+        frame = to_dataframe(["c", "s"], ["category", "varstring"],
+                             [category, strings])
+        assert str(frame["c"].dtype) == "category"
+        assert frame["c"].tolist()[0] == "down"
+        assert frame["c"].isna().tolist() == [False, True, False]
+        assert frame["s"][0] == "hi"
+        assert frame["s"].isna().tolist() == [False, True, False]
+
+    def test_timestamp_parts(self):
+        raw = numpy.array([(5, 7)], dtype=[("time", "u4"), ("inc", "u4")])
+        parts = split_timestamps(
+            numpy.ma.masked_array(raw.view(numpy.uint64), [False]))
+        frame = to_dataframe(["ts"], ["timestamp_parts"], [parts])
+        assert list(frame.columns) == ["ts.time", "ts.inc"]
+        assert frame["ts.time"].tolist() == [5]
+        assert frame["ts.inc"].tolist() == [7]
+
+    def test_list_rejected(self):
+        lists = ListColumn.from_ends([1, 2], [False, False])
+        with self.assertRaises(ValueError):
+            to_dataframe(["l"], ["list"], [lists])
+
+
+@unittest.skipIf(pandas is None, "pandas is not installed")
+@unittest.skipIf(db_err, db_err)
+class TestQueryDataFrame(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+            records = []
+            for i in range(NUM_TEST_RECORDS):
+                record = {"_id": i, "x": i * 0.5}
+                # Every third record has no status.
+                if i % 3 != 2:
+                    record["status"] = "up" if i % 3 == 0 else "down"
+                records.append(record)
+            c.monary_test.test_data.insert(records, safe=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+
+    def check_frame(self, frame, num_rows):
+        assert list(frame.columns) == ["_id", "status", "x"]
+        assert frame["_id"].tolist() == list(range(num_rows))
+        assert frame["x"].tolist() == [i * 0.5 for i in range(num_rows)]
+        status = frame["status"]
+        assert str(status.dtype) == "category"
+        assert list(status.cat.categories) == ["up", "down"]
+        # A missing status has code -1, which pandas reads as NaN.
+        assert status.cat.codes.tolist() == [0, 1, -1] * (num_rows // 3)
+        assert status.isna().tolist() == [False, False, True] * (
+            num_rows // 3)
+
+    def test_query_df(self):
+        with monary.Monary("127.0.0.1") as m:
+            frame = m.query_df("monary_test", "test_data", {},
+                               ["_id", "status", "x"],
+                               ["int32", "category", "float64"], sort="_id")
+        self.check_frame(frame, NUM_TEST_RECORDS)
+
+    def test_aggregate_df(self):
+        pipeline = [{"$sort": {"_id": 1}}, {"$limit": 12}]
+        with monary.Monary("127.0.0.1") as m:
+            frame = m.aggregate_df("monary_test", "test_data", pipeline,
+                                   ["_id", "status", "x"],
+                                   ["int32", "category", "float64"])
+        self.check_frame(frame, 12)
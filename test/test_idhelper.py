@@ -0,0 +1,56 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import datetime
+
+import bson
+import numpy
+
+from monary.idhelper import (ids_to_bytes, bytes_to_ids, ids_to_hex,
+                             hex_to_ids, ids_to_objectids, objectids_to_ids,
+                             ids_to_datetime64, OBJECTID_DTYPE)
+from test import unittest
+
+OIDS = [bson.ObjectId("53dba51e61155374af671dc1"),
+        bson.ObjectId("000000000000000000000000"),
+        bson.ObjectId.from_datetime(datetime.datetime(2015, 6, 1, 12))]
+
+
+class TestIdHelper(unittest.TestCase):
+    def setUp(self):
+        self.ids = objectids_to_ids(OIDS)
+
+    def test_objectids(self):
+        assert self.ids.dtype == OBJECTID_DTYPE
+        assert ids_to_objectids(self.ids) == OIDS
+
+    def test_masked_objectids(self):
+        ids = numpy.ma.masked_array(self.ids, [False, True, False])
+        assert ids_to_objectids(ids) == [OIDS[0], None, OIDS[2]]
+
+    def test_hex(self):
+        hexes = ids_to_hex(self.ids)
+        assert hexes.tolist() == [str(oid) for oid in OIDS]
+        assert hex_to_ids(hexes).tobytes() == self.ids.tobytes()
+        upper = [str(oid).upper() for oid in OIDS]
+        assert hex_to_ids(upper).tobytes() == self.ids.tobytes()
+
+    def test_bad_hex(self):
+        for bad in ["53dba51e", "53dba51e61155374af671dcz",
+                    # Longer strings are not cut short.
+                    "53dba51e61155374af671dc30", b"53dba51e61155374af671dc30",
+                    u"\u00e9" * 24]:
+            with self.assertRaises(ValueError):
+                hex_to_ids([bad])
+
+    def test_bytes(self):
+        id_bytes = ids_to_bytes(self.ids)
+        assert id_bytes.shape == (3, 12)
+        assert id_bytes[0].tobytes() == OIDS[0].binary
+        assert bytes_to_ids(id_bytes).tobytes() == self.ids.tobytes()
+
+    def test_datetime64(self):
+        times = ids_to_datetime64(self.ids)
+        assert times.dtype == numpy.dtype("datetime64[ms]")
+        assert times.tolist() == [oid.generation_time.replace(tzinfo=None)
+                                  for oid in OIDS]
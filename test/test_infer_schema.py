@@ -0,0 +1,92 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import datetime
+
+import bson
+import pymongo
+
+import monary
+from monary.schema import get_monary_type
+from test import db_err, unittest
+
+NUM_TEST_RECORDS = 500
+
+
+class TestMonaryTypes(unittest.TestCase):
+    def test_numbers(self):
+        assert get_monary_type({16: 10}, 0) == "int32"
+        assert get_monary_type({16: 10, 18: 1}, 0) == "int64"
+        assert get_monary_type({16: 10, 1: 1}, 0) == "float64"
+
+    def test_dominant_type(self):
+        assert get_monary_type({2: 10, 16: 5, 10: 20}, 7) == "string:7"
+        assert get_monary_type({2: 1, 16: 5}, 7) == "int32"
+        assert get_monary_type({2: 5}, 7, varlen=True) == "varstring"
+        assert get_monary_type({5: 5}, 0) == "binary:1"
+
+    def test_untyped(self):
+        assert get_monary_type({3: 5}, 10) is None
+        assert get_monary_type({4: 5, 10: 1}, 10) is None
+
+
+@unittest.skipIf(db_err, db_err)
+class TestInferSchema(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+            records = []
+            for i in range(NUM_TEST_RECORDS):
+                record = {"_id": bson.ObjectId(),
+                          "intval": i if i % 10 else 2 ** 40,
+                          "floatval": i / 2.0,
+                          "stringval": "x" * (i % 20),
+                          "dateval": datetime.datetime(2014, 1, 1),
+                          "sub": {"key": i, "nested": {"flag": i % 2 == 0}},
+                          "listval": [i, i]}
+                if i % 2:
+                    record["sometimes"] = i
+                records.append(record)
+            c.monary_test.test_data.insert(records, safe=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+
+    def test_types(self):
+        with monary.Monary("127.0.0.1") as m:
+            schema = m.infer_schema("monary_test", "test_data", sample=0)
+        types = dict(zip(schema.fields, schema.types))
+        assert types == {"_id": "id",
+                         "intval": "int64",
+                         "floatval": "float64",
+                         "stringval": "string:19",
+                         "dateval": "date",
+                         "sub.key": "int32",
+                         "sub.nested.flag": "bool",
+                         "sometimes": "int32"}
+        assert schema.num_docs == NUM_TEST_RECORDS
+        counts = dict(zip(schema.fields, schema.counts))
+        assert counts["sometimes"] == NUM_TEST_RECORDS / 2
+
+    def test_query(self):
+        with monary.Monary("127.0.0.1") as m:
+            schema = m.infer_schema("monary_test", "test_data", sample=100,
+                                    varlen=True)
+            arrays = m.query("monary_test", "test_data", {}, *schema)
+        assert len(arrays) == len(schema.fields)
+        stringval = arrays[schema.fields.index("stringval")]
+        assert stringval.count() == NUM_TEST_RECORDS
+
+    def test_cache(self):
+        with monary.Monary("127.0.0.1") as m:
+            first = m.infer_schema("monary_test", "test_data",
+                                   {"intval": {"$lt": 100}})
+            assert m.infer_schema("monary_test", "test_data",
+                                  {"intval": {"$lt": 100}}) is first
+            assert m.infer_schema("monary_test", "test_data",
+                                  {"intval": {"$lt": 100}},
+                                  refresh=True) is not first
+        assert monary.Schema.from_dict(first.to_dict()).types == first.types
@@ -461,3 +461,77 @@ class TestInserts(unittest.TestCase):
             assert not ids.mask[2::3].any()
         with pymongo.MongoClient() as c:
             c.drop_database("monary_test")
+
+    def test_insert_binary_vectors(self):
+        vectors = np.arange(12, dtype=np.float32).reshape(4, 3) / 4
+        mask = np.zeros((4, 3), dtype=bool)
+        # Any masked element leaves the whole row out of its document.
+        mask[2, 1] = True
+        vectors = np.ma.masked_array(vectors, mask)
+        seq = np.ma.masked_array(np.arange(4, dtype=np.int64),
+                                 np.zeros(4, dtype=bool))
+        with monary.Monary() as m:
+            m.insert("monary_test", "data",
+                     [monary.MonaryParam(vectors, "vec",
+                                         "binary_float32[3]"),
+                      monary.MonaryParam(seq, "sequence")])
+            vecs, = m.query("monary_test", "data", {}, ["vec"],
+                            ["binary_float32[3]"], sort="sequence")
+        with pymongo.MongoClient() as c:
+            docs = list(c.monary_test.data.find().sort("sequence"))
+            c.drop_database("monary_test")
+        assert "vec" not in docs[2]
+        assert isinstance(docs[0]["vec"], bytes)
+        assert vecs.shape == (4, 3)
+        row_masked = np.ma.getmaskarray(vecs).all(axis=1)
+        assert row_masked.tolist() == [False, False, True, False]
+        for i in [0, 1, 3]:
+            assert vecs[i].tolist() == vectors[i].tolist()
+
+    def test_insert_numpy_times(self):
+        dates = np.ma.masked_array(
+            np.array(["2014-07-01T12:30:05", "1969-12-31T23:59:59",
+                      "2000-01-01T00:00:00"], dtype="datetime64[s]"),
+            [False, False, True])
+        deltas = np.ma.masked_array(
+            np.array([90, -5, 0], dtype="timedelta64[m]"),
+            [False, True, False])
+        stamps = np.ma.masked_array(
+            np.array([(1404217805, 1), (0, 0), (7, 2 ** 32 - 1)],
+                     dtype=monary.TIMESTAMP_DTYPE),
+            [False, True, False])
+        seq = np.ma.masked_array(np.arange(3, dtype=np.int64),
+                                 np.zeros(3, dtype=bool))
+        with monary.Monary() as m:
+            m.insert("monary_test", "data",
+                     [monary.MonaryParam(dates, "date"),
+                      monary.MonaryParam(deltas, "delta"),
+                      monary.MonaryParam(stamps, "stamp"),
+                      monary.MonaryParam(seq, "sequence")])
+            got_dates, got_deltas, got_stamps = m.query(
+                "monary_test", "data", {}, ["date", "delta", "stamp"],
+                ["datetime64", "timedelta64", "timestamp_parts"],
+                sort="sequence")
+        with pymongo.MongoClient() as c:
+            docs = list(c.monary_test.data.find().sort("sequence"))
+            c.drop_database("monary_test")
+
+        # Values of any unit are stored as milliseconds.
+        assert docs[0]["date"] == datetime.datetime(2014, 7, 1, 12, 30, 5)
+        assert docs[0]["delta"] == 90 * 60 * 1000
+        assert docs[0]["stamp"] == bson.timestamp.Timestamp(1404217805, 1)
+        assert "date" not in docs[2]
+        assert "delta" not in docs[1]
+        assert "stamp" not in docs[1]
+
+        assert got_dates.mask.tolist() == [False, False, True]
+        assert got_dates[:2].tolist() == dates[:2].astype(
+            "datetime64[ms]").tolist()
+        assert got_deltas.mask.tolist() == [False, True, False]
+        assert got_deltas[0] == np.timedelta64(90, "m")
+        assert got_deltas[2] == np.timedelta64(0, "ms")
+        assert got_stamps.dtype == monary.TIMESTAMP_DTYPE
+        assert np.ma.getmaskarray(got_stamps["time"]).tolist() == \
+            [False, True, False]
+        assert got_stamps.data[0].tolist() == (1404217805, 1)
+        assert got_stamps.data[2].tolist() == (7, 2 ** 32 - 1)
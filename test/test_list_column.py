@@ -0,0 +1,42 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+from monary.list_column import ListColumn
+from test import unittest
+
+
+def make_column(lengths, mask):
+    ends = numpy.cumsum(numpy.array(lengths, dtype=numpy.int64))
+    return ListColumn.from_ends(ends, mask)
+
+
+class TestListColumn(unittest.TestCase):
+    def test_rows(self):
+        column = make_column([2, 0, 0, 3], [False, False, True, False])
+        items = numpy.arange(5)
+        assert len(column) == 4
+        assert column.count() == 3
+        assert list(column.lengths()) == [2, 0, 0, 3]
+        assert list(items[column[0]]) == [0, 1]
+        assert list(items[column[1]]) == []
+        assert column[2] is numpy.ma.masked
+        assert list(items[column[-1]]) == [2, 3, 4]
+        assert list(column.parent_rows()) == [0, 0, 3, 3, 3]
+        assert [list(row) for row in column.split(items)] == [
+            [0, 1], [], [], [2, 3, 4]]
+
+    def test_slice(self):
+        column = make_column([2, 1, 3], [False, False, False])[1:]
+        items = numpy.arange(6)
+        assert len(column) == 2
+        assert list(column.lengths()) == [1, 3]
+        assert [list(row) for row in column.split(items)] == [[2], [3, 4, 5]]
+
+    def test_concatenate(self):
+        first = make_column([1, 2], [False, False])
+        second = make_column([0, 3], [True, False])[1:]
+        joined = ListColumn.concatenate([first, second])
+        assert list(joined.offsets) == [0, 1, 3, 6]
+        assert list(joined.mask) == [False, False, False]
@@ -0,0 +1,107 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import pymongo
+
+import monary
+from test import db_err, unittest
+
+NUM_TEST_RECORDS = 5000
+
+
+@unittest.skipIf(db_err, db_err)
+class TestParallelQuery(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+            records = []
+            for i in range(NUM_TEST_RECORDS):
+                r = {"_id": i, "y": i * 2}
+                if (i % 2) == 0:
+                    r["x"] = 3
+                records.append(r)
+            c.monary_test.test_data.insert(records, safe=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        with pymongo.MongoClient() as c:
+            c.drop_database("monary_test")
+
+    def test_parallel(self):
+        with monary.Monary("127.0.0.1") as m:
+            ids, ys = m.query("monary_test", "test_data", {},
+                              ["_id", "y"], ["int32", "int32"], parallel=4)
+        assert len(ids) == NUM_TEST_RECORDS
+        assert ids.count() == NUM_TEST_RECORDS
+        order = ids.argsort()
+        assert (ids[order] == list(range(NUM_TEST_RECORDS))).all()
+        assert (ys == ids * 2).all()
+
+    def test_parallel_result_cache(self):
+        with monary.Monary("127.0.0.1", result_cache=1 << 20) as m:
+            ids, = m.query("monary_test", "test_data", {}, ["_id"],
+                           ["int32"], parallel=4)
+            # Only the query's own result is kept, not the partition
+            # bounds it aggregated for, which would go stale.
+            assert len(m.result_cache) == 1
+            with pymongo.MongoClient() as c:
+                c.monary_test.test_data.insert({"_id": -1}, safe=True)
+            try:
+                ys, = m.query("monary_test", "test_data", {}, ["y"],
+                              ["int32"], parallel=4)
+                assert len(ys) == NUM_TEST_RECORDS + 1
+                # Options are checked even when the result is cached.
+                m.query("monary_test", "test_data", {}, ["_id"], ["int32"],
+                        sort="_id")
+                with self.assertRaises(ValueError):
+                    m.query("monary_test", "test_data", {}, ["_id"],
+                            ["int32"], parallel=4, sort="_id")
+            finally:
+                with pymongo.MongoClient() as c:
+                    c.monary_test.test_data.remove({"_id": -1})
+
+    def test_parallel_query_filter(self):
+        with monary.Monary("127.0.0.1") as m:
+            ids, = m.query("monary_test", "test_data", {"x": 3}, ["_id"],
+                           ["int32"], parallel=3, partition_key="y")
+        ids.sort()
+        assert (ids == list(range(0, NUM_TEST_RECORDS, 2))).all()
+
+    def test_parallel_no_count(self):
+        with monary.Monary("127.0.0.1") as m:
+            ids, ys = m.query("monary_test", "test_data", {},
+                              ["_id", "y"], ["int32", "int32"], parallel=4,
+                              do_count=False)
+        assert len(ids) == NUM_TEST_RECORDS
+        assert (ys == ids * 2).all()
+        ids.sort()
+        assert (ids == list(range(NUM_TEST_RECORDS))).all()
+
+    def test_parallel_grown_ranges(self):
+        with monary.Monary("127.0.0.1") as m:
+            partition = m._partition
+
+            def undercount(*args):
+                # As if the ranges gained results after they were counted.
+                return [(lower, upper, count // 2)
+                        for lower, upper, count in partition(*args)]
+
+            m._partition = undercount
+            ids, ys = m.query("monary_test", "test_data", {},
+                              ["_id", "y"], ["int32", "int32"], parallel=4)
+            reader_pool = m._reader_pool
+            # Later parallel queries reuse the same clients.
+            m.query("monary_test", "test_data", {}, ["_id"], ["int32"],
+                    parallel=4)
+            assert m._reader_pool == reader_pool
+        assert len(ids) == NUM_TEST_RECORDS
+        assert (ys == ids * 2).all()
+        ids.sort()
+        assert (ids == list(range(NUM_TEST_RECORDS))).all()
+
+    def test_parallel_sort(self):
+        with self.assertRaises(ValueError):
+            with monary.Monary("127.0.0.1") as m:
+                m.query("monary_test", "test_data", {}, ["_id"], ["int32"],
+                        sort="_id", parallel=2)
@@ -1,6 +1,9 @@
 # Monary - Copyright 2011-2014 David J. C. Beach
 # Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
 
+import threading
+
+import numpy
 import pymongo
 
 import monary
@@ -52,3 +55,204 @@ class TestQueryBasics(unittest.TestCase):
     def test_sort(self):
         vals = self.get_monary_column("_id", "int32")
         assert (vals == list(range(NUM_TEST_RECORDS))).all()
+
+    def test_no_count(self):
+        with monary.Monary("127.0.0.1") as m:
+            vals, = m.query("monary_test", "test_data", {"x": 3}, ["_id"],
+                            ["int32"], sort="_id", do_count=False)
+        assert len(vals) == int(NUM_TEST_RECORDS / 2)
+        assert vals.count() == len(vals)
+        assert (vals == list(range(0, NUM_TEST_RECORDS, 2))).all()
+
+    def test_out(self):
+        ids = numpy.ma.masked_array(
+            numpy.empty(NUM_TEST_RECORDS, dtype=numpy.int32),
+            numpy.empty(NUM_TEST_RECORDS, dtype=bool))
+        xs = numpy.empty(NUM_TEST_RECORDS + 10, dtype=numpy.int8)
+        with monary.Monary("127.0.0.1") as m:
+            vals, x = m.query("monary_test", "test_data", {}, ["_id", "x"],
+                              ["int32", "int8"], sort="_id", out=[ids, xs])
+        # The results were loaded into the given arrays and masks.
+        assert numpy.shares_memory(vals.data, ids.data)
+        assert numpy.shares_memory(vals.mask, ids.mask)
+        assert numpy.shares_memory(x.data, xs)
+        assert (ids == list(range(NUM_TEST_RECORDS))).all()
+        assert len(x) == NUM_TEST_RECORDS
+        assert x.count() == int(NUM_TEST_RECORDS / 2)
+
+    def test_out_mismatch(self):
+        with monary.Monary("127.0.0.1") as m:
+            with self.assertRaises(ValueError):
+                # Wrong dtype.
+                m.query("monary_test", "test_data", {}, ["_id"], ["int32"],
+                        out=[numpy.empty(NUM_TEST_RECORDS, numpy.int64)])
+            with self.assertRaises(ValueError):
+                # Too few rows for the results.
+                m.query("monary_test", "test_data", {}, ["_id"], ["int32"],
+                        out=[numpy.empty(10, numpy.int32)])
+            with self.assertRaises(ValueError):
+                # Without a count, results that do not fit are an error.
+                m.query("monary_test", "test_data", {}, ["_id"], ["int32"],
+                        sort="_id", do_count=False,
+                        out=[numpy.empty(10, numpy.int32)])
+            # A limit bounds the results to what fits.
+            vals, = m.query("monary_test", "test_data", {}, ["_id"],
+                            ["int32"], sort="_id", limit=10, do_count=False,
+                            out=[numpy.empty(10, numpy.int32)])
+            assert vals.tolist() == list(range(10))
+            # Arrays with room to spare hold every result.
+            vals, = m.query("monary_test", "test_data", {}, ["_id"],
+                            ["int32"], sort="_id", do_count=False,
+                            out=[numpy.empty(NUM_TEST_RECORDS, numpy.int32)])
+            assert len(vals) == NUM_TEST_RECORDS
+
+    def test_mask_bits(self):
+        with monary.Monary("127.0.0.1") as m:
+            x, = m.query("monary_test", "test_data", {}, ["x"], ["int8"],
+                         sort="_id", mask="bits")
+        assert isinstance(x, monary.BitmaskColumn)
+        assert len(x.validity) == (NUM_TEST_RECORDS + 7) // 8
+        assert x.count() == int(NUM_TEST_RECORDS / 2)
+        assert x[0] == 3
+        assert x[1] is numpy.ma.masked
+
+    def test_mask_fill(self):
+        with monary.Monary("127.0.0.1") as m:
+            x, y = m.query("monary_test", "test_data", {}, ["x", "x"],
+                           ["float64", "int32"], sort="_id", mask="fill",
+                           fill_value={"x": None})
+            z, = m.query("monary_test", "test_data", {}, ["x"], ["int32"],
+                         sort="_id", mask="fill", fill_value=-1)
+        assert not isinstance(x, numpy.ma.MaskedArray)
+        assert x[0] == 3 and numpy.isnan(x[1])
+        assert y[1] == numpy.ma.default_fill_value(y)
+        assert z.tolist()[:4] == [3, -1, 3, -1]
+
+    def test_mask_fill_defaults(self):
+        with monary.Monary("127.0.0.1") as m:
+            # x is never a date, so every row is missing.
+            dates, = m.query("monary_test", "test_data", {}, ["x"], ["date"],
+                             sort="_id", mask="fill")
+            with self.assertRaises(ValueError):
+                # No bool can stand for a missing value.
+                m.query("monary_test", "test_data", {}, ["x"], ["bool"],
+                        mask="fill")
+            flags, = m.query("monary_test", "test_data", {}, ["x"],
+                             ["bool"], sort="_id", mask="fill",
+                             fill_value={"x": True})
+        assert (dates == numpy.iinfo(numpy.int64).min).all()
+        assert numpy.isnat(dates.view("datetime64[ms]")).all()
+        assert not flags[0] and flags[1]
+
+    def test_mask_none(self):
+        with monary.Monary("127.0.0.1") as m:
+            vals, = m.query("monary_test", "test_data", {}, ["_id"],
+                            ["int32"], sort="_id", mask="none")
+            with self.assertRaises(ValueError):
+                m.query("monary_test", "test_data", {}, ["_id"], ["int32"],
+                        mask="nope")
+        assert not isinstance(vals, numpy.ma.MaskedArray)
+        assert (vals == numpy.arange(NUM_TEST_RECORDS)).all()
+
+    def test_structured(self):
+        with monary.Monary("127.0.0.1") as m:
+            records = m.query("monary_test", "test_data", {}, ["_id", "x"],
+                              ["int32", "float64"], sort="_id",
+                              structured=True)
+            grown = m.query("monary_test", "test_data", {}, ["_id", "x"],
+                            ["int32", "float64"], sort="_id",
+                            do_count=False, structured=True, mask="fill")
+            with self.assertRaises(ValueError):
+                m.query("monary_test", "test_data", {}, ["_id", "_id"],
+                        ["int32", "int64"], structured=True)
+        assert records.dtype.names == ("_id", "x")
+        assert records.dtype.itemsize == 12
+        assert (records["_id"] == list(range(NUM_TEST_RECORDS))).all()
+        assert records["x"].count() == int(NUM_TEST_RECORDS / 2)
+        assert len(grown) == NUM_TEST_RECORDS
+        assert grown["x"][0] == 3 and numpy.isnan(grown["x"][1])
+
+    def test_collection_cache(self):
+        key = ("monary_test", "test_data")
+        with monary.Monary("127.0.0.1") as m:
+            m.count("monary_test", "test_data", {})
+            handle = m._collections[key]
+            m.query("monary_test", "test_data", {}, ["_id"], ["int32"])
+            assert list(m._collections) == [key]
+            assert m._collections[key] == handle
+            limit = monary.monary.MAX_CACHED_COLLECTIONS
+            monary.monary.MAX_CACHED_COLLECTIONS = 2
+            try:
+                m.count("monary_test", "other1", {})
+                m.count("monary_test", "other2", {})
+            finally:
+                monary.monary.MAX_CACHED_COLLECTIONS = limit
+            # The least recently used handle was closed.
+            assert list(m._collections) == [("monary_test", "other1"),
+                                            ("monary_test", "other2")]
+        assert not m._collections
+
+    def test_result_cache(self):
+        with monary.Monary("127.0.0.1", result_cache=1 << 20) as m:
+            cache = m.result_cache
+            x, = m.query("monary_test", "test_data", {}, ["x"], ["int32"],
+                         sort="_id")
+            again, = m.query("monary_test", "test_data", {}, ["x"],
+                             ["int32"], sort="_id")
+            assert again is x
+            assert not x.flags.writeable
+            # Any change to the arguments makes a different query.
+            m.query("monary_test", "test_data", {}, ["x"], ["int32"],
+                    sort="_id", limit=10)
+            assert (cache.hits, cache.misses) == (1, 2)
+            m.insert("monary_test", "test_data",
+                     [monary.MonaryParam(numpy.ma.masked_array(
+                         numpy.array([NUM_TEST_RECORDS]), [False]), "_id")])
+            assert len(cache) == 0
+            x, = m.query("monary_test", "test_data", {}, ["x"], ["int32"],
+                         sort="_id")
+            assert len(x) == NUM_TEST_RECORDS + 1
+        with pymongo.MongoClient() as c:
+            c.monary_test.test_data.remove({"_id": NUM_TEST_RECORDS})
+
+    def test_pooled(self):
+        pools = monary.monary._pools
+        with monary.Monary("127.0.0.1", pooled=True, max_pool_size=4) as m1:
+            with monary.Monary("127.0.0.1", pooled=True) as m2:
+                # Both connections share one pool.
+                assert len(pools) == 1
+                assert list(pools.values())[0][1] == 2
+                counts = []
+
+                def count(m):
+                    for _ in range(10):
+                        counts.append(m.query(
+                            "monary_test", "test_data", {"x": 3}, ["x"],
+                            ["int32"])[0].count())
+
+                threads = [threading.Thread(target=count, args=(m,))
+                           for m in (m1, m2, m1, m2)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                assert counts == [NUM_TEST_RECORDS // 2] * 40
+                assert m1.count("monary_test", "test_data", {}) == \
+                    NUM_TEST_RECORDS
+                # Every client was returned to the pool.
+                assert not m1._pooled_clients
+                assert not m1._collections
+            assert list(pools.values())[0][1] == 1
+        assert not pools
+
+    def test_pool_outlives_close(self):
+        pools = monary.monary._pools
+        m = monary.Monary("127.0.0.1", pooled=True)
+        blocks = m.block_query("monary_test", "test_data", {}, ["x"],
+                               ["int32"], block_size=100, prefetch=1)
+        next(blocks)
+        m.close()
+        # The block query still holds a client, which keeps the pool.
+        assert [entry[1:] for entry in pools.values()] == [[0, 1]]
+        blocks.close()
+        assert not pools
@@ -0,0 +1,86 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+from monary.category import CategoricalColumn
+from monary.list_column import ListColumn
+from monary.record_batch import pyarrow, to_record_batch
+from monary.varlen import VarLenColumn
+from test import unittest
+
+
+def masked(values, mask, dtype):
+    return numpy.ma.masked_array(numpy.array(values, dtype=dtype), mask)
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestToRecordBatch(unittest.TestCase):
+    def test_numbers(self):
+        ints = masked([1, 2, 3], [False, True, False], numpy.int32)
+        floats = masked([0.5, 1.5, 2.5], [False] * 3, numpy.float64)
+        batch = to_record_batch(["a", "b"], ["int32", "float64"],
+                                [ints, floats], [None, None])
+        assert batch.schema.names == ["a", "b"]
+        assert batch.column(0).to_pylist() == [1, None, 3]
+        assert batch.column(1).null_count == 0
+        # The values are shared, not copied.
+        assert (batch.column(1).buffers()[1].address ==
+                floats.data.ctypes.data)
+
+    def test_bools_and_dates(self):
+        bools = masked([True, False, True], [False, False, True], bool)
+        dates = masked([0, 86400000], [False, True], numpy.int64)
+        batch = to_record_batch(["b"], ["bool"], [bools], [None])
+        assert batch.column(0).to_pylist() == [True, False, None]
+        batch = to_record_batch(["d"], ["date"], [dates], [None])
+        assert batch.column(0).type == pyarrow.timestamp("ms")
+        assert batch.column(0).null_count == 1
+
+    def test_strings(self):
+        fixed = masked([b"ab", b"abc"], [False, True], "S4")
+        varlen = VarLenColumn.from_ends(
+            numpy.array([2, 2, 5]), numpy.frombuffer(b"hibye", numpy.uint8),
+            numpy.array([False, True, False]), "string")
+        batch = to_record_batch(["f"], ["string:4"], [fixed], [None])
+        assert batch.column(0).to_pylist() == ["ab", None]
+        batch = to_record_batch(["v"], ["varstring"], [varlen], [None])
+        assert batch.column(0).type == pyarrow.large_string()
+        assert batch.column(0).to_pylist() == ["hi", None, "bye"]
+
+    def test_category(self):
+        categories = numpy.empty(2, dtype=object)
+        categories[:] = ["up", "down"]
+        codes = numpy.array([1, -1, 0], dtype=numpy.int32)
+        column = CategoricalColumn(numpy.ma.masked_array(codes, codes < 0),
+                                   categories)
+        batch = to_record_batch(["c"], ["category"], [column], [None])
+        assert batch.column(0).to_pylist() == ["down", None, "up"]
+
+    def test_vector(self):
+        vectors = masked([[1, 2], [3, 4]], [[False, False], [True, True]],
+                         numpy.float32)
+        batch = to_record_batch(["v"], ["float32[2]"], [vectors], [None])
+        assert batch.column(0).to_pylist() == [[1.0, 2.0], None]
+
+    def test_lists(self):
+        lists = ListColumn.from_ends([2, 2, 3], [False, True, False])
+        prices = masked([1.5, 2.5, 3.5], [False, False, True],
+                        numpy.float64)
+        qtys = masked([1, 2, 3], [False] * 3, numpy.int32)
+        batch = to_record_batch(
+            ["items", "items.price", "items.qty"],
+            ["list", "float64", "int32"], [lists, prices, qtys],
+            [None, 0, 0])
+        assert batch.schema.names == ["items"]
+        assert batch.column(0).to_pylist() == [
+            [{"price": 1.5, "qty": 1}, {"price": 2.5, "qty": 2}],
+            None,
+            [{"price": None, "qty": 3}]]
+
+    def test_list_elements(self):
+        lists = ListColumn.from_ends([1, 3], [False, False])
+        tags = masked([7, 8, 9], [False] * 3, numpy.int64)
+        batch = to_record_batch(["tags", "tags.$"], ["list", "int64"],
+                                [lists, tags], [None, 0])
+        assert batch.column(0).to_pylist() == [[7], [8, 9]]
@@ -0,0 +1,93 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+from monary import result_cache
+from monary.result_cache import ResultCache, result_nbytes
+from monary.varlen import VarLenColumn
+from test import unittest
+
+
+def column(n):
+    return numpy.ma.masked_array(numpy.zeros(n, dtype=numpy.int64),
+                                 numpy.zeros(n, dtype=bool))
+
+
+class TestResultCache(unittest.TestCase):
+    def test_nbytes(self):
+        storage = numpy.zeros(100, dtype=numpy.float64)
+        # A trimmed column holds on to all of its storage.
+        trimmed = numpy.ma.masked_array(storage[:10],
+                                        numpy.zeros(10, dtype=bool))
+        assert result_nbytes([trimmed]) == 810
+        strings = VarLenColumn.from_ends(
+            numpy.array([2, 5]), numpy.frombuffer(b"hibye", numpy.uint8),
+            numpy.array([False, False]), "string")
+        assert result_nbytes([strings]) == 24 + 5 + 2
+
+    def test_hits_and_read_only(self):
+        cache = ResultCache(1000)
+        result = [column(10)]
+        assert cache.get("db", "coll", "key") is None
+        assert cache.put("db", "coll", "key", result) is result
+        hit = cache.get("db", "coll", "key")
+        assert hit[0] is result[0]
+        # Changing the list a caller got leaves the cached one alone.
+        hit[0] = None
+        result[0] = None
+        assert cache.get("db", "coll", "key")[0] is not None
+        result = cache.get("db", "coll", "key")
+        assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 0)
+        assert cache.nbytes == 90
+        with self.assertRaises(ValueError):
+            result[0][0] = 5
+        with self.assertRaises(ValueError):
+            result[0][0] = numpy.ma.masked
+
+    def test_lru_eviction(self):
+        cache = ResultCache(200)
+        cache.put("db", "coll", "a", [column(10)])
+        cache.put("db", "coll", "b", [column(10)])
+        # Using "a" makes "b" the least recently used.
+        cache.get("db", "coll", "a")
+        cache.put("db", "coll", "c", [column(10)])
+        assert cache.evictions == 1
+        assert cache.get("db", "coll", "b") is None
+        assert cache.get("db", "coll", "a") is not None
+        assert cache.nbytes == 180
+        # Results over the budget are not kept, but are read-only all the
+        # same.
+        big = [column(100)]
+        assert cache.put("db", "coll", "d", big) is big
+        assert not big[0].flags.writeable
+        assert len(cache) == 2
+
+    def test_ttl(self):
+        now = [100.0]
+        clock = result_cache._clock
+        result_cache._clock = lambda: now[0]
+        try:
+            cache = ResultCache(1000, ttl=10)
+            cache.put("db", "coll", "key", [column(1)])
+            now[0] += 5
+            assert cache.get("db", "coll", "key") is not None
+            now[0] += 5
+            assert cache.get("db", "coll", "key") is None
+            assert cache.nbytes == 0
+        finally:
+            result_cache._clock = clock
+
+    def test_invalidate(self):
+        cache = ResultCache(1000)
+        cache.put("db", "a", "key", [column(1)])
+        cache.put("db", "b", "key", [column(1)])
+        cache.put("other", "a", "key", [column(1)])
+        cache.invalidate("db", "a")
+        assert len(cache) == 2
+        assert cache.get("db", "b", "key") is not None
+        cache.invalidate("other")
+        assert len(cache) == 1
+        cache.invalidate()
+        assert len(cache) == 0
+        assert cache.nbytes == 0
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+import numpy
+
+from monary.varlen import VarLenColumn
+from test import unittest
+
+VALUES = [u"a", None, u"", u"été", u"longer value"]
+
+
+def make_column(values):
+    data = b"".join(v.encode("utf-8") for v in values if v is not None)
+    ends = numpy.cumsum([len(v.encode("utf-8")) if v is not None else 0
+                         for v in values])
+    return VarLenColumn.from_ends(ends,
+                                  numpy.frombuffer(data, dtype=numpy.uint8),
+                                  [v is None for v in values])
+
+
+class TestVarLenColumn(unittest.TestCase):
+    def test_values(self):
+        column = make_column(VALUES)
+        assert len(column) == len(VALUES)
+        assert column.tolist() == VALUES
+        assert column[1] is numpy.ma.masked
+        assert column[-1] == VALUES[-1]
+        assert column.count() == 4
+        assert list(column.lengths()) == [1, 0, 0, 5, 12]
+
+    def test_slices(self):
+        column = make_column(VALUES)
+        assert column[2:4].tolist() == VALUES[2:4]
+        assert column[::2].tolist() == VALUES[::2]
+        assert column[numpy.array([4, 0])].tolist() == [VALUES[4], VALUES[0]]
+        assert column[column.mask].tolist() == [None]
+
+    def test_concatenate(self):
+        column = make_column(VALUES)
+        joined = VarLenColumn.concatenate([column[3:], column[:2]])
+        assert joined.tolist() == VALUES[3:] + VALUES[:2]
+        assert len(VarLenColumn.concatenate([], "binary")) == 0
+
+    def test_to_numpy(self):
+        array = make_column(VALUES).to_numpy()
+        assert len(array) == len(VALUES)
+        assert [array[i] for i in (0, 3, 4)] == [VALUES[i] for i in (0, 3, 4)]
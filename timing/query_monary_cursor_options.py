@@ -0,0 +1,37 @@
+# Monary - Copyright 2011-2014 David J. C. Beach
+# Please see the included LICENSE.TXT and NOTICE.TXT for licensing information.
+
+from time import time
+
+from monary import Monary, CursorOptions
+
+SETTINGS = [
+    ("server default batches", CursorOptions(batch_size=0)),
+    ("batch_size=1000", CursorOptions(batch_size=1000)),
+    ("batch_size=32768", CursorOptions(batch_size=32 * 1024)),
+    ("exhaust", CursorOptions(exhaust=True)),
+    ("exhaust, no_cursor_timeout", CursorOptions(exhaust=True,
+                                                 no_cursor_timeout=True)),
+]
+
+def do_monary_cursor_options_query():
+    with Monary("127.0.0.1") as m:
+        for name, options in SETTINGS:
+            count = 0
+            start = time()
+            for arrays in m.block_query(
+                "monary_test",                  # database name
+                "collection",                   # collection name
+                {},                             # query spec
+                ["x1", "x2", "x3", "x4", "x5"], # field names
+                ["float64"] * 5,                # field types
+                block_size=32 * 1024,
+                cursor_options=options,
+            ):
+                count += len(arrays[0])
+            elapsed = time() - start
+            print("%-28s %9i items in %6.2f s (%10.0f items/s)" %
+                  (name, count, elapsed, count / max(elapsed, 1e-9)))
+
+if __name__ == '__main__':
+    do_monary_cursor_options_query()